@@ -0,0 +1,362 @@
+"""
+End-to-end load and latency benchmark for the gateway and model services.
+
+Starts the gateway and the classical, ML and DL services locally (on their own
+ports, against a scratch copy of the database), replays a weighted mix of
+dashboard traffic at a fixed concurrency, and reports p50/p95/p99 latency and
+throughput per operation plus a per-stage breakdown from the gateway's stats
+endpoints (backend queueing vs. backend time, cache hit rates). Results are
+saved as JSON; pass a previous result as --baseline to compare against it.
+
+Usage:
+  python benchmark.py [--duration 60] [--concurrency 8] [--mix history=30,current=10,forecast=55,emulate=5]
+                      [--models arima,rf,lstm] [--output benchmark_results.json] [--baseline old.json]
+  python benchmark.py --gateway-url http://localhost:8000   # Benchmark services that are already running
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SERVICES = [  # (name, directory, port offset from --base-port)
+    ("classical", "classical-service", 1),
+    ("ml", "ml-service", 2),
+    ("dl", "dl-service", 3),
+    ("gateway", "gateway", 0),
+]
+MODELS = ["arima", "sarima", "es", "rf", "gbm", "svm", "xgboost", "lstm", "gru", "transformer"]
+DEFAULT_MIX = "history=30,current=10,forecast=55,emulate=5"
+PERCENTILES = (50, 95, 99)
+
+
+# --- Local services ---------------------------------------------------------
+
+def start_services(base_port, workdir, extra_env):
+    """Start every service with uvicorn; returns the processes (gateway last)"""
+    database_path = os.path.join(workdir, "forecasting.db")
+    shutil.copy(os.path.join(ROOT, "gateway", "forecasting.db"), database_path)
+    env = {
+        **os.environ,
+        "CLASSICAL_SERVICE_URL": f"http://localhost:{base_port + 1}",
+        "ML_SERVICE_URL": f"http://localhost:{base_port + 2}",
+        "DL_SERVICE_URL": f"http://localhost:{base_port + 3}",
+        "DATABASE_PATH": database_path,
+        "DL_MODEL_DIR": os.path.join(workdir, "dl-models"),
+        **extra_env,
+    }
+    processes = []
+    for name, directory, offset in SERVICES:
+        log = open(os.path.join(workdir, f"{name}.log"), "w")
+        processes.append((name, subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(base_port + offset), "--log-level", "warning"],
+            cwd=os.path.join(ROOT, directory), env=env, stdout=log, stderr=subprocess.STDOUT,
+        )))
+    return processes
+
+
+def stop_services(processes):
+    for _, process in processes:
+        process.terminate()
+    for _, process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def wait_until_up(client, urls, timeout=120):
+    deadline = time.monotonic() + timeout
+    for name, url in urls.items():
+        while True:
+            try:
+                await client.get(url + "/")
+                break  # Any response means the server is accepting requests
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{name} did not start at {url}")
+            await asyncio.sleep(0.5)
+
+
+# --- Traffic ----------------------------------------------------------------
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {sorted(unknown)} (use {', '.join(OPERATIONS)})")
+    return mix
+
+
+async def op_history(client, rng, ctx):
+    city = rng.choice(ctx["cities"])
+    return "history", await client.get("/data/history", params={"city": city, "days": rng.choice([30, 90, 365])})
+
+
+async def op_current(client, rng, ctx):
+    return "current", await client.get("/data/current")
+
+
+async def op_forecast(client, rng, ctx):
+    model = rng.choice(ctx["models"])
+    params = {"city": rng.choice(ctx["cities"]), "model": model, "horizon": rng.choice([7, 14])}
+    return f"forecast:{model}", await client.post("/forecast/demand", params=params)
+
+
+async def op_emulate(client, rng, ctx):
+    body = {
+        "city": rng.choice(ctx["cities"]),
+        "actual_count": rng.randint(40, 200),
+        "temperature": round(rng.uniform(10, 35), 1),
+        "rainfall": round(rng.choice([0.0, 0.0, rng.uniform(0, 15)]), 1),
+    }
+    return "emulate_day", await client.post("/emulate/day", json=body)
+
+
+OPERATIONS = {"history": op_history, "current": op_current, "forecast": op_forecast, "emulate": op_emulate}
+
+
+async def run_load(client, mix, ctx, concurrency, duration, seed, record=True):
+    """Run the mix with `concurrency` closed-loop workers for `duration` seconds"""
+    names, weights = list(mix), list(mix.values())
+    samples = {}
+    deadline = time.monotonic() + duration
+
+    async def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        while time.monotonic() < deadline:
+            operation = OPERATIONS[rng.choices(names, weights)[0]]
+            started = time.perf_counter()
+            try:
+                label, response = await operation(client, rng, ctx)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                label, ok = operation.__name__[3:], False
+            if record:
+                entry = samples.setdefault(label, {"latencies": [], "errors": 0})
+                entry["latencies"].append(time.perf_counter() - started)
+                entry["errors"] += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed):
+    """Latency percentiles (ms) and throughput per operation, plus a total"""
+    def describe(latencies, errors):
+        ms = np.asarray(latencies) * 1000
+        return {
+            "count": len(ms),
+            "errors": errors,
+            "throughput_rps": round(len(ms) / elapsed, 2),
+            "mean_ms": round(float(ms.mean()), 2),
+            **{f"p{p}_ms": round(float(np.percentile(ms, p)), 2) for p in PERCENTILES},
+            "max_ms": round(float(ms.max()), 2),
+        }
+
+    operations = {label: describe(s["latencies"], s["errors"]) for label, s in sorted(samples.items())}
+    if samples:
+        operations["total"] = describe([l for s in samples.values() for l in s["latencies"]],
+                                       sum(s["errors"] for s in samples.values()))
+    return operations
+
+
+# --- Per-stage breakdown ----------------------------------------------------
+
+STATS_ENDPOINTS = {
+    "backends": "/backends/stats",
+    "history_cache": "/data/cache/stats",
+    "forecast_cache": "/forecast/cache/stats",
+    "precompute": "/precompute/stats",
+}
+
+
+async def snapshot(client):
+    stats = {}
+    for name, path in STATS_ENDPOINTS.items():
+        try:
+            response = await client.get(path)
+            stats[name] = response.json() if response.status_code == 200 else None
+        except httpx.HTTPError:
+            stats[name] = None
+    return stats
+
+
+def stage_breakdown(before, after):
+    """Changes in the gateway's counters over the measured run"""
+    stages = {}
+    for name, stats in (after.get("backends") or {}).items():
+        old = (before.get("backends") or {}).get(name) or {}
+        requests = stats["requests"] - old.get("requests", 0)
+        if requests <= 0:
+            continue
+        # Averages are cumulative: recover the run's share from sums
+        total = lambda key: stats[key] * stats["requests"] - old.get(key, 0) * old.get("requests", 0)
+        stages[f"backend:{name}"] = {
+            "requests": requests,
+            "errors": stats["errors"] - old.get("errors", 0),
+            "rejected": stats["rejected"] - old.get("rejected", 0),
+            "avg_queue_wait_ms": round(total("avg_wait_ms") / requests, 2),
+            "avg_backend_ms": round(total("avg_latency_ms") / requests, 2),
+        }
+    for name, counters in (("history_cache", ("hits", "misses")),
+                           ("forecast_cache", ("hits", "coalesced", "misses")),
+                           ("precompute", ("hits", "misses", "runs", "failures"))):
+        new, old = after.get(name), before.get(name) or {}
+        if new:
+            delta = {key: new[key] - old.get(key, 0) for key in counters if key in new}
+            lookups = sum(v for k, v in delta.items() if k in ("hits", "coalesced", "misses"))
+            if lookups:
+                delta["hit_rate"] = round((lookups - delta.get("misses", 0)) / lookups, 3)
+            stages[name] = delta
+    return stages
+
+
+# --- Baseline comparison ----------------------------------------------------
+
+def compare(current, baseline, threshold, min_samples):
+    """
+    Percent change per operation and metric; regressions exceed threshold (%).
+    Operations with fewer than min_samples requests in either run are skipped:
+    their tail percentiles are mostly noise.
+    """
+    rows, regressions = [], []
+    for label, stats in current["operations"].items():
+        old = baseline["operations"].get(label)
+        if not old or min(old["count"], stats["count"]) < min_samples:
+            continue
+        for metric in [f"p{p}_ms" for p in PERCENTILES] + ["throughput_rps"]:
+            if not old.get(metric):
+                continue
+            change = 100 * (stats[metric] - old[metric]) / old[metric]
+            # Higher latency or lower throughput is worse
+            worse = change > threshold if metric.endswith("_ms") else change < -threshold
+            rows.append((label, metric, old[metric], stats[metric], round(change, 1), worse))
+            if worse:
+                regressions.append(f"{label} {metric}")
+    return rows, regressions
+
+
+def print_report(result, comparison=None):
+    print(f"\n{'operation':<24}{'count':>8}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, s in result["operations"].items():
+        print(f"{label:<24}{s['count']:>8}{s['errors']:>6}{s['throughput_rps']:>9}"
+              f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+    if result["stages"]:
+        print("\nstages")
+        for name, values in result["stages"].items():
+            print(f"  {name:<22}" + "  ".join(f"{k}={v}" for k, v in values.items()))
+    if comparison:
+        rows, regressions = comparison
+        print(f"\n{'vs baseline':<24}{'metric':<16}{'before':>10}{'after':>10}{'change %':>10}")
+        for label, metric, old, new, change, worse in rows:
+            print(f"{label:<24}{metric:<16}{old:>10}{new:>10}{change:>+10}{'  <-- regression' if worse else ''}")
+        print(f"\n{len(regressions)} regression(s)" + (f": {', '.join(regressions)}" if regressions else ""))
+
+
+async def benchmark(args):
+    workdir = tempfile.mkdtemp(prefix="wifi-bench-")
+    processes = []
+    gateway_url = args.gateway_url
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    try:
+        if gateway_url is None:
+            processes = start_services(args.base_port, workdir, extra_env)
+            gateway_url = f"http://localhost:{args.base_port}"
+            urls = {name: f"http://localhost:{args.base_port + offset}" for name, _, offset in SERVICES}
+        else:
+            urls = {"gateway": gateway_url}
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=gateway_url, timeout=args.timeout, limits=limits) as client:
+            await wait_until_up(client, urls)
+            ctx = {"cities": (await client.get("/data/cities")).json()["cities"], "models": args.models}
+            mix = parse_mix(args.mix)
+
+            if args.warmup > 0:
+                print(f"Warming up for {args.warmup}s...")
+                await run_load(client, mix, ctx, args.concurrency, args.warmup, args.seed + 1, record=False)
+            before = await snapshot(client)
+            print(f"Running {args.mix} at concurrency {args.concurrency} for {args.duration}s...")
+            samples, elapsed = await run_load(client, mix, ctx, args.concurrency, args.duration, args.seed)
+            after = await snapshot(client)
+    finally:
+        stop_services(processes)
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+        elif processes:
+            print(f"Service logs and scratch database kept in {workdir}")
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "gateway_url": args.gateway_url or "local",
+            "mix": args.mix,
+            "models": args.models,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "seed": args.seed,
+            "env": extra_env,
+        },
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "elapsed_s": round(elapsed, 3),
+        "operations": summarize(samples, elapsed),
+        "stages": stage_breakdown(before, after),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=10, help="unmeasured seconds first (fits models, fills caches)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation weights: history, current, forecast, emulate")
+    parser.add_argument("--models", default=",".join(MODELS), type=lambda s: [m for m in s.split(",") if m])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=180)
+    parser.add_argument("--gateway-url", help="benchmark running services instead of starting them")
+    parser.add_argument("--base-port", type=int, default=9000, help="gateway port; model services use the next three")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for started services (repeatable)")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep service logs and the scratch database")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    parser.add_argument("--threshold", type=float, default=10, help="%% change counted as a regression")
+    parser.add_argument("--min-samples", type=int, default=30, help="fewest requests per operation to compare")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on any regression")
+    args = parser.parse_args()
+    parse_mix(args.mix)
+
+    result = asyncio.run(benchmark(args))
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(result, json.load(f), args.threshold, args.min_samples)
+        result["baseline"] = {"path": args.baseline, "regressions": comparison[1]}
+    print_report(result, comparison)
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nSaved results to {args.output}")
+    if comparison and comparison[1] and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
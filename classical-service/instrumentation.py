@@ -0,0 +1,267 @@
+import collections
+import contextvars
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from fastapi import Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+# Request timing and metrics, shared by the gateway and the classical, ML and
+# DL services; each service directory carries its own copy because every
+# service builds as its own image.
+#
+# instrument(app, service) adds an ASGI middleware that assigns or propagates
+# an X-Request-ID, collects the stages timed with stage() while the request
+# runs, and returns them in a Server-Timing header. Stage and request durations
+# also go into histograms served in Prometheus text format at /metrics.
+
+REQUEST_ID_HEADER = "X-Request-ID"
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Serve /debug/profile (a sampling profiler over every thread of the process)
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILER_MAX_SECONDS = 60
+
+# Seconds; covers cached responses (ms) through cold SARIMA fits (tens of seconds)
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_timings = contextvars.ContextVar("timings", default=None)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in Prometheus form"""
+
+    def __init__(self, name, help, labelnames, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: {**s, "counts": list(s["counts"])} for key, s in self._series.items()}
+        for key, s in sorted(series.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, s["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(s['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {s['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Histograms recorded in-process plus collectors: callables returning
+    (name, type, help, [(labels dict, value), ...]) tuples read at scrape time,
+    so existing stats (pools, caches, training queues) need no extra bookkeeping.
+    """
+
+    def __init__(self):
+        self.service = "unknown"
+        self._histograms = []
+        self._collectors = []
+        self.stage_seconds = self.histogram(
+            "stage_duration_seconds", "Time spent in one stage of a request", ("service", "stage"))
+        self.request_seconds = self.histogram(
+            "http_request_duration_seconds", "HTTP request latency", ("service", "method", "route", "status"))
+
+    def histogram(self, name, help, labelnames, buckets=DURATION_BUCKETS):
+        histogram = Histogram(name, help, labelnames, buckets)
+        self._histograms.append(histogram)
+        return histogram
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for histogram in self._histograms:
+            lines.extend(histogram.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception:
+                continue  # A failing collector must not break the scrape
+            for name, kind, help, samples in families:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_format_labels({'service': self.service, **labels})} {_format_value(value)}"
+                          for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def record_stage(name, seconds):
+    """Record a stage duration in the histogram and the current request's Server-Timing"""
+    metrics.stage_seconds.observe(seconds, service=metrics.service, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as one stage; usable in sync and async code and in threadpool calls"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def outgoing_headers():
+    """Headers that carry the request id on a call to another service"""
+    request_id = _request_id.get()
+    return {REQUEST_ID_HEADER: request_id} if request_id else {}
+
+
+def add_remote_timings(header, prefix):
+    """
+    Add another service's Server-Timing entries (e.g. "fit;dur=812.4") to the
+    current request's header as prefix.name. They are not recorded in this
+    service's histograms: the other service exports its own.
+    """
+    timings = _timings.get()
+    if timings is None or not header:
+        return
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        duration = next((p.strip()[4:] for p in params.split(";") if p.strip().startswith("dur=")), None)
+        if name and name != "total" and duration is not None:
+            try:
+                timings.append((f"{prefix}.{name}", float(duration) / 1000))
+            except ValueError:
+                pass
+
+
+def server_timing(timings, total):
+    """Server-Timing header value; repeated stages are summed, in first-seen order"""
+    summed = {}
+    for name, seconds in timings:
+        summed[name] = summed.get(name, 0.0) + seconds
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in summed.items()]
+    return ", ".join(entries + [f"total;dur={total * 1000:.1f}"])
+
+
+class InstrumentationMiddleware:
+    """Pure ASGI middleware, so streamed responses are passed through untouched"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(REQUEST_ID_HEADER.lower().encode(), b"").decode("latin-1")[:128] or uuid.uuid4().hex
+        request_token = _request_id.set(request_id)
+        timings = []
+        timings_token = _timings.set(timings)
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                extra = [
+                    (REQUEST_ID_HEADER.lower().encode(), request_id.encode("latin-1")),
+                    (b"server-timing", server_timing(timings, time.perf_counter() - started).encode("latin-1")),
+                ]
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            route = scope.get("route")
+            metrics.request_seconds.observe(
+                time.perf_counter() - started, service=metrics.service, method=scope["method"],
+                # Route templates keep label cardinality bounded
+                route=getattr(route, "path", "unmatched"), status=status)
+            _timings.reset(timings_token)
+            _request_id.reset(request_token)
+
+
+def sample_stacks(seconds, interval):
+    """
+    Sample every other thread's Python stack each interval for seconds.
+    Returns collapsed stacks ("outer;inner;leaf count" per line), the input
+    format of flamegraph.pl and speedscope.
+    """
+    counts = collections.Counter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def instrument(app, service):
+    """Add request timing, /metrics and (if PROFILER_ENABLED) /debug/profile to a FastAPI app"""
+    metrics.service = service
+    app.add_middleware(InstrumentationMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def get_metrics():
+        return PlainTextResponse(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+    if PROFILER_ENABLED:
+        @app.get("/debug/profile", include_in_schema=False)
+        async def get_profile(seconds: float = Query(10, gt=0, le=PROFILER_MAX_SECONDS),
+                              interval_ms: float = Query(5, ge=1)):
+            """Collapsed stacks of this process (training subprocesses are not sampled)"""
+            stacks = await run_in_threadpool(sample_stacks, seconds, interval_ms / 1000)
+            return PlainTextResponse(stacks)
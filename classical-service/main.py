@@ -1,4 +1,5 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 import pandas as pd
@@ -7,61 +8,225 @@ from statsmodels.tsa.arima.model import ARIMA
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 from statsmodels.tsa.holtwinters import ExponentialSmoothing
 import pmdarima as pm
+import json
+from model_state import store
+import order_search
+import intervals
+from training_executor import executor, TrainingTimeout
+import wire_format as wire
+from instrumentation import instrument, metrics, stage
 
 app = FastAPI(title="Classical Forecasting Service")
+instrument(app, "classical")
 
 class ForecastRequest(BaseModel):
-    data: List[dict]  # List of records e.g. [{'date': '...', 'value': 10}, ...]
+    data: List[dict]  # List of records e.g. [{'date': '...', 'value': 10}, ...]; empty for columnar requests
     target_column: str
     date_column: str
     model: str  # 'arima', 'sarima', 'es'
     horizon: int = 10
     params: Optional[dict] = {}
+    series_id: Optional[str] = None  # Key for incremental state, defaults to the city column
+    quantiles: Optional[List[float]] = None  # e.g. [0.1, 0.9] to also return prediction quantiles
+
+def model_settings(model_name, params):
+    """
+    Resolve the configuration used to build a model from request params.
+    With params['auto'], ARIMA/SARIMA orders are replaced by a searched order.
+    """
+    if model_name == 'arima':
+        return {'order': tuple(params.get('order', (1, 1, 1)))}
+    elif model_name == 'sarima':
+        return {
+            'order': tuple(params.get('order', (1, 1, 1))),
+            'seasonal_order': tuple(params.get('seasonal_order', (1, 1, 1, 12)))
+        }
+    elif model_name == 'es':
+        return {
+            'trend': params.get('trend', 'add'),
+            'seasonal': params.get('seasonal', 'add'),
+            'seasonal_periods': params.get('seasonal_periods', 12)
+        }
+    raise HTTPException(status_code=400, detail=f"Unknown model: {model_name}")
+
+def es_start_params(results):
+    """Build Holt-Winters optimizer start values from a previous fit"""
+    params = results.params
+    optimized = results.params_formatted['optimized']
+    names = ['smoothing_level', 'smoothing_trend', 'smoothing_seasonal',
+             'initial_level', 'initial_trend', 'damping_trend']
+    start = [params[n] for n in names if n in optimized.index and optimized[n]]
+    seasons = [f'initial_seasons.{i}' for i in range(len(params['initial_seasons']))]
+    start += [params['initial_seasons'][i] for i, n in enumerate(seasons)
+              if n in optimized.index and optimized[n]]
+    return np.array(start)
+
+def fit_model(model_name, settings, series, previous=None):
+    """Fit a model on the full series, warm-starting from a previous fit when possible"""
+    if model_name == 'arima':
+        return ARIMA(series, order=settings['order']).fit()
+    elif model_name == 'sarima':
+        model = SARIMAX(series, order=settings['order'], seasonal_order=settings['seasonal_order'])
+        start_params = previous.params if previous is not None else None
+        return model.fit(start_params=start_params, disp=False)
+    model = ExponentialSmoothing(series, trend=settings['trend'], seasonal=settings['seasonal'],
+                                 seasonal_periods=settings['seasonal_periods'])
+    if previous is not None:
+        try:
+            return model.fit(start_params=es_start_params(previous), use_brute=False)
+        except Exception:
+            pass
+    return model.fit()
+
+def append_model(model_name, settings, results, new_values, series):
+    """Extend fitted results with new observations without re-estimating from scratch"""
+    if model_name in ('arima', 'sarima'):
+        # State-space models: run the filter forward over the new data only
+        return results.append(new_values)
+    # Holt-Winters has no append; re-optimize starting from the previous parameters
+    return fit_model(model_name, settings, series, previous=results)
+
+def forecast_quantiles(model_name, results, horizon, quantiles):
+    """
+    Prediction quantiles from a fitted model: analytic (state-space forecast
+    variance) for ARIMA/SARIMA, simulated from the fitted model for Holt-Winters.
+    """
+    if model_name in ('arima', 'sarima'):
+        prediction = results.get_forecast(horizon)
+        return intervals.normal_quantiles(prediction.predicted_mean, prediction.se_mean, quantiles)
+    paths = results.simulate(horizon, anchor='end', repetitions=intervals.BOOTSTRAP_PATHS,
+                             error='add', random_state=intervals.BOOTSTRAP_SEED)
+    return intervals.empirical_quantiles(np.asarray(paths).reshape(horizon, -1).T, quantiles)
+
+def series_key(request, df):
+    """Identify the series a request belongs to, or None if it cannot be tracked"""
+    if request.series_id:
+        return request.series_id
+    if 'city' in df.columns and df['city'].nunique() == 1:
+        return str(df['city'].iloc[0])
+    return None
+
+def state_metric_families():
+    """Incremental model state for the /metrics endpoint"""
+    stats = store.stats()
+    return [
+        ("model_state_updates_total", "counter", "Stored fits served per update kind",
+         [({"update": kind}, stats[kind]) for kind in ("cached", "append", "refit")]),
+        ("model_states", "gauge", "Stored fits", [({}, stats["states"])]),
+    ]
+
+metrics.add_collector(executor.metric_families)
+metrics.add_collector(state_metric_families)
+
+@app.on_event("startup")
+def startup_event():
+    executor.start(preload=["main"])
+
+@app.on_event("shutdown")
+def shutdown_event():
+    executor.shutdown()
 
 @app.post("/predict")
-def predict(request: ForecastRequest):
+async def predict(http_request: Request, x_request_timeout: Optional[float] = Header(None)):
+    """Forecast from a JSON ForecastRequest or a columnar payload, chosen by Content-Type"""
+    with stage("decode"):
+        request, df = await wire.read_forecast_request(http_request, ForecastRequest)
+    return await run_in_threadpool(forecast, request, df, x_request_timeout)
+
+def forecast(request: ForecastRequest, df: pd.DataFrame, x_request_timeout: Optional[float] = None):
     try:
-        df = pd.DataFrame(request.data)
         df[request.date_column] = pd.to_datetime(df[request.date_column])
         df = df.sort_values(by=request.date_column)
-        series = df[request.target_column].values
+        series = df[request.target_column].values.astype(float)
+        
+        model_name = request.model.lower()
+        settings = model_settings(model_name, request.params)
+        quantiles = intervals.check_quantiles(request.quantiles) if request.quantiles else None
+        key = series_key(request, df)
         
-        forecast = []
+        # Auto order: reuse the order selected for this series, or search for one
+        order_report = None
+        if request.params.get('auto') and model_name in ('arima', 'sarima'):
+            # The seasonal_order default (period 12) is for manual fits; searches
+            # only take a period the caller asked for
+            explicit = request.params.get('seasonal_order')
+            with stage("order_search"):
+                settings, order_report = order_search.resolve_order(
+                    executor, key, model_name, series, settings,
+                    seasonal_period=explicit[3] if explicit else None, timeout=x_request_timeout)
         
-        if request.model.lower() == 'arima':
-            # Simple auto-arima or fixed order
-            order = request.params.get('order', (1, 1, 1))
-            model = ARIMA(series, order=order)
-            model_fit = model.fit()
-            forecast = model_fit.forecast(steps=request.horizon)
-            
-        elif request.model.lower() == 'sarima':
-            order = request.params.get('order', (1, 1, 1))
-            seasonal_order = request.params.get('seasonal_order', (1, 1, 1, 12))
-            model = SARIMAX(series, order=order, seasonal_order=seasonal_order)
-            model_fit = model.fit(disp=False)
-            forecast = model_fit.forecast(steps=request.horizon)
-            
-        elif request.model.lower() == 'es':
-            # Exponential Smoothing
-            trend = request.params.get('trend', 'add')
-            seasonal = request.params.get('seasonal', 'add')
-            seasonal_periods = request.params.get('seasonal_periods', 12)
-            model = ExponentialSmoothing(series, trend=trend, seasonal=seasonal, seasonal_periods=seasonal_periods)
-            model_fit = model.fit()
-            forecast = model_fit.forecast(request.horizon)
-            
+        # Full fits run in the training process pool, bounded by the caller's timeout
+        def fit(values, previous=None):
+            return executor.run(model_name, fit_model, model_name, settings, values, previous,
+                                timeout=x_request_timeout)
+        
+        # Appends too: a Holt-Winters append is a full re-optimization
+        def append(results, new_values, values):
+            return executor.run(model_name, append_model, model_name, settings, results, new_values, values,
+                                timeout=x_request_timeout)
+        
+        if key is None:
+            # Untracked series: plain cold-start fit
+            with stage("fit"):
+                model_fit = fit(series)
+            update = "refit"
         else:
-            raise HTTPException(status_code=400, detail=f"Unknown model: {request.model}")
+            # Tracked series: reuse and incrementally update the stored fit
+            dates = df[request.date_column].values
+            state_key = (key, model_name, json.dumps(settings, sort_keys=True))
+            with stage("fit"):
+                model_fit, update = store.get_results(
+                    state_key, dates, series, fit, append
+                )
         
-        return {
+        with stage("predict"):
+            predictions = np.asarray(model_fit.forecast(request.horizon))
+        
+        response = {
             "model": request.model,
-            "forecast": forecast.tolist()
+            "forecast": predictions.tolist(),
+            "update": update
         }
+        if quantiles:
+            with stage("intervals"):
+                response["quantiles"] = forecast_quantiles(model_name, model_fit, request.horizon, quantiles)
+        if order_report is not None:
+            response["order_search"] = order_report
+        return response
         
+    except HTTPException:
+        raise
+    except TrainingTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/state/stats")
+def state_stats():
+    """Get incremental model state statistics"""
+    return store.stats()
+
+@app.get("/orders/stats")
+def order_stats():
+    """Get auto-ARIMA order cache statistics"""
+    return order_search.orders.stats()
+
+@app.get("/training/stats")
+def training_stats():
+    """Get training pool queue depth and fit timings per model"""
+    return executor.stats()
+
+@app.delete("/state")
+def clear_state():
+    """Drop all stored model state, forcing full refits"""
+    store.clear()
+    return {"success": True}
+
+@app.delete("/state/{series_id}")
+def discard_state(series_id: str):
+    """Drop stored model state for one series (e.g. a finished backtest run)"""
+    return {"success": True, "removed": store.discard_series(series_id)}
+
 if __name__ == "__main__":
     import uvicorn
     import os
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Refit thresholds - read from environment variables so deployments can tune them
+MAX_APPENDS = int(os.getenv("CLASSICAL_MAX_APPENDS", 30))
+MAX_AGE_SECONDS = float(os.getenv("CLASSICAL_MAX_STATE_AGE_SECONDS", 6 * 60 * 60))
+DRIFT_SIGMA = float(os.getenv("CLASSICAL_DRIFT_SIGMA", 4.0))
+MAX_STATES = int(os.getenv("CLASSICAL_MAX_STATES", 512))
+
+
+class FittedState:
+    """Fitted results for one (series, model, params) plus the data it has seen"""
+
+    def __init__(self, results, dates, values):
+        self.results = results
+        self.dates = dates
+        self.values = values
+        self.fitted_at = time.time()
+        self.appends = 0
+        self.scale = robust_scale(values - results.fittedvalues)
+
+
+def robust_scale(resid):
+    """Median-absolute-deviation estimate of the residual standard deviation"""
+    resid = np.asarray(resid, dtype=float)
+    resid = resid[np.isfinite(resid)]
+    if len(resid) == 0:
+        return 0.0
+    return float(1.4826 * np.median(np.abs(resid - np.median(resid))))
+
+
+def new_observations(state, dates, values):
+    """
+    Return the observations in (dates, values) that come after the stored
+    state, or None if the stored state cannot serve the request: the
+    overlapping history no longer matches, or the request ends before the
+    state does (its results would forecast from a later origin). Either
+    way a full refit is needed.
+    """
+    last_date = state.dates[-1]
+    if dates[-1] < last_date:
+        return None
+    overlap = dates <= last_date
+    old_dates, old_values = dates[overlap], values[overlap]
+    if len(old_dates):
+        pos = np.searchsorted(state.dates, old_dates)
+        if pos.max() >= len(state.dates) or not np.array_equal(state.dates[pos], old_dates):
+            return None
+        if not np.allclose(state.values[pos], old_values):
+            return None
+    return dates[~overlap], values[~overlap]
+
+
+class StateStore:
+    """
+    Keeps fitted classical models per key and updates them incrementally.
+
+    fit_fn(values, previous) must return fitted results for the full series,
+    optionally warm-starting from previous results. append_fn(results, new_values,
+    all_values) must return results extended with the new observations.
+    """
+
+    def __init__(self, max_states=MAX_STATES):
+        self.max_states = max_states
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.counts = {"cached": 0, "append": 0, "refit": 0}
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _store(self, key, state):
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_states:
+                old_key, _ = self._states.popitem(last=False)
+                self._key_locks.pop(old_key, None)
+
+    def _refit_reason(self, state, new_values):
+        if state.appends + len(new_values) > MAX_APPENDS:
+            return "stale"
+        if time.time() - state.fitted_at > MAX_AGE_SECONDS:
+            return "stale"
+        if state.scale > 0:
+            expected = np.asarray(state.results.forecast(len(new_values)))
+            errors = np.abs(new_values - expected) / state.scale
+            if errors.max() > DRIFT_SIGMA:
+                return "drift"
+        return None
+
+    def get_results(self, key, dates, values, fit_fn, append_fn):
+        """Return (results, update_kind) for the series, updating stored state"""
+        with self._key_lock(key):
+            with self._lock:
+                state = self._states.get(key)
+
+            if state is not None:
+                extra = new_observations(state, dates, values)
+                if extra is not None:
+                    new_dates, new_values = extra
+                    if len(new_values) == 0:
+                        self._store(key, state)
+                        self.counts["cached"] += 1
+                        return state.results, "cached"
+
+                    if self._refit_reason(state, new_values) is None:
+                        all_dates = np.concatenate([state.dates, new_dates])
+                        all_values = np.concatenate([state.values, new_values])
+                        results = append_fn(state.results, new_values, all_values)
+                        appends = state.appends + len(new_values)
+                        fitted_at = state.fitted_at
+                        state = FittedState(results, all_dates, all_values)
+                        state.appends = appends
+                        state.fitted_at = fitted_at
+                        self._store(key, state)
+                        self.counts["append"] += 1
+                        return results, "append"
+
+            previous = state.results if state is not None else None
+            results = fit_fn(values, previous)
+            self._store(key, FittedState(results, dates, values))
+            self.counts["refit"] += 1
+            return results, "refit"
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+            self._key_locks.clear()
+
+    def discard_series(self, series_id):
+        """Drop every stored fit for one series id; returns how many were dropped"""
+        with self._lock:
+            keys = [key for key in self._states if key[0] == series_id]
+            for key in keys:
+                del self._states[key]
+                self._key_locks.pop(key, None)
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "states": len(self._states),
+                "max_states": self.max_states,
+                "max_appends": MAX_APPENDS,
+                "max_age_seconds": MAX_AGE_SECONDS,
+                "drift_sigma": DRIFT_SIGMA,
+                **self.counts,
+            }
+
+
+store = StateStore()
@@ -0,0 +1,135 @@
+import itertools
+import os
+import threading
+import time
+import warnings
+
+import numpy as np
+import pmdarima as pm
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+# How long a selected order is reused before searching again
+ORDER_TTL_SECONDS = float(os.getenv("AUTO_ARIMA_ORDER_TTL_SECONDS", 24 * 60 * 60))
+MAX_P = int(os.getenv("AUTO_ARIMA_MAX_P", 3))
+MAX_Q = int(os.getenv("AUTO_ARIMA_MAX_Q", 3))
+MAX_SEASONAL_PQ = int(os.getenv("AUTO_ARIMA_MAX_SEASONAL_PQ", 1))
+
+# Daily data with a weekly cycle
+DEFAULT_SEASONAL_PERIOD = 7
+
+
+def score_candidate(series, order, seasonal_order):
+    """Fit one candidate and return its AIC (inf if the fit fails); runs in the training pool"""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            results = SARIMAX(series, order=order, seasonal_order=seasonal_order).fit(disp=False)
+        aic = float(results.aic)
+        return aic if np.isfinite(aic) else float("inf")
+    except Exception:
+        return float("inf")
+
+
+def candidate_orders(series, seasonal, m):
+    """
+    Candidate (order, seasonal_order) pairs. Differencing orders come from
+    unit-root tests (pmdarima ndiffs/nsdiffs) so only p/q/P/Q are searched.
+    """
+    d = int(pm.arima.ndiffs(series, test="kpss", max_d=2))
+    orders = [(p, d, q) for p, q in itertools.product(range(MAX_P + 1), range(MAX_Q + 1))]
+    if not seasonal:
+        return [(order, (0, 0, 0, 0)) for order in orders]
+
+    D = int(pm.arima.nsdiffs(series, m=m, max_D=1)) if len(series) >= 2 * m else 0
+    seasonal_orders = [
+        (P, D, Q, m) for P, Q in itertools.product(range(MAX_SEASONAL_PQ + 1), range(MAX_SEASONAL_PQ + 1))
+    ]
+    return list(itertools.product(orders, seasonal_orders))
+
+
+class OrderCache:
+    """Selected orders per (series, model, seasonal period) with a time-to-live"""
+
+    def __init__(self, ttl=ORDER_TTL_SECONDS):
+        self.ttl = ttl
+        self._orders = {}
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.reused = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._orders.get(key)
+            if entry is None or time.time() - entry["selected_at"] > self.ttl:
+                return None
+            self.reused += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._orders[key] = entry
+            self.searches += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "orders": len(self._orders),
+                "ttl_seconds": self.ttl,
+                "searches": self.searches,
+                "reused": self.reused,
+            }
+
+
+orders = OrderCache()
+
+
+def resolve_order(executor, key, model_name, series, settings, seasonal_period=None, timeout=None):
+    """
+    Return (settings with the selected order, search report). Reuses a cached
+    order for key when it is still fresh; otherwise fits every candidate in
+    parallel on the training pool and keeps the lowest-AIC order. SARIMA
+    candidates use seasonal_period when the caller gave one (e.g. from an
+    explicit seasonal_order), otherwise DEFAULT_SEASONAL_PERIOD.
+    """
+    seasonal = model_name == "sarima"
+    m = (seasonal_period or DEFAULT_SEASONAL_PERIOD) if seasonal else 0
+    cache_key = (key, model_name, m) if key is not None else None
+    entry = orders.get(cache_key) if cache_key is not None else None
+
+    if entry is None:
+        candidates = candidate_orders(series, seasonal, m)
+        started = time.perf_counter()
+        scores = executor.run_many(
+            "auto_" + model_name, score_candidate,
+            [(series, order, seasonal_order) for order, seasonal_order in candidates],
+            timeout=timeout
+        )
+        best = int(np.argmin(scores))
+        if not np.isfinite(scores[best]):
+            raise ValueError("No candidate order could be fitted")
+        entry = {
+            "order": candidates[best][0],
+            "seasonal_order": candidates[best][1],
+            "aic": scores[best],
+            "candidates": len(candidates),
+            "search_seconds": round(time.perf_counter() - started, 3),
+            "selected_at": time.time(),
+        }
+        if cache_key is not None:
+            orders.put(cache_key, entry)
+        cached = False
+    else:
+        cached = True
+
+    settings = dict(settings, order=tuple(entry["order"]))
+    if seasonal:
+        settings["seasonal_order"] = tuple(entry["seasonal_order"])
+    report = {
+        "cached": cached,
+        "order": list(entry["order"]),
+        "seasonal_order": list(entry["seasonal_order"]) if seasonal else None,
+        "aic": round(entry["aic"], 3),
+        "candidates": entry["candidates"],
+        "search_seconds": entry["search_seconds"],
+    }
+    return settings, report
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from model_state import StateStore
+
+
+class FakeResults:
+    """Stands in for statsmodels results: remembers the data it was fitted through"""
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=float)
+        self.fittedvalues = self.values
+
+    def forecast(self, steps):
+        return np.repeat(self.values[-1], steps)
+
+
+def fit(values, previous):
+    return FakeResults(values)
+
+
+def append(results, new_values, all_values):
+    return FakeResults(all_values)
+
+
+def series(start, stop):
+    dates = pd.date_range("2024-01-01", periods=300).values
+    values = np.full(300, 100.0)
+    return dates[start:stop], values[start:stop]
+
+
+def test_earlier_window_after_later_one_refits():
+    store = StateStore()
+    assert store.get_results("k", *series(100, 190), fit, append)[1] == "refit"
+    assert store.get_results("k", *series(107, 197), fit, append)[1] == "append"
+
+    dates, values = series(100, 190)
+    results, kind = store.get_results("k", dates, values, fit, append)
+    assert kind == "refit"
+    assert len(results.values) == len(values)
+
+
+def test_same_window_is_cached():
+    store = StateStore()
+    store.get_results("k", *series(100, 190), fit, append)
+    assert store.get_results("k", *series(100, 190), fit, append)[1] == "cached"
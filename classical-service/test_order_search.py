@@ -0,0 +1,35 @@
+import numpy as np
+
+import order_search
+
+
+class SerialExecutor:
+    """Scores candidates in-process instead of on the training pool"""
+
+    def run_many(self, model, fn, arg_list, timeout=None):
+        return [fn(*args) for args in arg_list]
+
+
+def weekly_series():
+    rng = np.random.default_rng(0)
+    days = np.arange(140)
+    return 100 + 20 * np.sin(2 * np.pi * days / 7) + rng.normal(0, 2, len(days))
+
+
+def search(monkeypatch, **kwargs):
+    monkeypatch.setattr(order_search, "MAX_P", 1)
+    monkeypatch.setattr(order_search, "MAX_Q", 0)
+    monkeypatch.setattr(order_search, "orders", order_search.OrderCache())
+    settings = {"order": (1, 1, 1), "seasonal_order": (1, 1, 1, 12)}
+    return order_search.resolve_order(SerialExecutor(), "k", "sarima", weekly_series(), settings, **kwargs)
+
+
+def test_default_period_is_weekly(monkeypatch):
+    settings, report = search(monkeypatch)
+    assert settings["seasonal_order"][3] == order_search.DEFAULT_SEASONAL_PERIOD == 7
+    assert report["seasonal_order"][3] == 7
+
+
+def test_explicit_period_is_kept(monkeypatch):
+    settings, report = search(monkeypatch, seasonal_period=12)
+    assert settings["seasonal_order"][3] == 12
@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+from training_executor import TrainingExecutor
+
+
+def timed_sleep(seconds):
+    started = time.time()
+    time.sleep(seconds)
+    return started, time.time()
+
+
+def most_overlapping(intervals):
+    return max(sum(1 for s, e in intervals if s <= start < e) for start, _ in intervals)
+
+
+@pytest.fixture
+def executor():
+    executor = TrainingExecutor(workers=3)
+    executor.start()
+    yield executor
+    executor.shutdown()
+
+
+def test_one_model_leaves_a_worker_free(executor):
+    executor.run_many("sarima", timed_sleep, [(0.01,)])
+    assert executor.stats()["models"]["sarima"]["limit"] == 2
+
+
+def test_batch_runs_no_more_fits_than_its_slots(executor, monkeypatch):
+    monkeypatch.setenv("TRAINING_MAX_CONCURRENT_AUTO_SARIMA", "2")
+    intervals = executor.run_many("auto_sarima", timed_sleep, [(0.3,)] * 6)
+    assert len(intervals) == 6
+    assert most_overlapping(intervals) <= 2
+    stats = executor.stats()["models"]["auto_sarima"]
+    assert stats["running"] == 0 and stats["completed"] == 1
@@ -0,0 +1,128 @@
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+# Packed columnar payload for /predict, shared by the gateway and the classical,
+# ML and DL services; each service directory carries its own copy because every
+# service builds as its own image.
+#
+# Layout: b"FCOL" | uint32 header length | JSON header | column buffers.
+# The header holds the request metadata and, per column, its dtype, byte offset
+# and (for text columns) the dictionary of values. Buffers are 8-byte aligned
+# so decoding is np.frombuffer over the request body, without copying.
+
+CONTENT_TYPE = "application/x-forecast-columns"
+JSON_CONTENT_TYPE = "application/json"
+
+MAGIC = b"FCOL"
+ALIGNMENT = 8
+
+
+class WireFormatError(ValueError):
+    """Raised when a columnar payload cannot be decoded"""
+
+
+def _pad(length):
+    return -length % ALIGNMENT
+
+
+def _column_buffer(series):
+    """Return (values array, column header) for one column"""
+    if pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype=np.bool_), {"kind": "values"}
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(), {"kind": "values"}
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy(dtype="datetime64[ns]"), {"kind": "values"}
+    # Text columns are dictionary encoded: int32 codes plus the distinct values
+    codes, categories = pd.factorize(series.astype(object), use_na_sentinel=True)
+    return codes.astype(np.int32), {"kind": "dictionary", "categories": [str(c) for c in categories]}
+
+
+def encode_frame(df, meta, date_column=None):
+    """
+    Pack a DataFrame and request metadata into a columnar payload.
+    A date_column holding ISO date strings is sent as datetime64 values.
+    """
+    buffers = []
+    columns = []
+    offset = 0
+    for name in df.columns:
+        series = df[name]
+        if name == date_column and not pd.api.types.is_datetime64_any_dtype(series):
+            series = pd.to_datetime(series)
+        values, column = _column_buffer(series)
+        values = np.ascontiguousarray(values)
+        data = values.tobytes()
+        column.update({"name": str(name), "dtype": values.dtype.str, "offset": offset})
+        columns.append(column)
+        buffers.append(data + b"\0" * _pad(len(data)))
+        offset += len(data) + _pad(len(data))
+
+    header = json.dumps({"meta": meta, "rows": len(df), "columns": columns}).encode()
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+    prefix += b"\0" * _pad(len(prefix))
+    return b"".join([prefix] + buffers)
+
+
+def decode_frame(body):
+    """Unpack a columnar payload into (DataFrame, metadata dict)"""
+    if len(body) < 8 or body[:4] != MAGIC:
+        raise WireFormatError("Not a columnar forecast payload")
+    (header_length,) = struct.unpack_from("<I", body, 4)
+    try:
+        header = json.loads(body[8:8 + header_length])
+    except ValueError as exc:
+        raise WireFormatError(f"Invalid payload header: {exc}")
+    base = 8 + header_length
+    base += _pad(base)
+    rows = header["rows"]
+
+    data = {}
+    for column in header["columns"]:
+        values = np.frombuffer(body, dtype=np.dtype(column["dtype"]), count=rows,
+                               offset=base + column["offset"])
+        if column["kind"] == "dictionary":
+            values = pd.Categorical.from_codes(values, categories=column["categories"])
+        data[column["name"]] = values
+    return pd.DataFrame(data, copy=False), header["meta"]
+
+
+def _parse_model(request_model, values):
+    try:
+        return request_model(**values)
+    except ValidationError as exc:
+        raise RequestValidationError(exc.errors())
+
+
+async def read_forecast_request(http_request, request_model):
+    """
+    Read a /predict body as either JSON or the columnar format, chosen by the
+    Content-Type header. Returns (request_model instance, DataFrame of the data).
+    Columnar requests skip per-record validation; the metadata is still validated.
+    """
+    content_type = http_request.headers.get("content-type", JSON_CONTENT_TYPE).split(";")[0].strip().lower()
+    body = await http_request.body()
+
+    if content_type == CONTENT_TYPE:
+        try:
+            df, meta = decode_frame(body)
+        except (WireFormatError, KeyError, TypeError, ValueError) as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid columnar payload: {exc}")
+        return _parse_model(request_model, {**meta, "data": []}), df
+
+    if content_type != JSON_CONTENT_TYPE:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type}")
+    try:
+        values = json.loads(body)
+    except ValueError as exc:
+        raise RequestValidationError([{"type": "json_invalid", "loc": ("body",), "msg": str(exc), "input": None}])
+    if not isinstance(values, dict):
+        raise RequestValidationError([{"type": "dict_type", "loc": ("body",), "msg": "Input should be an object", "input": None}])
+    request = _parse_model(request_model, values)
+    return request, pd.DataFrame(request.data)
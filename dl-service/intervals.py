@@ -0,0 +1,68 @@
+import os
+from statistics import NormalDist
+
+import numpy as np
+from fastapi import HTTPException
+
+# Prediction quantiles for /predict, shared by the classical, ML and DL
+# services; each service directory carries its own copy because every
+# service builds as its own image.
+
+# Simulated paths per bootstrap forecast
+BOOTSTRAP_PATHS = int(os.getenv("INTERVAL_BOOTSTRAP_PATHS", 1000))
+BOOTSTRAP_SEED = 42
+
+
+def check_quantiles(quantiles):
+    """Validate requested quantiles, returning them as a sorted float list"""
+    quantiles = sorted(float(q) for q in quantiles)
+    if not quantiles or any(not 0 < q < 1 for q in quantiles):
+        raise HTTPException(status_code=400, detail="quantiles must be between 0 and 1 (exclusive)")
+    return quantiles
+
+
+def quantile_label(q):
+    """Response key for a quantile, e.g. 0.9 -> 'p90', 0.025 -> 'p2.5'"""
+    return f"p{round(q * 100, 6):g}"
+
+
+def normal_quantiles(mean, std, quantiles):
+    """Quantiles of Gaussian forecast distributions (analytic intervals)"""
+    mean, std = np.asarray(mean, dtype=float), np.asarray(std, dtype=float)
+    return {quantile_label(q): (mean + NormalDist().inv_cdf(q) * std).tolist() for q in quantiles}
+
+
+def empirical_quantiles(samples, quantiles):
+    """Quantiles per step of a (samples, horizon) array"""
+    values = np.quantile(samples, quantiles, axis=0)
+    return {quantile_label(q): row.tolist() for q, row in zip(quantiles, values)}
+
+
+def residual_quantiles(point, residuals, quantiles):
+    """
+    Point forecast plus empirical residual quantiles. residuals is (rows,) for
+    one error distribution or (rows, horizon) for one per step (direct models).
+    """
+    offsets = np.quantile(residuals, quantiles, axis=0)
+    point = np.asarray(point, dtype=float)
+    return {quantile_label(q): (point + offset).tolist() for q, offset in zip(quantiles, offsets)}
+
+
+def bootstrap_paths(predict_step, last_window, residuals, horizon, paths=BOOTSTRAP_PATHS, seed=BOOTSTRAP_SEED):
+    """
+    Residual bootstrap for a recursive forecaster, simulating every path at once.
+
+    predict_step(step, windows) maps a (paths, lags) array of lag windows
+    (oldest first) to (paths,) one-step predictions. All shocks are drawn up
+    front and each step is a single batched predict over every path, so the
+    cost is horizon predict calls rather than paths x horizon.
+    Returns a (paths, horizon) array of simulated values.
+    """
+    lags = len(last_window)
+    rng = np.random.default_rng(seed)
+    shocks = rng.choice(np.asarray(residuals, dtype=float), size=(paths, horizon))
+    values = np.empty((paths, lags + horizon))
+    values[:, :lags] = last_window
+    for i in range(horizon):
+        values[:, lags + i] = predict_step(i, values[:, i:i + lags]) + shocks[:, i]
+    return values[:, lags:]
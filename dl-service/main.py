@@ -1,74 +1,190 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
+import hashlib
+import os
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.linear_model import Ridge
+import sequence_models
+from training_executor import executor, TrainingTimeout
+from weight_store import weights
+import intervals
+import wire_format as wire
+from instrumentation import instrument, metrics, stage
 
 app = FastAPI(title="DL Forecasting Service")
+instrument(app, "dl")
 
 class ForecastRequest(BaseModel):
-    data: List[dict]
+    data: List[dict]  # Empty for columnar requests, whose rows travel in the packed body
     target_column: str
     date_column: str
-    model: str
+    model: str  # 'lstm', 'gru', 'transformer'
     horizon: int = 10
     params: Optional[dict] = {}
     feature_columns: Optional[List[str]] = None
+    series_id: Optional[str] = None  # Key for stored weights, defaults to the city column
+    quantiles: Optional[List[float]] = None  # e.g. [0.1, 0.9] to also return prediction quantiles
+
+# Model size and training schedule
+LOOK_BACK = int(os.getenv("DL_LOOK_BACK", 14))
+HIDDEN_UNITS = int(os.getenv("DL_HIDDEN_UNITS", 16))
+EPOCHS = int(os.getenv("DL_EPOCHS", 300))
+LEARNING_RATE = float(os.getenv("DL_LEARNING_RATE", 0.01))
+# New data fine-tunes stored weights for a few epochs; after this many
+# fine-tunes the model is retrained from scratch
+FINETUNE_EPOCHS = int(os.getenv("DL_FINETUNE_EPOCHS", 50))
+MAX_FINETUNES = int(os.getenv("DL_MAX_FINETUNES", 30))
+
+# Minimum training windows
+MIN_WINDOWS = 10
+
+def series_key(request, df):
+    """Identify the series a request belongs to, or None if it cannot be tracked"""
+    if request.series_id:
+        return request.series_id
+    if 'city' in df.columns and df['city'].nunique() == 1:
+        return str(df['city'].iloc[0])
+    return None
+
+def load_or_train(kind, key, series, look_back, hidden, timeout):
+    """
+    Weights and scaling for a series: reused when trained on exactly this
+    data, fine-tuned from stored weights when the data has moved on, and
+    trained from scratch otherwise. Returns (params, meta, update).
+    Concurrent requests for one series and model wait for a single training.
+    """
+    if key is None:
+        return train_weights(kind, None, series, look_back, hidden, timeout)
+    with weights.key_lock((key, kind)):
+        return train_weights(kind, key, series, look_back, hidden, timeout)
+
+def train_weights(kind, key, series, look_back, hidden, timeout):
+    config = {"look_back": look_back, "hidden": hidden}
+    data_hash = hashlib.sha1(series.tobytes()).hexdigest()
+    stored = weights.get((key, kind)) if key is not None else None
+    
+    if stored is not None and stored[1]["config"] == config:
+        params, meta = stored
+        if meta["data_hash"] == data_hash:
+            return params, meta, "cached"
+        if meta["finetunes"] < MAX_FINETUNES:
+            # Keep the stored scaling so the weights stay consistent with it
+            mean, std = meta["mean"], meta["std"]
+            X, y = sequence_models.make_windows((series - mean) / std, look_back)
+            params, val_loss = executor.run(kind, sequence_models.train, kind, X, y, hidden,
+                                            FINETUNE_EPOCHS, LEARNING_RATE, params, timeout=timeout)
+            meta = dict(meta, data_hash=data_hash, finetunes=meta["finetunes"] + 1, validation_loss=val_loss)
+            weights.put((key, kind), params, meta)
+            return params, meta, "finetune"
+    
+    mean, std = float(series.mean()), float(series.std()) or 1.0
+    X, y = sequence_models.make_windows((series - mean) / std, look_back)
+    params, val_loss = executor.run(kind, sequence_models.train, kind, X, y, hidden,
+                                    EPOCHS, LEARNING_RATE, timeout=timeout)
+    meta = {"config": config, "mean": mean, "std": std, "data_hash": data_hash,
+            "finetunes": 0, "validation_loss": val_loss}
+    if key is not None:
+        weights.put((key, kind), params, meta)
+    return params, meta, "train"
+
+metrics.add_collector(executor.metric_families)
+
+@app.on_event("startup")
+def startup_event():
+    executor.start(preload=["main"])
+
+@app.on_event("shutdown")
+def shutdown_event():
+    executor.shutdown()
 
 @app.post("/predict")
-def predict(request: ForecastRequest):
+async def predict(http_request: Request, x_request_timeout: Optional[float] = Header(None)):
+    """Forecast from a JSON ForecastRequest or a columnar payload, chosen by Content-Type"""
+    with stage("decode"):
+        request, df = await wire.read_forecast_request(http_request, ForecastRequest)
+    return await run_in_threadpool(forecast, request, df, x_request_timeout)
+
+def forecast(request: ForecastRequest, df: pd.DataFrame, x_request_timeout: Optional[float] = None):
     """
-    Simplified DL service using Ridge regression as a lightweight alternative
-    This avoids TensorFlow initialization issues while providing similar functionality
+    Small LSTM/GRU/attention models written in NumPy: trained in the training
+    pool, with weights stored per series, and served by a NumPy forward pass.
     """
     try:
-        df = pd.DataFrame(request.data)
         df[request.date_column] = pd.to_datetime(df[request.date_column])
         df = df.sort_values(by=request.date_column)
         
-        # Use target column
-        series = df[request.target_column].values
-        
-        # Create lagged features
-        look_back = 10
-        X, y = [], []
-        for i in range(len(series) - look_back - 1):
-            X.append(series[i:(i + look_back)])
-            y.append(series[i + look_back])
-        
-        X = np.array(X)
-        y = np.array(y)
+        kind = request.model.lower()
+        if kind not in sequence_models.MODELS:
+            raise HTTPException(status_code=400, detail=f"Unknown model: {request.model}")
+        look_back = int(request.params.get('look_back', LOOK_BACK))
+        hidden = int(request.params.get('hidden_units', HIDDEN_UNITS))
         
-        if len(X) < 10:
+        series = df[request.target_column].to_numpy(dtype=float)
+        if len(series) - look_back < MIN_WINDOWS:
             raise HTTPException(status_code=400, detail="Not enough data")
+        quantiles = intervals.check_quantiles(request.quantiles) if request.quantiles else None
         
-        # Use Ridge regression as lightweight alternative to LSTM/GRU
-        model = Ridge(alpha=1.0)
-        model.fit(X, y)
+        with stage("fit"):
+            params, meta, update = load_or_train(kind, series_key(request, df), series, look_back, hidden,
+                                                 x_request_timeout)
+        scaled = (series - meta["mean"]) / meta["std"]
         
-        # Recursive forecasting
-        forecast = []
-        last_window = series[-look_back:]
-        current_window = last_window.copy()
+        def predict_step(step, windows):
+            return sequence_models.predict(kind, params, windows)
         
-        for _ in range(request.horizon):
-            pred = model.predict(current_window.reshape(1, -1))[0]
-            forecast.append(float(pred))
-            current_window = np.append(current_window[1:], pred)
+        # Recursive forecasting over a preallocated buffer of the window plus predictions
+        with stage("predict"):
+            values = np.empty(look_back + request.horizon)
+            values[:look_back] = scaled[-look_back:]
+            for i in range(request.horizon):
+                values[look_back + i] = predict_step(i, values[None, i:i + look_back])[0]
+            forecast = values[look_back:] * meta["std"] + meta["mean"]
         
-        return {
+        response = {
             "model": request.model,
-            "forecast": forecast,
-            "features_used": [request.target_column]
+            "forecast": forecast.tolist(),
+            "features_used": [request.target_column],
+            "update": update
         }
+        if quantiles:
+            # Residual bootstrap: every simulated path advances in one batched forward pass per step
+            with stage("intervals"):
+                X, y = sequence_models.make_windows(scaled, look_back)
+                residuals = y - sequence_models.predict(kind, params, X)
+                paths = intervals.bootstrap_paths(predict_step, scaled[-look_back:], residuals, request.horizon)
+                response["quantiles"] = intervals.empirical_quantiles(paths * meta["std"] + meta["mean"], quantiles)
+        return response
         
+    except HTTPException:
+        raise
+    except TrainingTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/training/stats")
+def training_stats():
+    """Get training pool queue depth and fit timings per model"""
+    return executor.stats()
+
+@app.get("/weights/stats")
+def weight_stats():
+    """Get stored model weight statistics"""
+    return weights.stats()
+
+@app.delete("/weights")
+def clear_weights():
+    """Drop all stored weights, forcing models to retrain"""
+    return {"success": True, "removed": weights.clear()}
+
+@app.delete("/weights/{series_id}")
+def discard_weights(series_id: str):
+    """Drop stored weights for one series (e.g. a finished backtest run)"""
+    return {"success": True, "removed": weights.discard_series(series_id)}
+
 if __name__ == "__main__":
     import uvicorn
-    import os
     port = int(os.environ.get("PORT", 8003))
     uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,247 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Small sequence models (LSTM, GRU, single-head attention) written directly in
+# NumPy. Training uses hand-written backpropagation with Adam and runs in the
+# training process pool; inference is a plain forward pass over a batch of
+# windows, so serving needs no deep learning framework at all.
+#
+# Inputs are (batch, look_back) windows of the standardized series, oldest
+# value first; every model predicts the next (standardized) value.
+
+
+def sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)
+
+
+def make_windows(series, look_back):
+    """(inputs, targets): each input row holds look_back values, oldest first, and its target the next value"""
+    windows = sliding_window_view(np.asarray(series, dtype=float), look_back + 1)
+    return windows[:, :-1], windows[:, -1]
+
+
+class LSTM:
+    """Single-layer LSTM; the last hidden state feeds a linear output"""
+
+    def init(self, rng, look_back, hidden):
+        bias = np.zeros(4 * hidden)
+        bias[hidden:2 * hidden] = 1.0  # Forget gate starts open
+        return {
+            "W": rng.normal(0, 0.5, (1, 4 * hidden)),
+            "U": rng.normal(0, 1 / np.sqrt(hidden), (hidden, 4 * hidden)),
+            "b": bias,
+            "V": rng.normal(0, 1 / np.sqrt(hidden), hidden),
+            "c": np.zeros(1),
+        }
+
+    def forward(self, params, X, cache=None):
+        H = params["U"].shape[0]
+        XW = X[:, :, None] * params["W"][0] + params["b"]
+        h = np.zeros((len(X), H))
+        c = np.zeros((len(X), H))
+        for t in range(X.shape[1]):
+            z = XW[:, t] + h @ params["U"]
+            i, f, o = sigmoid(z[:, :H]), sigmoid(z[:, H:2 * H]), sigmoid(z[:, 3 * H:])
+            g = np.tanh(z[:, 2 * H:3 * H])
+            c_next = f * c + i * g
+            tanh_c = np.tanh(c_next)
+            if cache is not None:
+                cache.append((h, c, i, f, g, o, tanh_c))
+            h, c = o * tanh_c, c_next
+        if cache is not None:
+            cache.append(h)
+        return h @ params["V"] + params["c"][0]
+
+    def backward(self, params, X, cache, dout):
+        U = params["U"]
+        h_last = cache[-1]
+        grads = {"V": h_last.T @ dout, "c": np.array([dout.sum()]), "U": np.zeros_like(U)}
+        dXW = np.empty(X.shape + (U.shape[1],))
+        dh = dout[:, None] * params["V"]
+        dc = np.zeros_like(dh)
+        for t in reversed(range(X.shape[1])):
+            h_prev, c_prev, i, f, g, o, tanh_c = cache[t]
+            dc = dc + dh * o * (1 - tanh_c ** 2)
+            dz = np.concatenate([
+                dc * g * i * (1 - i),
+                dc * c_prev * f * (1 - f),
+                dc * i * (1 - g ** 2),
+                dh * tanh_c * o * (1 - o),
+            ], axis=1)
+            dXW[:, t] = dz
+            grads["U"] += h_prev.T @ dz
+            dh = dz @ U.T
+            dc = dc * f
+        grads["W"] = np.einsum("bt,btk->k", X, dXW)[None]
+        grads["b"] = dXW.sum(axis=(0, 1))
+        return grads
+
+
+class GRU:
+    """Single-layer GRU (reset gate applied after the recurrent product); the last hidden state feeds a linear output"""
+
+    def init(self, rng, look_back, hidden):
+        return {
+            "W": rng.normal(0, 0.5, (1, 3 * hidden)),
+            "U": rng.normal(0, 1 / np.sqrt(hidden), (hidden, 3 * hidden)),
+            "b": np.zeros(3 * hidden),
+            "V": rng.normal(0, 1 / np.sqrt(hidden), hidden),
+            "c": np.zeros(1),
+        }
+
+    def forward(self, params, X, cache=None):
+        H = params["U"].shape[0]
+        XW = X[:, :, None] * params["W"][0] + params["b"]
+        h = np.zeros((len(X), H))
+        for t in range(X.shape[1]):
+            hU = h @ params["U"]
+            z = sigmoid(XW[:, t, :H] + hU[:, :H])
+            r = sigmoid(XW[:, t, H:2 * H] + hU[:, H:2 * H])
+            n = np.tanh(XW[:, t, 2 * H:] + r * hU[:, 2 * H:])
+            if cache is not None:
+                cache.append((h, hU, z, r, n))
+            h = (1 - z) * n + z * h
+        if cache is not None:
+            cache.append(h)
+        return h @ params["V"] + params["c"][0]
+
+    def backward(self, params, X, cache, dout):
+        U = params["U"]
+        H = U.shape[0]
+        h_last = cache[-1]
+        grads = {"V": h_last.T @ dout, "c": np.array([dout.sum()]), "U": np.zeros_like(U)}
+        dXW = np.empty(X.shape + (U.shape[1],))
+        dh = dout[:, None] * params["V"]
+        for t in reversed(range(X.shape[1])):
+            h_prev, hU, z, r, n = cache[t]
+            dn = dh * (1 - z) * (1 - n ** 2)
+            dz = dh * (h_prev - n) * z * (1 - z)
+            dr = dn * hU[:, 2 * H:] * r * (1 - r)
+            dXW[:, t] = np.concatenate([dz, dr, dn], axis=1)
+            dhU = np.concatenate([dz, dr, dn * r], axis=1)
+            grads["U"] += h_prev.T @ dhU
+            dh = dh * z + dhU @ U.T
+        grads["W"] = np.einsum("bt,btk->k", X, dXW)[None]
+        grads["b"] = dXW.sum(axis=(0, 1))
+        return grads
+
+
+class Transformer:
+    """
+    One attention block: the last step attends over the whole window (learned
+    positional embeddings), followed by a residual ReLU feed-forward layer.
+    """
+
+    def init(self, rng, look_back, hidden):
+        scale = 1 / np.sqrt(hidden)
+        return {
+            "w_in": rng.normal(0, 1, hidden),
+            "b_in": np.zeros(hidden),
+            "P": rng.normal(0, 0.1, (look_back, hidden)),
+            "Wq": rng.normal(0, scale, (hidden, hidden)),
+            "Wk": rng.normal(0, scale, (hidden, hidden)),
+            "Wv": rng.normal(0, scale, (hidden, hidden)),
+            "W1": rng.normal(0, scale, (hidden, 2 * hidden)),
+            "b1": np.zeros(2 * hidden),
+            "W2": rng.normal(0, 1 / np.sqrt(2 * hidden), (2 * hidden, hidden)),
+            "b2": np.zeros(hidden),
+            "V": rng.normal(0, scale, hidden),
+            "c": np.zeros(1),
+        }
+
+    def forward(self, params, X, cache=None):
+        scale = 1 / np.sqrt(params["Wq"].shape[0])
+        E = X[:, :, None] * params["w_in"] + params["b_in"] + params["P"]
+        q = E[:, -1] @ params["Wq"]
+        K = E @ params["Wk"]
+        values = E @ params["Wv"]
+        scores = np.einsum("bd,btd->bt", q, K) * scale
+        attention = np.exp(scores - scores.max(axis=1, keepdims=True))
+        attention /= attention.sum(axis=1, keepdims=True)
+        r = E[:, -1] + np.einsum("bt,btd->bd", attention, values)
+        hidden_pre = r @ params["W1"] + params["b1"]
+        hidden = np.maximum(hidden_pre, 0)
+        r2 = r + hidden @ params["W2"] + params["b2"]
+        if cache is not None:
+            cache.extend([E, q, K, values, attention, r, hidden_pre, hidden, r2])
+        return r2 @ params["V"] + params["c"][0]
+
+    def backward(self, params, X, cache, dout):
+        E, q, K, values, attention, r, hidden_pre, hidden, r2 = cache
+        scale = 1 / np.sqrt(params["Wq"].shape[0])
+        grads = {"V": r2.T @ dout, "c": np.array([dout.sum()])}
+        dr2 = dout[:, None] * params["V"]
+        grads["W2"] = hidden.T @ dr2
+        grads["b2"] = dr2.sum(axis=0)
+        dhidden = (dr2 @ params["W2"].T) * (hidden_pre > 0)
+        grads["W1"] = r.T @ dhidden
+        grads["b1"] = dhidden.sum(axis=0)
+        dr = dr2 + dhidden @ params["W1"].T
+
+        dattention = np.einsum("bd,btd->bt", dr, values)
+        dvalues = attention[:, :, None] * dr[:, None, :]
+        dscores = attention * (dattention - (dattention * attention).sum(axis=1, keepdims=True)) * scale
+        dq = np.einsum("bt,btd->bd", dscores, K)
+        dK = dscores[:, :, None] * q[:, None, :]
+        grads["Wq"] = E[:, -1].T @ dq
+        grads["Wk"] = np.einsum("btd,bte->de", E, dK)
+        grads["Wv"] = np.einsum("btd,bte->de", E, dvalues)
+
+        dE = dK @ params["Wk"].T + dvalues @ params["Wv"].T
+        dE[:, -1] += dr + dq @ params["Wq"].T
+        grads["w_in"] = np.einsum("bt,btd->d", X, dE)
+        grads["b_in"] = dE.sum(axis=(0, 1))
+        grads["P"] = dE.sum(axis=0)
+        return grads
+
+
+MODELS = {"lstm": LSTM(), "gru": GRU(), "transformer": Transformer()}
+
+
+def train(kind, X, y, hidden, epochs, learning_rate, params=None, seed=42,
+          validation=0.15, weight_decay=1e-3):
+    """
+    Fit a model by full-batch Adam on mean squared error, starting from params
+    when given (fine-tuning) or from a seeded initialization. The most recent
+    `validation` fraction of windows is held out and the weights from the
+    epoch with the lowest validation loss are kept (early stopping), since a
+    few months of daily data is easy to memorize.
+    Returns (params, best validation loss); module-level so it runs in the
+    training process pool.
+    """
+    model = MODELS[kind]
+    if params is None:
+        params = model.init(np.random.default_rng(seed), X.shape[1], hidden)
+    params = {name: value.copy() for name, value in params.items()}
+    first = {name: np.zeros_like(value) for name, value in params.items()}
+    second = {name: np.zeros_like(value) for name, value in params.items()}
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+    held_out = max(int(len(X) * validation), 1)
+    X_train, y_train, X_val, y_val = X[:-held_out], y[:-held_out], X[-held_out:], y[-held_out:]
+    best = (float(np.mean((model.forward(params, X_val) - y_val) ** 2)), params)
+
+    for step in range(1, epochs + 1):
+        cache = []
+        errors = model.forward(params, X_train, cache) - y_train
+        grads = model.backward(params, X_train, cache, 2 * errors / len(y_train))
+        # Clip the global gradient norm; recurrent gradients can spike early on
+        norm = np.sqrt(sum(float(np.sum(g ** 2)) for g in grads.values()))
+        clip = min(1.0, 1.0 / norm) if norm > 0 else 1.0
+        updated = {}
+        for name, grad in grads.items():
+            grad = grad * clip + weight_decay * params[name]
+            first[name] = beta1 * first[name] + (1 - beta1) * grad
+            second[name] = beta2 * second[name] + (1 - beta2) * grad ** 2
+            corrected = first[name] / (1 - beta1 ** step)
+            updated[name] = params[name] - learning_rate * corrected / (np.sqrt(second[name] / (1 - beta2 ** step)) + eps)
+        params = updated
+        val_loss = float(np.mean((model.forward(params, X_val) - y_val) ** 2))
+        if val_loss < best[0]:
+            best = (val_loss, params)
+    return best[1], best[0]
+
+
+def predict(kind, params, X):
+    """Forward pass over a (batch, look_back) array of windows"""
+    return MODELS[kind].forward(params, X)
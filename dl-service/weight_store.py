@@ -0,0 +1,110 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+# Directory for trained weights, one .npz file per (series, model)
+DL_MODEL_DIR = os.getenv("DL_MODEL_DIR", "models")
+
+
+class WeightStore:
+    """
+    Trained sequence-model weights per (series id, model), kept in memory and
+    persisted as .npz files so a restarted service serves without retraining.
+    Files hold plain arrays (no pickle) plus a JSON metadata entry.
+    """
+
+    def __init__(self, directory=DL_MODEL_DIR):
+        self.directory = directory
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.loads = 0
+        self.saves = 0
+
+    def _path(self, key):
+        series_id, model = key
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", series_id)
+        return os.path.join(self.directory, f"{name}__{model}.npz")
+
+    def key_lock(self, key):
+        """Lock held while a key's weights are read, trained and stored"""
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key):
+        """Return (params, meta) for key, loading from disk on first use, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                params = {name[len("param:"):]: data[name] for name in data.files if name.startswith("param:")}
+        except (OSError, ValueError, KeyError):
+            return None
+        if meta.get("key") != list(key):
+            return None
+        with self._lock:
+            self._entries[key] = (params, meta)
+            self.loads += 1
+        return params, meta
+
+    def put(self, key, params, meta):
+        """Store weights in memory and write them to disk atomically"""
+        meta = dict(meta, key=list(key))
+        with self._lock:
+            self._entries[key] = (params, meta)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **{f"param:{name}": value for name, value in params.items()})
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.saves += 1
+
+    def clear(self):
+        """Drop every stored model, in memory and on disk"""
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".npz"):
+                    os.remove(os.path.join(self.directory, name))
+        return len(keys)
+
+    def discard_series(self, series_id):
+        """Drop every model stored for one series id, in memory and on disk; returns the models dropped"""
+        with self._lock:
+            models = {model for sid, model in self._entries if sid == series_id}
+            for model in models:
+                del self._entries[(series_id, model)]
+                self._key_locks.pop((series_id, model), None)
+        prefix = os.path.basename(self._path((series_id, "")))[:-len(".npz")]
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.startswith(prefix) and name.endswith(".npz"):
+                    os.remove(os.path.join(self.directory, name))
+                    models.add(name[len(prefix):-len(".npz")])
+        return len(models)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "in_memory": len(self._entries),
+                "loads": self.loads,
+                "saves": self.saves,
+            }
+
+
+weights = WeightStore()
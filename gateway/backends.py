@@ -0,0 +1,227 @@
+import asyncio
+import contextlib
+import os
+import time
+
+import httpx
+
+import wire_format as wire
+from instrumentation import add_remote_timings, outgoing_headers, record_stage, stage
+
+# Payload format for /predict calls: "columnar" (packed NumPy columns) or "json"
+WIRE_FORMAT = os.getenv("WIRE_FORMAT", "columnar")
+
+
+class BackendOverloaded(Exception):
+    """Raised when a backend's wait queue is full"""
+
+
+class Backend:
+    """
+    Pooled HTTP client for one forecasting service.
+    Limits concurrent in-flight calls and tracks queueing/latency metrics.
+    """
+
+    def __init__(self, name, url, max_connections=8, max_queue=64, timeout=120.0, wire_format=WIRE_FORMAT):
+        self.name = name
+        self.url = url
+        self.wire_format = wire_format
+        self.max_connections = max_connections
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.client = None
+        self._slots = asyncio.Semaphore(max_connections)
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued_seen = 0
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.latency_seconds = 0.0
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            base_url=self.url,
+            timeout=httpx.Timeout(self.timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+        )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        """Hold one of the backend's call slots, rejecting if the queue is full"""
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise BackendOverloaded(f"{self.name} service queue is full ({self.queued} waiting)")
+        if self.client is None:
+            await self.start()
+
+        self.queued += 1
+        self.max_queued_seen = max(self.max_queued_seen, self.queued)
+        queued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        started_at = time.perf_counter()
+        self.wait_seconds += started_at - queued_at
+        record_stage("queue", started_at - queued_at)
+
+        self.in_flight += 1
+        self.requests += 1
+        try:
+            yield
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.latency_seconds += time.perf_counter() - started_at
+            record_stage("backend", time.perf_counter() - started_at)
+            self._slots.release()
+
+    def _headers(self, extra):
+        # Tell the service how long we will wait so it can drop fits nobody will read
+        return {"X-Request-Timeout": str(self.timeout), **outgoing_headers(), **extra}
+
+    async def post(self, path, **kwargs):
+        """POST to the backend once a slot is free, rejecting if the queue is full"""
+        async with self._slot():
+            response = await self.client.post(path, headers=self._headers(kwargs.pop("headers", {})), **kwargs)
+            # The service's own stages, e.g. ml.fit, alongside the gateway's
+            add_remote_timings(response.headers.get("server-timing"), self.name)
+            response.raise_for_status()
+            return response
+
+    @contextlib.asynccontextmanager
+    async def stream(self, path, **kwargs):
+        """
+        Like post, but yields the response before its body is read so it can
+        be relayed as it arrives; the slot is held until the context exits.
+        """
+        async with self._slot():
+            headers = self._headers(kwargs.pop("headers", {}))
+            async with self.client.stream("POST", path, headers=headers, **kwargs) as response:
+                if response.is_error:
+                    await response.aread()
+                response.raise_for_status()
+                yield response
+
+    async def predict(self, df, meta, path="/predict"):
+        """
+        Call /predict (or another forecast endpoint taking the same payload,
+        such as /predict/global) with the history in df and the request fields in meta.
+        Uses the columnar format when enabled, falling back to JSON (for good)
+        if the service answers 415 Unsupported Media Type.
+        """
+        if self.wire_format == "columnar":
+            with stage("encode"):
+                body = wire.encode_frame(df, meta, date_column=meta.get("date_column"))
+            try:
+                return await self.post(path, content=body, headers={"Content-Type": wire.CONTENT_TYPE})
+            except httpx.HTTPStatusError as exc:
+                if exc.response.status_code != 415:
+                    raise
+                self.wire_format = "json"
+        with stage("encode"):
+            payload = {**meta, "data": df.to_dict(orient='records')}
+        return await self.post(path, json=payload)
+
+    def stats(self):
+        completed = max(self.requests, 1)
+        return {
+            "url": self.url,
+            "wire_format": self.wire_format,
+            "max_connections": self.max_connections,
+            "max_queue": self.max_queue,
+            "timeout": self.timeout,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queued_seen": self.max_queued_seen,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(1000 * self.wait_seconds / completed, 2),
+            "avg_latency_ms": round(1000 * self.latency_seconds / completed, 2),
+        }
+
+
+def _backend_from_env(name, prefix, default_url, max_connections, timeout):
+    return Backend(
+        name,
+        os.getenv(f"{prefix}_SERVICE_URL", default_url),
+        max_connections=int(os.getenv(f"{prefix}_MAX_CONNECTIONS", max_connections)),
+        max_queue=int(os.getenv(f"{prefix}_MAX_QUEUE", 64)),
+        timeout=float(os.getenv(f"{prefix}_TIMEOUT", timeout)),
+    )
+
+
+# Service backends - URLs and limits read from environment variables for Docker compatibility.
+# Classical fits (SARIMA) are slow, so that service gets fewer concurrent calls by default.
+BACKENDS = {
+    "classical": _backend_from_env("classical", "CLASSICAL", "http://localhost:8001", 4, 120.0),
+    "ml": _backend_from_env("ml", "ML", "http://localhost:8002", 8, 60.0),
+    "dl": _backend_from_env("dl", "DL", "http://localhost:8003", 16, 30.0),
+}
+
+MODEL_BACKENDS = {
+    "arima": "classical", "sarima": "classical", "es": "classical",
+    "rf": "ml", "gbm": "ml", "svm": "ml", "xgboost": "ml",
+    "lstm": "dl", "gru": "dl", "transformer": "dl",
+}
+
+
+def for_model(model):
+    """Return the backend serving a model, or None if the model is unknown"""
+    name = MODEL_BACKENDS.get(model)
+    return BACKENDS[name] if name else None
+
+
+async def start_all():
+    for backend in BACKENDS.values():
+        await backend.start()
+
+
+async def wait_ready(names, timeout=120.0, interval=2.0):
+    """Wait until each named backend answers (e.g. after a cold start); returns those that never did"""
+    deadline = time.monotonic() + timeout
+    waiting = set(names)
+    while waiting:
+        for name in sorted(waiting):
+            try:
+                response = await BACKENDS[name].client.get("/training/stats", timeout=interval)
+                if response.status_code == 200:
+                    waiting.discard(name)
+            except httpx.HTTPError:
+                pass
+        if not waiting or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(interval)
+    return waiting
+
+
+async def close_all():
+    for backend in BACKENDS.values():
+        await backend.close()
+
+
+def stats():
+    return {name: backend.stats() for name, backend in BACKENDS.items()}
+
+
+def metric_families():
+    """Pool and queue state per backend, for the /metrics endpoint"""
+    by_backend = lambda field: [({"backend": name}, getattr(b, field)) for name, b in BACKENDS.items()]
+    return [
+        ("backend_in_flight", "gauge", "Calls currently running on the service", by_backend("in_flight")),
+        ("backend_queued", "gauge", "Calls waiting for a connection slot", by_backend("queued")),
+        ("backend_requests_total", "counter", "Calls sent to the service", by_backend("requests")),
+        ("backend_errors_total", "counter", "Calls that failed in transport or with an error status", by_backend("errors")),
+        ("backend_rejected_total", "counter", "Calls rejected because the wait queue was full", by_backend("rejected")),
+    ]
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+import numpy as np
+import pandas as pd
+
+import backends
+import database as db
+
+# Rolling-origin evaluation: BACKTEST_FOLDS forecast origins, BACKTEST_STEP_DAYS
+# apart, the last one BACKTEST_HORIZON days before the latest date so every
+# forecast can be scored against actuals.
+BACKTEST_FOLDS = int(os.getenv("BACKTEST_FOLDS", 8))
+BACKTEST_HORIZON = int(os.getenv("BACKTEST_HORIZON", 7))
+BACKTEST_STEP_DAYS = int(os.getenv("BACKTEST_STEP_DAYS", 7))
+BACKTEST_WINDOW_DAYS = int(os.getenv("BACKTEST_WINDOW_DAYS", 90))
+BACKTEST_MAX_CONCURRENCY = int(os.getenv("BACKTEST_MAX_CONCURRENCY", 4))
+# Queue a backtest job at startup when no metrics are stored, and after an
+# ingest that upserts at least this many rows (0 disables)
+BACKTEST_ON_STARTUP = os.getenv("BACKTEST_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+BACKTEST_AFTER_INGEST_ROWS = int(os.getenv("BACKTEST_AFTER_INGEST_ROWS", 5000))
+
+# Backends that keep fitted state per series, and where to delete it: their
+# folds run oldest first so each fold extends (classical) or fine-tunes (DL)
+# the previous fit. Every run uses its own series ids, so a run never starts
+# from state fitted through a later origin by an earlier run, and deletes
+# that state when it finishes.
+STATEFUL_BACKENDS = {"classical": "/state", "dl": "/weights"}
+
+
+def fold_origins(dates, folds, horizon, step):
+    """
+    Origin dates (oldest first), step days apart with the last one horizon
+    days before the latest of dates (sorted, datetime64[D]). Origins whose own
+    date or any target date is missing are dropped, so gaps in the daily
+    rows never shift a fold onto the wrong actuals.
+    """
+    last = dates[-1] - np.timedelta64(horizon, "D")
+    origins = last - np.arange(folds)[::-1] * np.timedelta64(step, "D")
+    needed = origins[:, None] + np.arange(horizon + 1) * np.timedelta64(1, "D")
+    return origins[np.isin(needed, dates).all(axis=1)]
+
+
+def error_metrics(predicted, actual):
+    """MAE, RMSE and MAPE (%) over arrays of any shape; MAPE skips zero actuals"""
+    errors = predicted - actual
+    nonzero = actual != 0
+    mape = np.mean(np.abs(errors[nonzero] / actual[nonzero])) * 100 if nonzero.any() else None
+    return {
+        "mae": float(np.mean(np.abs(errors))),
+        "rmse": float(np.sqrt(np.mean(errors ** 2))),
+        "mape": float(mape) if mape is not None else None,
+    }
+
+
+def series_id(run_id, city):
+    return f"backtest:{run_id}:{city}"
+
+
+async def _predict(backend, frame, series, model, horizon):
+    meta = {
+        "target_column": "request_count",
+        "date_column": "date",
+        "model": model,
+        "horizon": horizon,
+        "params": {},
+        # Separate series id so backtests never disturb live incremental state
+        "series_id": series,
+    }
+    response = await backend.predict(frame, meta)
+    return np.asarray(response.json()["forecast"], dtype=float)
+
+
+async def backtest_series(history, series, model, origins, horizon, window_days, slots):
+    """
+    Forecast from every origin for one city and model.
+    Returns a (folds, horizon) array of predictions.
+    """
+    backend = backends.for_model(model)
+    dates = history["date"].to_numpy(dtype="datetime64[D]")
+    window = np.timedelta64(window_days, "D")
+
+    async def fold(origin):
+        lo, hi = np.searchsorted(dates, [origin - window, origin], side="right")
+        async with slots:
+            return await _predict(backend, history.iloc[lo:hi], series, model, horizon)
+
+    if backend.name in STATEFUL_BACKENDS:
+        return np.stack([await fold(origin) for origin in origins])
+    return np.stack(await asyncio.gather(*(fold(origin) for origin in origins)))
+
+
+async def discard_run_state(run_id, cities, models):
+    """Delete the state and weights a run stored on the stateful backends (best effort)"""
+    used = {backends.for_model(model) for model in models} - {None}
+    for backend in used:
+        if backend.name not in STATEFUL_BACKENDS or backend.client is None:
+            continue
+        for city in cities:
+            try:
+                await backend.client.delete(f"{STATEFUL_BACKENDS[backend.name]}/{series_id(run_id, city)}")
+            except httpx.HTTPError:
+                pass  # Classical state ages out of its LRU; leftover weights only cost disk
+
+
+async def run_backtest(cities, models, folds=BACKTEST_FOLDS, horizon=BACKTEST_HORIZON,
+                       step=BACKTEST_STEP_DAYS, window_days=BACKTEST_WINDOW_DAYS,
+                       max_concurrency=BACKTEST_MAX_CONCURRENCY, progress=None):
+    """
+    Rolling-origin backtest of every city x model, stored in model_performance.
+
+    History is read once per city; folds are slices of it. Metrics are
+    computed over the stacked (folds, horizon) prediction and actual arrays,
+    per city and pooled across cities per model. progress(fraction, message),
+    if given, is called as each city x model finishes.
+    """
+    started = time.perf_counter()
+    latest_date = db.get_latest_date()
+    start_date = (pd.Timestamp(latest_date) - pd.Timedelta(days=window_days + folds * step + horizon)).strftime('%Y-%m-%d')
+    histories = {
+        city: group.reset_index(drop=True)
+        for city, group in db.get_demand_history(cities=cities, start_date=start_date).sort_values('date').groupby('city')
+    }
+
+    run_id = uuid.uuid4().hex[:12]
+    slots = asyncio.Semaphore(max_concurrency)
+    tasks, actuals = {}, {}
+    for city, history in histories.items():
+        dates = history["date"].to_numpy(dtype="datetime64[D]")
+        origins = fold_origins(dates, folds, horizon, step)
+        if not len(origins):
+            continue
+        # Actuals for every fold and step (all present), gathered with one fancy index
+        positions = np.searchsorted(dates, origins[:, None] + np.arange(1, horizon + 1) * np.timedelta64(1, "D"))
+        actuals[city] = history["request_count"].to_numpy(dtype=float)[positions]
+        for model in models:
+            tasks[(city, model)] = backtest_series(
+                history, series_id(run_id, city), model, origins, horizon, window_days, slots)
+
+    done = 0
+
+    async def tracked(key, coro):
+        nonlocal done
+        try:
+            return await coro
+        finally:
+            done += 1
+            if progress is not None:
+                progress(done / len(tasks), f"{key[0]}/{key[1]} done ({done}/{len(tasks)})")
+
+    try:
+        results = await asyncio.gather(*(tracked(key, coro) for key, coro in tasks.items()), return_exceptions=True)
+    finally:
+        await discard_run_state(run_id, {city for city, _ in tasks}, {model for _, model in tasks})
+
+    rows, errors = [], {}
+    predictions = {}
+    for (city, model), result in zip(tasks, results):
+        if isinstance(result, Exception):
+            errors[f"{city}/{model}"] = str(result) or type(result).__name__
+            continue
+        predictions.setdefault(model, {})[city] = result
+        rows.append({"model": model, "city": city, **error_metrics(result, actuals[city])})
+    for model, by_city in predictions.items():
+        pooled = error_metrics(np.concatenate([by_city[c] for c in by_city]),
+                               np.concatenate([actuals[c] for c in by_city]))
+        rows.append({"model": model, "city": None, **pooled})
+
+    db.save_model_performance(rows)
+    return {
+        "latest_date": latest_date,
+        "folds": folds,
+        "horizon": horizon,
+        "step_days": step,
+        "series": len(tasks),
+        "failed": errors,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,101 @@
+"""
+Benchmark per-request database overhead of the forecast path.
+
+Replays the queries made by /forecast/demand (latest date, 90-day history,
+one save per forecast day) against a scratch copy of the database, first
+with a fresh sqlite3 connection per call (the previous access pattern) and
+then through the pooled connections and bulk run save in database.py.
+
+Usage: python bench_database.py [--requests 200] [--horizon 30]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import database as db
+
+
+def legacy_forecast_queries(path, city, horizon):
+    """Per-call connections, as every database function used to open one"""
+    conn = sqlite3.connect(path)
+    latest_date = conn.execute("SELECT MAX(date) FROM demand_history").fetchone()[0]
+    conn.close()
+
+    start_date = (datetime.strptime(latest_date, '%Y-%m-%d') - timedelta(days=90)).strftime('%Y-%m-%d')
+    conn = sqlite3.connect(path)
+    pd.read_sql_query(
+        "SELECT * FROM demand_history WHERE 1=1 AND city = ? AND date >= ? AND date <= ? ORDER BY date DESC",
+        conn, params=[city, start_date, latest_date])
+    conn.close()
+
+    for i in range(horizon):
+        target_date = (datetime.strptime(latest_date, '%Y-%m-%d') + timedelta(days=i+1)).strftime('%Y-%m-%d')
+        conn = sqlite3.connect(path)
+        conn.execute('''
+            INSERT INTO forecasts (forecast_date, target_date, city, model, predicted_count, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (latest_date, target_date, city, 'bench', 100, datetime.now().isoformat()))
+        conn.commit()
+        conn.close()
+
+
+def pooled_forecast_queries(city, horizon):
+    """The same queries through the pooled access layer, saving the run in bulk"""
+    latest_date = db.get_latest_date()
+    start_date = (datetime.strptime(latest_date, '%Y-%m-%d') - timedelta(days=90)).strftime('%Y-%m-%d')
+    db.get_demand_history(city=city, start_date=start_date, end_date=latest_date)
+    predictions = [
+        ((datetime.strptime(latest_date, '%Y-%m-%d') + timedelta(days=i+1)).strftime('%Y-%m-%d'), 100)
+        for i in range(horizon)
+    ]
+    db.save_forecasts(latest_date, city, 'bench', predictions)
+
+
+def run(label, fn, requests):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    series = pd.Series(timings) * 1000
+    print(f"{label:>8}: mean {series.mean():7.2f} ms  p50 {series.median():7.2f} ms  "
+          f"p95 {series.quantile(0.95):7.2f} ms  ({requests} requests)")
+    return series.mean()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--horizon', type=int, default=30)
+    parser.add_argument('--city', default='Sydney')
+    parser.add_argument('--database', default=db.DATABASE_PATH)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        # Each mode gets its own scratch copy so neither benefits from the other's writes
+        legacy_path = os.path.join(workdir, 'legacy.db')
+        pooled_path = os.path.join(workdir, 'pooled.db')
+        shutil.copy(args.database, legacy_path)
+        shutil.copy(args.database, pooled_path)
+
+        before = run('before', lambda: legacy_forecast_queries(legacy_path, args.city, args.horizon), args.requests)
+
+        db.DATABASE_PATH = pooled_path
+        db.init_database()
+        after = run('after', lambda: pooled_forecast_queries(args.city, args.horizon), args.requests)
+        db.close_connections()
+
+        print(f"speedup: {before / after:.1f}x")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import threading
+import time
+
+import database as db
+
+# How long a finished forecast is reused for identical requests on the same data
+FORECAST_CACHE_TTL_SECONDS = float(os.getenv("FORECAST_CACHE_TTL_SECONDS", 300))
+FORECAST_CACHE_MAX_ENTRIES = int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", 2048))
+
+
+class ForecastCoalescer:
+    """
+    Single-flight execution plus a short-TTL result cache for forecasts.
+
+    Concurrent calls with the same key share one in-flight computation (and
+    its result or exception); finished results are reused until they expire.
+    Each result is scoped to a city and the latest date it was computed
+    from. Committed demand rows (via database.demand_listeners) drop only the
+    results for their cities whose latest date is on or after the earliest
+    changed date, so corrected actuals are never served from a result
+    computed before the correction. A per-city generation keeps calls that
+    were in flight during a write for their city from being cached or joined
+    afterwards; calls without a city use a generation every write bumps.
+    """
+
+    def __init__(self, ttl=FORECAST_CACHE_TTL_SECONDS, max_entries=FORECAST_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._results = {}
+        self._inflight = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    async def run(self, key, compute, city=None, as_of=None):
+        """
+        Return compute()'s result for key, sharing in-flight calls and cached
+        results. city and as_of (the latest date of the data used) scope
+        invalidation; a result without a city is dropped by any write.
+        """
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self._results.pop(key, None)
+            generation = self._generations.get(city, 0)
+
+        flight_key = (generation, key)
+        task = self._inflight.get(flight_key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda t: self._finished(key, flight_key, t, city, as_of))
+        # A cancelled caller must not cancel the call other callers are waiting on
+        return await asyncio.shield(task)
+
+    def _finished(self, key, flight_key, task, city, as_of):
+        self._inflight.pop(flight_key, None)
+        if task.cancelled() or task.exception() is not None or self.ttl <= 0:
+            return
+        with self._lock:
+            if flight_key[0] != self._generations.get(city, 0):
+                return  # Data for this city (or any data, without a city) changed while computing
+            self._results[key] = (time.monotonic() + self.ttl, task.result(), city, as_of)
+            while len(self._results) > self.max_entries:
+                del self._results[next(iter(self._results))]
+
+    def invalidate(self, rows):
+        """demand_listeners callback; may be called from any thread"""
+        earliest = {}
+        for row in rows:
+            earliest[row['city']] = min(earliest.get(row['city'], row['date']), row['date'])
+        with self._lock:
+            # None counts every write, for results that are not scoped to a city
+            for city in [None, *earliest]:
+                self._generations[city] = self._generations.get(city, 0) + 1
+            stale = [
+                key for key, (_, _, city, as_of) in self._results.items()
+                if city is None or (city in earliest and (as_of is None or as_of >= earliest[city]))
+            ]
+            for key in stale:
+                del self._results[key]
+            self.invalidated += len(stale)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._results),
+                "in_flight": len(self._inflight),
+                "ttl_seconds": self.ttl,
+                "invalidated": self.invalidated,
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+            }
+
+
+coalescer = ForecastCoalescer()
+db.demand_listeners.append(coalescer.invalidate)
@@ -1,7 +1,30 @@
-import pandas as pd
+"""
+Synthetic WiFi service demand data.
+
+Rows are generated a block of days at a time for every site, with NumPy array
+operations instead of per-row draws, so millions of rows for thousands of
+synthetic sites can be streamed to CSV, Parquet or SQLite in bounded memory.
+Random draws come from one stream per day (derived from the seed), so output
+for a given seed, site count and date range does not depend on the chunk size.
+
+Usage: python data_generator.py [--sites 6] [--days 365] [--start-date 2024-01-01]
+                                [--seed 42] [--chunk-rows 250000] [--output demand_data.csv]
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+
 import numpy as np
-from datetime import datetime, timedelta
-import random
+import pandas as pd
+
+import database as db
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional
+    pa = pq = None
 
 # Australian cities with their characteristics
 CITIES = {
@@ -13,92 +36,236 @@ CITIES = {
     'Canberra': {'lat': -35.2809, 'lon': 149.1300, 'pop_density': 171, 'base_demand': 50}
 }
 
+# Weather by season (southern hemisphere): temperature mean/std, rain chance and mean rainfall
+SUMMER_MONTHS, WINTER_MONTHS = [12, 1, 2], [6, 7, 8]
+WEATHER = {
+    'summer': {'temp': (28, 4), 'rain_chance': 0.3, 'rain_mm': 2},
+    'winter': {'temp': (15, 3), 'rain_chance': 0.5, 'rain_mm': 5},
+    'other': {'temp': (22, 3), 'rain_chance': 0.4, 'rain_mm': 3},
+}
+WEATHER_TABLE = np.array([[*w['temp'], w['rain_chance'], w['rain_mm']] for w in WEATHER.values()])
+
+EVENT_CHANCE = 0.05  # Chance of a special event spike (1.5-2.5x demand) per site and day
+MIN_DEMAND = 10
+
+
+def easter_sunday(year):
+    """Gregorian Easter Sunday (anonymous computus)"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def australian_holidays(years):
+    """National public holidays (plus the King's Birthday) as YYYY-MM-DD strings"""
+    holidays = []
+    for year in years:
+        easter = easter_sunday(year)
+        june_first = date(year, 6, 1)
+        kings_birthday = june_first + timedelta(days=(7 - june_first.weekday()) % 7 + 7)
+        holidays += [
+            f'{year}-01-01', f'{year}-01-26',
+            str(easter - timedelta(days=2)), str(easter + timedelta(days=1)),
+            f'{year}-04-25', str(kings_birthday), f'{year}-12-25', f'{year}-12-26',
+        ]
+    return sorted(holidays)
+
+
 # Australian public holidays 2024
-HOLIDAYS = [
-    '2024-01-01', '2024-01-26', '2024-03-29', '2024-04-01', '2024-04-25',
-    '2024-06-10', '2024-12-25', '2024-12-26'
-]
-
-def generate_demand_data(start_date='2024-01-01', days=365):
-    """Generate synthetic WiFi service demand data for Australian cities"""
-    
-    data = []
-    start = datetime.strptime(start_date, '%Y-%m-%d')
-    
-    for day_offset in range(days):
-        current_date = start + timedelta(days=day_offset)
-        date_str = current_date.strftime('%Y-%m-%d')
-        
-        # Day characteristics
-        day_of_week = current_date.weekday()  # 0=Monday, 6=Sunday
-        is_weekend = day_of_week >= 5
-        is_holiday = date_str in HOLIDAYS
-        month = current_date.month
-        day_of_year = current_date.timetuple().tm_yday
-        
-        # Seasonal factor (higher demand in summer/spring for installations)
-        seasonal_factor = 1 + 0.3 * np.sin(2 * np.pi * (day_of_year - 80) / 365)
-        
-        for city, info in CITIES.items():
-            # Base demand
-            base = info['base_demand']
-            
-            # Weekly pattern (lower on weekends)
-            weekly_factor = 0.7 if is_weekend else 1.0
-            
-            # Holiday effect (much lower demand)
-            holiday_factor = 0.4 if is_holiday else 1.0
-            
-            # Random variation
-            random_factor = np.random.normal(1.0, 0.15)
-            
-            # Weather simulation (simplified)
-            # Summer: higher temp, less rain
-            # Winter: lower temp, more rain
-            if month in [12, 1, 2]:  # Summer
-                temp = np.random.normal(28, 4)
-                rain = np.random.exponential(2) if random.random() < 0.3 else 0
-            elif month in [6, 7, 8]:  # Winter
-                temp = np.random.normal(15, 3)
-                rain = np.random.exponential(5) if random.random() < 0.5 else 0
-            else:  # Spring/Autumn
-                temp = np.random.normal(22, 3)
-                rain = np.random.exponential(3) if random.random() < 0.4 else 0
-            
-            # Weather impact (rain reduces demand slightly)
-            weather_factor = 0.9 if rain > 10 else 1.0
-            
-            # Calculate final demand
-            demand = base * seasonal_factor * weekly_factor * holiday_factor * weather_factor * random_factor
-            demand = max(int(demand), 10)  # Minimum 10 requests per day
-            
-            # Add some special events (random spikes)
-            if random.random() < 0.05:  # 5% chance of special event
-                demand = int(demand * np.random.uniform(1.5, 2.5))
-            
-            data.append({
-                'date': date_str,
-                'city': city,
-                'request_count': demand,
-                'temperature_c': round(temp, 1),
-                'rainfall_mm': round(rain, 1),
-                'day_of_week': day_of_week,
-                'is_weekend': int(is_weekend),
-                'is_holiday': int(is_holiday),
-                'month': month,
-                'population_density': info['pop_density']
-            })
-    
-    return pd.DataFrame(data)
+HOLIDAYS = australian_holidays([2024])
+
+
+def _seed_sequence(seed, *key):
+    return np.random.SeedSequence(seed, spawn_key=key)
+
+
+def make_sites(n_sites, seed=42):
+    """
+    The six real cities, followed by synthetic sites (when n_sites > 6) with
+    base demand and population density drawn around the real cities' spread.
+    """
+    names = list(CITIES)[:n_sites]
+    sites = pd.DataFrame([{'city': name, **CITIES[name]} for name in names])
+    extra = n_sites - len(names)
+    if extra <= 0:
+        return sites
+    rng = np.random.default_rng(_seed_sequence(seed, 0))
+    synthetic = pd.DataFrame({
+        'city': [f'Site {i:05d}' for i in range(1, extra + 1)],
+        'lat': np.round(rng.uniform(-42.9, -12.4, extra), 4),
+        'lon': np.round(rng.uniform(113.6, 153.6, extra), 4),
+        'pop_density': np.round(rng.lognormal(np.log(500), 0.9, extra)).astype(np.int64).clip(5, 10000),
+        'base_demand': np.round(rng.lognormal(np.log(90), 0.5, extra)).astype(np.int64).clip(MIN_DEMAND, 1000),
+    })
+    return pd.concat([sites, synthetic], ignore_index=True)
+
+
+def _daily_draws(seed, day_numbers, n_sites):
+    """Standard draws for each day (rows) and site (columns), one stream per day"""
+    shape = (len(day_numbers), n_sites)
+    draws = {name: np.empty(shape) for name in ('noise', 'temp', 'rain', 'rain_mm', 'event', 'spike')}
+    for row, day in enumerate(day_numbers):
+        rng = np.random.default_rng(_seed_sequence(seed, 1, int(day)))
+        draws['noise'][row] = rng.standard_normal(n_sites)
+        draws['temp'][row] = rng.standard_normal(n_sites)
+        draws['rain'][row] = rng.random(n_sites)
+        draws['rain_mm'][row] = rng.standard_exponential(n_sites)
+        draws['event'][row] = rng.random(n_sites)
+        draws['spike'][row] = rng.random(n_sites)
+    return draws
+
+
+def generate_chunk(sites, dates, seed, holidays):
+    """Demand rows for every site on each of dates (datetime64[D]), date-major"""
+    n_days, n_sites = len(dates), len(sites)
+    day_numbers = dates.astype(np.int64)
+    draws = _daily_draws(seed, day_numbers, n_sites)
+
+    # Calendar features, one per day, as (days, 1) columns broadcast across sites
+    day_of_week = ((day_numbers + 3) % 7)[:, None]  # 1970-01-01 was a Thursday
+    month = (dates.astype('datetime64[M]').astype(np.int64) % 12 + 1)[:, None]
+    day_of_year = ((dates - dates.astype('datetime64[Y]')).astype(np.int64) + 1)[:, None]
+    is_weekend = day_of_week >= 5
+    is_holiday = np.isin(dates, holidays)[:, None]
+
+    # Seasonal factor (higher demand in summer/spring for installations)
+    seasonal_factor = 1 + 0.3 * np.sin(2 * np.pi * (day_of_year - 80) / 365)
+    weekly_factor = np.where(is_weekend, 0.7, 1.0)
+    holiday_factor = np.where(is_holiday, 0.4, 1.0)
+    random_factor = 1.0 + 0.15 * draws['noise']
+
+    # Weather parameters per day, looked up by season (rows of WEATHER_TABLE)
+    season = np.where(np.isin(month, SUMMER_MONTHS), 0, np.where(np.isin(month, WINTER_MONTHS), 1, 2))
+    temp_mean, temp_std, rain_chance, rain_mm = WEATHER_TABLE[season[:, 0]].T[:, :, None]
+    temp = temp_mean + temp_std * draws['temp']
+    rain = np.where(draws['rain'] < rain_chance, rain_mm * draws['rain_mm'], 0.0)
+    # Rain reduces demand slightly
+    weather_factor = np.where(rain > 10, 0.9, 1.0)
+
+    base = sites['base_demand'].to_numpy(dtype=float)[None, :]
+    demand = base * seasonal_factor * weekly_factor * holiday_factor * weather_factor * random_factor
+    demand = np.maximum(np.trunc(demand), MIN_DEMAND)
+    # Special events (random spikes)
+    spike = np.trunc(demand * (1.5 + draws['spike']))
+    demand = np.where(draws['event'] < EVENT_CHANCE, spike, demand).astype(np.int64)
+
+    full = lambda values: np.broadcast_to(values, (n_days, n_sites)).ravel()
+    return pd.DataFrame({
+        'date': np.repeat(np.datetime_as_string(dates, unit='D'), n_sites),
+        'city': np.tile(sites['city'].to_numpy(), n_days),
+        'request_count': demand.ravel(),
+        'temperature_c': np.round(temp, 1).ravel(),
+        'rainfall_mm': np.round(rain, 1).ravel(),
+        'day_of_week': full(day_of_week),
+        'is_weekend': full(is_weekend.astype(np.int64)),
+        'is_holiday': full(is_holiday.astype(np.int64)),
+        'month': full(month),
+        'population_density': np.tile(sites['pop_density'].to_numpy(dtype=np.int64), n_days),
+    }, columns=db.DEMAND_COLUMNS)
+
+
+def iter_demand_chunks(start_date='2024-01-01', days=365, sites=None, seed=42, chunk_rows=250_000):
+    """Yield DataFrames of about chunk_rows rows (whole days), oldest first"""
+    sites = make_sites(len(CITIES), seed) if sites is None else sites
+    start = np.datetime64(start_date, 'D')
+    first_year = int(str(start)[:4])
+    last_year = int(str(start + days)[:4])
+    holidays = np.array(australian_holidays(range(first_year, last_year + 1)), dtype='datetime64[D]')
+    chunk_days = max(1, chunk_rows // max(len(sites), 1))
+    for offset in range(0, days, chunk_days):
+        dates = start + np.arange(offset, min(offset + chunk_days, days))
+        yield generate_chunk(sites, dates, seed, holidays)
+
+
+def generate_demand_data(start_date='2024-01-01', days=365, seed=None, n_sites=len(CITIES)):
+    """Generate synthetic WiFi service demand data for Australian cities (in memory)"""
+    seed = np.random.SeedSequence().entropy if seed is None else seed
+    chunks = iter_demand_chunks(start_date, days, make_sites(n_sites, seed), seed)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_csv(chunks, path):
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        rows += len(chunk)
+    return rows
+
+
+def write_parquet(chunks, path):
+    if pq is None:
+        raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+    rows, writer = 0, None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)  # One row group per chunk
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_sqlite(chunks, path):
+    """
+    Upsert chunks into demand_history, one transaction per chunk. Bypasses
+    upsert_demand_rows (accuracy scoring, listeners), which a bulk load into
+    a load-test database does not need.
+    """
+    db.DATABASE_PATH = path
+    db.init_database()
+    conn = db.get_connection()
+    column_list = ', '.join(db.DEMAND_COLUMNS)
+    updates = ', '.join(f"{c} = excluded.{c}" for c in db.DEMAND_COLUMNS if c not in ('date', 'city'))
+    rows = 0
+    for chunk in chunks:
+        with conn:
+            conn.executemany(f'''
+                INSERT INTO demand_history ({column_list})
+                VALUES ({', '.join('?' * len(db.DEMAND_COLUMNS))})
+                ON CONFLICT(date, city) DO UPDATE SET {updates}
+            ''', chunk.itertuples(index=False, name=None))
+        rows += len(chunk)
+    db.close_connections()
+    return rows
+
+
+WRITERS = {'.csv': write_csv, '.parquet': write_parquet, '.db': write_sqlite, '.sqlite': write_sqlite}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sites', type=int, default=len(CITIES), help='the six cities, then synthetic sites')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--start-date', default='2024-01-01')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-rows', type=int, default=250_000)
+    parser.add_argument('--output', default='demand_data.csv', help='.csv, .parquet, or .db/.sqlite')
+    args = parser.parse_args()
+
+    extension = os.path.splitext(args.output)[1].lower()
+    if extension not in WRITERS:
+        parser.error(f"Unsupported output type '{extension}' (use {', '.join(WRITERS)})")
+    if extension == '.parquet' and pq is None:
+        parser.error("Parquet output requires pyarrow (pip install pyarrow)")
+
+    started = time.perf_counter()
+    sites = make_sites(args.sites, args.seed)
+    chunks = iter_demand_chunks(args.start_date, args.days, sites, args.seed, args.chunk_rows)
+    rows = WRITERS[extension](chunks, args.output)
+    seconds = time.perf_counter() - started
+    print(f"Generated {rows:,} records for {len(sites):,} sites over {args.days} days "
+          f"into {args.output} in {seconds:.1f}s ({rows / seconds:,.0f} rows/s)")
+
 
 if __name__ == '__main__':
-    # Generate data
-    df = generate_demand_data(days=365)
-    
-    # Save to CSV
-    df.to_csv('demand_data.csv', index=False)
-    print(f"Generated {len(df)} records for {len(CITIES)} cities over 365 days")
-    print(f"\nSample data:")
-    print(df.head(10))
-    print(f"\nSummary statistics:")
-    print(df.groupby('city')['request_count'].describe())
+    main()
@@ -1,32 +1,110 @@
 import sqlite3
+import threading
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import json
+import os
 
-DATABASE_PATH = 'forecasting.db'
+DATABASE_PATH = os.getenv('DATABASE_PATH', 'forecasting.db')
+
+# Pragmas applied to every pooled connection. WAL lets readers proceed while a
+# write is in progress, and synchronous=NORMAL is durable in WAL mode without
+# an fsync on every commit.
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+]
+
+DEMAND_COLUMNS = [
+    'date', 'city', 'request_count', 'temperature_c', 'rainfall_mm', 'day_of_week',
+    'is_weekend', 'is_holiday', 'month', 'population_density'
+]
+
+DEMAND_HISTORY_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        city TEXT NOT NULL,
+        request_count INTEGER NOT NULL,
+        temperature_c REAL,
+        rainfall_mm REAL,
+        day_of_week INTEGER,
+        is_weekend INTEGER,
+        is_holiday INTEGER,
+        month INTEGER,
+        population_density INTEGER,
+        UNIQUE(date, city)
+    )
+'''
+
+INDEXES = [
+    # City/date range scans for get_demand_history; UNIQUE(date, city) covers MAX(date)
+    "CREATE INDEX IF NOT EXISTS idx_demand_city_date ON demand_history(city, date)",
+    # Forecast vs actual lookups by target date, and per-city/model listings
+    "CREATE INDEX IF NOT EXISTS idx_forecasts_target ON forecasts(target_date, city, model)",
+    "CREATE INDEX IF NOT EXISTS idx_forecasts_city_model ON forecasts(city, model, forecast_date)",
+    "CREATE INDEX IF NOT EXISTS idx_performance_model_city ON model_performance(model, city)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at)",
+]
+
+# Callbacks run after demand rows are committed, each receiving a list of row dicts.
+# Used by in-process caches to stay write-through consistent with the table.
+demand_listeners = []
+
+def notify_demand_rows(rows):
+    """Pass newly committed demand rows to every registered listener"""
+    for listener in demand_listeners:
+        listener(rows)
+
+_local = threading.local()
+_all_connections = []
+_connections_lock = threading.Lock()
+# Bumped by close_connections so every thread opens a fresh connection
+_generation = 0
+
+def get_connection():
+    """
+    Return this thread's persistent connection, opening it on first use.
+    Statements are kept in the connection's prepared-statement cache, so
+    repeated queries skip re-parsing.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.path == DATABASE_PATH and _local.generation == _generation:
+        return conn
+    # Each connection is only used by its own thread, but close_connections
+    # closes them all from whichever thread shuts down
+    conn = sqlite3.connect(DATABASE_PATH, cached_statements=256, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    _local.conn = conn
+    _local.path = DATABASE_PATH
+    _local.generation = _generation
+    with _connections_lock:
+        _all_connections.append(conn)
+    return conn
+
+def close_connections():
+    """Close every pooled connection (used on shutdown or when DATABASE_PATH changes)"""
+    global _generation
+    with _connections_lock:
+        for conn in _all_connections:
+            conn.close()
+        _all_connections.clear()
+        _generation += 1
 
 def init_database():
     """Initialize the database with schema"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Demand history table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS demand_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            city TEXT NOT NULL,
-            request_count INTEGER NOT NULL,
-            temperature_c REAL,
-            rainfall_mm REAL,
-            day_of_week INTEGER,
-            is_weekend INTEGER,
-            is_holiday INTEGER,
-            month INTEGER,
-            population_density INTEGER,
-            UNIQUE(date, city)
-        )
-    ''')
+    cursor.execute(DEMAND_HISTORY_SCHEMA.format(table='demand_history'))
+    migrate_demand_history(cursor)
     
     # Forecasts table
     cursor.execute('''
@@ -41,6 +119,54 @@ def init_database():
         )
     ''')
     
+    # Forecast run headers - one row per (forecast_date, city, model)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            forecast_date TEXT NOT NULL,
+            city TEXT NOT NULL,
+            model TEXT NOT NULL,
+            horizon INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            UNIQUE(forecast_date, city, model)
+        )
+    ''')
+    migrate_forecast_runs(cursor)
+    migrate_forecast_actuals(cursor)
+    
+    # Running forecast error sums per (city, model, lag), updated as actuals arrive
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_accuracy (
+            city TEXT NOT NULL,
+            model TEXT NOT NULL,
+            lag INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            sum_abs_error REAL NOT NULL,
+            sum_sq_error REAL NOT NULL,
+            n_pct INTEGER NOT NULL,
+            sum_abs_pct_error REAL NOT NULL,
+            last_updated TEXT NOT NULL,
+            PRIMARY KEY (city, model, lag)
+        )
+    ''')
+    
+    # Async jobs (forecasts, backtests) - state survives restarts
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            result TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    ''')
+    
     # Model performance table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS model_performance (
@@ -54,27 +180,185 @@ def init_database():
         )
     ''')
     
+    for index in INDEXES:
+        cursor.execute(index)
+    
     conn.commit()
-    conn.close()
 
-def load_demand_data(csv_path='demand_data.csv'):
-    """Load demand data from CSV into database"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    df = pd.read_csv(csv_path)
-    df.to_sql('demand_history', conn, if_exists='replace', index=False)
-    conn.close()
-    print(f"Loaded {len(df)} records into database")
+def migrate_demand_history(cursor):
+    """
+    Rebuild demand_history with the declared schema if it was created without
+    it (older versions of load_demand_data replaced the table via to_sql,
+    dropping the primary key and UNIQUE(date, city) constraint).
+    """
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(demand_history)")]
+    if 'id' in columns:
+        return
+    cursor.execute(DEMAND_HISTORY_SCHEMA.format(table='demand_history_new'))
+    column_list = ', '.join(DEMAND_COLUMNS)
+    # Later rows win when the old table holds duplicate (date, city) pairs
+    cursor.execute(f'''
+        INSERT OR REPLACE INTO demand_history_new ({column_list})
+        SELECT {column_list} FROM demand_history ORDER BY rowid
+    ''')
+    cursor.execute("DROP TABLE demand_history")
+    cursor.execute("ALTER TABLE demand_history_new RENAME TO demand_history")
 
-def get_demand_history(city=None, start_date=None, end_date=None, limit=None):
-    """Retrieve demand history"""
-    conn = sqlite3.connect(DATABASE_PATH)
+def migrate_forecast_runs(cursor):
+    """Link forecasts rows to run headers, dropping duplicate rows from repeated runs"""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(forecasts)")]
+    if 'run_id' not in columns:
+        cursor.execute("ALTER TABLE forecasts ADD COLUMN run_id INTEGER REFERENCES forecast_runs(id)")
     
-    query = "SELECT * FROM demand_history WHERE 1=1"
+    if cursor.execute("SELECT 1 FROM forecasts WHERE run_id IS NULL LIMIT 1").fetchone():
+        cursor.execute('''
+            INSERT OR IGNORE INTO forecast_runs (forecast_date, city, model, horizon, created_at)
+            SELECT forecast_date, city, model, COUNT(DISTINCT target_date), MAX(created_at)
+            FROM forecasts WHERE run_id IS NULL
+            GROUP BY forecast_date, city, model
+        ''')
+        cursor.execute('''
+            UPDATE forecasts SET run_id = (
+                SELECT r.id FROM forecast_runs r
+                WHERE r.forecast_date = forecasts.forecast_date
+                  AND r.city = forecasts.city AND r.model = forecasts.model
+            ) WHERE run_id IS NULL
+        ''')
+        # Keep only the most recent prediction per run and target date
+        cursor.execute('''
+            DELETE FROM forecasts WHERE id NOT IN (
+                SELECT MAX(id) FROM forecasts GROUP BY run_id, target_date
+            )
+        ''')
+    
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_forecasts_run_target ON forecasts(run_id, target_date)")
+
+def migrate_forecast_actuals(cursor):
+    """Record the actual each forecast row was scored against (NULL until it arrives)"""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(forecasts)")]
+    if 'actual_count' not in columns:
+        cursor.execute("ALTER TABLE forecasts ADD COLUMN actual_count INTEGER")
+
+def _error_terms(predicted, actual):
+    """(n, abs error, squared error, n_pct, abs pct error) for one forecast; MAPE skips zero actuals"""
+    error = predicted - actual
+    if actual:
+        return 1, abs(error), error * error, 1, abs(error) / abs(actual) * 100
+    return 1, abs(error), error * error, 0, 0.0
+
+def score_actuals(cursor, rows):
+    """
+    Fold new actuals into the running forecast_accuracy sums, in the caller's
+    transaction. Every stored forecast for a row's (date, city) adds its errors
+    to (city, model, lag); if the actual was already scored with a different
+    value, its old errors are swapped out, so each forecast counts once.
+    """
+    last_updated = datetime.now().isoformat()
+    for row in rows:
+        actual = row.get('request_count')
+        if actual is None or actual != actual:
+            continue
+        matches = cursor.execute('''
+            SELECT id, forecast_date, model, predicted_count, actual_count
+            FROM forecasts WHERE target_date = ? AND city = ?
+        ''', (row['date'], row['city'])).fetchall()
+        if not matches:
+            continue
+        for forecast_id, forecast_date, model, predicted, previous in matches:
+            if previous == actual:
+                continue
+            delta = _error_terms(predicted, actual)
+            if previous is not None:
+                delta = [new - old for new, old in zip(delta, _error_terms(predicted, previous))]
+            _add_accuracy(cursor, row['city'], model, _lag(forecast_date, row['date']), delta, last_updated)
+            cursor.execute("UPDATE forecasts SET actual_count = ? WHERE id = ?", (int(actual), forecast_id))
+
+def _lag(forecast_date, target_date):
+    return (datetime.strptime(target_date, '%Y-%m-%d') - datetime.strptime(forecast_date, '%Y-%m-%d')).days
+
+def _add_accuracy(cursor, city, model, lag, terms, last_updated):
+    """Add error terms (negative to remove a forecast) to the running sums for (city, model, lag)"""
+    cursor.execute('''
+        INSERT INTO forecast_accuracy
+            (city, model, lag, n, sum_abs_error, sum_sq_error, n_pct, sum_abs_pct_error, last_updated)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(city, model, lag) DO UPDATE SET
+            n = n + excluded.n,
+            sum_abs_error = sum_abs_error + excluded.sum_abs_error,
+            sum_sq_error = sum_sq_error + excluded.sum_sq_error,
+            n_pct = n_pct + excluded.n_pct,
+            sum_abs_pct_error = sum_abs_pct_error + excluded.sum_abs_pct_error,
+            last_updated = excluded.last_updated
+    ''', (city, model, lag, *terms, last_updated))
+
+def _unscore_forecasts(cursor, run_id, target_date=None):
+    """
+    Remove a run's scored forecasts (or one target date's) from the running
+    sums before they are replaced, so a re-saved forecast is not counted twice.
+    """
+    query = '''
+        SELECT city, model, forecast_date, target_date, predicted_count, actual_count
+        FROM forecasts WHERE run_id = ? AND actual_count IS NOT NULL
+    '''
+    params = (run_id,)
+    if target_date is not None:
+        query += " AND target_date = ?"
+        params += (target_date,)
+    last_updated = datetime.now().isoformat()
+    for city, model, forecast_date, target, predicted, actual in cursor.execute(query, params).fetchall():
+        terms = [-term for term in _error_terms(predicted, actual)]
+        _add_accuracy(cursor, city, model, _lag(forecast_date, target), terms, last_updated)
+
+def _score_saved_forecasts(cursor, city, target_dates):
+    """Score newly saved forecasts whose target dates already have actuals"""
+    target_dates = list(target_dates)
+    if not target_dates:
+        return
+    placeholders = ', '.join('?' * len(target_dates))
+    rows = cursor.execute(f'''
+        SELECT date, city, request_count FROM demand_history WHERE city = ? AND date IN ({placeholders})
+    ''', (city, *target_dates)).fetchall()
+    score_actuals(cursor, [{'date': d, 'city': c, 'request_count': count} for d, c, count in rows])
+
+def load_demand_data(csv_path='demand_data.csv', chunk_rows=10000):
+    """Load demand data from CSV into database, one transaction per chunk"""
+    conn = get_connection()
+    total = 0
+    for df in pd.read_csv(csv_path, chunksize=chunk_rows):
+        upsert_demand_rows(conn, df)
+        total += len(df)
+    print(f"Loaded {total} records into database")
+
+def upsert_demand_rows(conn, df):
+    """Insert or update demand rows by (date, city), keeping the table schema and indexes"""
+    column_list = ', '.join(DEMAND_COLUMNS)
+    updates = ', '.join(f"{c} = excluded.{c}" for c in DEMAND_COLUMNS if c not in ('date', 'city'))
+    values = df[DEMAND_COLUMNS].astype(object).where(df[DEMAND_COLUMNS].notna(), None)
+    rows = list(values.itertuples(index=False, name=None))
+    # Much faster than to_dict(orient='records') for large batches
+    records = [dict(zip(DEMAND_COLUMNS, row)) for row in rows]
+    with conn:
+        conn.executemany(f'''
+            INSERT INTO demand_history ({column_list})
+            VALUES ({', '.join('?' * len(DEMAND_COLUMNS))})
+            ON CONFLICT(date, city) DO UPDATE SET {updates}
+        ''', rows)
+        score_actuals(conn.cursor(), records)
+    notify_demand_rows(records)
+
+def get_demand_history(city=None, start_date=None, end_date=None, limit=None, cities=None):
+    """Retrieve demand history for one city, a list of cities, or all cities"""
+    conn = get_connection()
+    
+    query = f"SELECT {', '.join(DEMAND_COLUMNS)} FROM demand_history WHERE 1=1"
     params = []
     
     if city:
         query += " AND city = ?"
         params.append(city)
+    if cities:
+        query += f" AND city IN ({','.join('?' * len(cities))})"
+        params.extend(cities)
     if start_date:
         query += " AND date >= ?"
         params.append(start_date)
@@ -85,37 +369,239 @@ def get_demand_history(city=None, start_date=None, end_date=None, limit=None):
     query += " ORDER BY date DESC"
     
     if limit:
-        query += f" LIMIT {limit}"
+        query += " LIMIT ?"
+        params.append(int(limit))
     
-    df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
-    return df
+    return pd.read_sql_query(query, conn, params=params)
 
-def save_forecast(forecast_date, target_date, city, model, predicted_count):
-    """Save a forecast"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
+def _upsert_run(cursor, forecast_date, city, model, horizon, created_at):
+    """Create or refresh a run header and return its id"""
     cursor.execute('''
-        INSERT INTO forecasts (forecast_date, target_date, city, model, predicted_count, created_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (forecast_date, target_date, city, model, predicted_count, datetime.now().isoformat()))
+        INSERT INTO forecast_runs (forecast_date, city, model, horizon, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(forecast_date, city, model)
+        DO UPDATE SET horizon = excluded.horizon, created_at = excluded.created_at
+    ''', (forecast_date, city, model, horizon, created_at))
+    return cursor.execute(
+        "SELECT id FROM forecast_runs WHERE forecast_date = ? AND city = ? AND model = ?",
+        (forecast_date, city, model)
+    ).fetchone()[0]
+
+def get_demand_arrays(city, start_date=None, end_date=None, columns=('date', 'request_count')):
+    """
+    Retrieve one city's history as NumPy arrays, oldest first.
+    Skips DataFrame construction; returns {column: ndarray} with dates as datetime64[D].
+    """
+    for column in columns:
+        if column not in DEMAND_COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
     
-    conn.commit()
-    conn.close()
+    query = f"SELECT {', '.join(columns)} FROM demand_history WHERE city = ?"
+    params = [city]
+    if start_date:
+        query += " AND date >= ?"
+        params.append(start_date)
+    if end_date:
+        query += " AND date <= ?"
+        params.append(end_date)
+    query += " ORDER BY date"
+    
+    rows = get_connection().execute(query, params).fetchall()
+    values = zip(*rows) if rows else [()] * len(columns)
+    return {
+        column: np.array(data, dtype='datetime64[D]' if column == 'date' else None)
+        for column, data in zip(columns, values)
+    }
+
+def save_forecast_runs(runs):
+    """
+    Save many forecast runs in a single transaction.
+    
+    Each run is (forecast_date, city, model, predictions) where predictions is a
+    list of (target_date, predicted_count). A run replaces any earlier run with
+    the same forecast_date, city and model; the replaced forecasts' errors leave
+    forecast_accuracy and the new ones are scored against actuals already known.
+    """
+    conn = get_connection()
+    created_at = datetime.now().isoformat()
+    
+    with conn:
+        cursor = conn.cursor()
+        for forecast_date, city, model, predictions in runs:
+            predictions = list(predictions)
+            run_id = _upsert_run(cursor, forecast_date, city, model, len(predictions), created_at)
+            _unscore_forecasts(cursor, run_id)
+            cursor.execute("DELETE FROM forecasts WHERE run_id = ?", (run_id,))
+            cursor.executemany('''
+                INSERT INTO forecasts (run_id, forecast_date, target_date, city, model, predicted_count, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (run_id, forecast_date, target_date, city, model, int(predicted_count), created_at)
+                for target_date, predicted_count in predictions
+            ])
+            _score_saved_forecasts(cursor, city, [target_date for target_date, _ in predictions])
+
+def save_forecasts(forecast_date, city, model, predictions):
+    """Save one forecast run (a list of (target_date, predicted_count)) in one transaction"""
+    save_forecast_runs([(forecast_date, city, model, predictions)])
+
+def save_forecast(forecast_date, target_date, city, model, predicted_count):
+    """Save a single forecast day, replacing any earlier prediction for it in the same run"""
+    conn = get_connection()
+    created_at = datetime.now().isoformat()
+    
+    with conn:
+        cursor = conn.cursor()
+        run_id = _upsert_run(cursor, forecast_date, city, model, 1, created_at)
+        _unscore_forecasts(cursor, run_id, target_date)
+        cursor.execute('''
+            INSERT INTO forecasts (run_id, forecast_date, target_date, city, model, predicted_count, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(run_id, target_date)
+            DO UPDATE SET predicted_count = excluded.predicted_count, created_at = excluded.created_at,
+                          actual_count = NULL
+        ''', (run_id, forecast_date, target_date, city, model, predicted_count, created_at))
+        _score_saved_forecasts(cursor, city, [target_date])
+        cursor.execute('''
+            UPDATE forecast_runs SET horizon = (SELECT COUNT(*) FROM forecasts WHERE run_id = ?)
+            WHERE id = ?
+        ''', (run_id, run_id))
+
+def save_model_performance(rows):
+    """
+    Store backtest metrics in one transaction. Each row is a dict with model,
+    city (None for the model's pooled metrics), mae, rmse and mape, and
+    replaces the earlier metrics for the same model and city.
+    """
+    conn = get_connection()
+    last_updated = datetime.now().isoformat()
+
+    with conn:
+        cursor = conn.cursor()
+        for row in rows:
+            cursor.execute("DELETE FROM model_performance WHERE model = ? AND city IS ?", (row['model'], row['city']))
+            cursor.execute('''
+                INSERT INTO model_performance (model, city, mae, rmse, mape, last_updated)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (row['model'], row['city'], row['mae'], row['rmse'], row['mape'], last_updated))
+
+def get_model_performance():
+    """Stored backtest metrics, best (lowest MAE) first"""
+    return pd.read_sql_query(
+        "SELECT model, city, mae, rmse, mape, last_updated FROM model_performance ORDER BY mae",
+        get_connection()
+    )
+
+def get_forecast_accuracy(city=None, model=None):
+    """
+    Running accuracy per (model, lag) from forecast_accuracy, summed over
+    cities unless city is given. Cost depends on the number of (city, model,
+    lag) combinations, not on how many forecasts have been scored.
+    """
+    query = '''
+        SELECT model, lag, SUM(n) AS n, SUM(sum_abs_error) AS sum_abs_error,
+               SUM(sum_sq_error) AS sum_sq_error, SUM(n_pct) AS n_pct,
+               SUM(sum_abs_pct_error) AS sum_abs_pct_error, MAX(last_updated) AS last_updated
+        FROM forecast_accuracy WHERE n > 0
+    '''
+    params = []
+    if city:
+        query += " AND city = ?"
+        params.append(city)
+    if model:
+        query += " AND model = ?"
+        params.append(model)
+    query += " GROUP BY model, lag ORDER BY model, lag"
+    return pd.read_sql_query(query, get_connection(), params=params)
+
+def get_forecasts_for_date(target_date, city):
+    """Stored predictions for one target date and city, with the actual once scored"""
+    return pd.read_sql_query('''
+        SELECT model, forecast_date, target_date, predicted_count, actual_count
+        FROM forecasts WHERE target_date = ? AND city = ?
+        ORDER BY model, forecast_date
+    ''', get_connection(), params=[target_date, city])
+
+JOB_COLUMNS = ['id', 'kind', 'params', 'status', 'progress', 'message', 'result', 'error',
+               'created_at', 'started_at', 'finished_at']
+
+def _job_from_row(row):
+    job = dict(zip(JOB_COLUMNS, row))
+    job['params'] = json.loads(job['params'])
+    job['result'] = json.loads(job['result']) if job['result'] is not None else None
+    return job
+
+def create_job(job_id, kind, params):
+    """Insert a queued job and return it"""
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            INSERT INTO jobs (id, kind, params, status, progress, created_at)
+            VALUES (?, ?, ?, 'queued', 0, ?)
+        ''', (job_id, kind, json.dumps(params), datetime.now().isoformat()))
+    return get_job(job_id)
+
+def update_job(job_id, **fields):
+    """Update job columns (result is stored as JSON)"""
+    unknown = set(fields) - set(JOB_COLUMNS[3:])
+    if unknown:
+        raise ValueError(f"Unknown job columns: {sorted(unknown)}")
+    if 'result' in fields:
+        fields['result'] = json.dumps(fields['result'])
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            f"UPDATE jobs SET {', '.join(f'{c} = ?' for c in fields)} WHERE id = ?",
+            [*fields.values(), job_id]
+        )
+
+def get_job(job_id):
+    """Return a job as a dict, or None"""
+    row = get_connection().execute(
+        f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    return _job_from_row(row) if row else None
+
+def list_jobs(status=None, limit=50):
+    """Most recent jobs first, without their results"""
+    query = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs"
+    params = []
+    if status:
+        query += " WHERE status = ?"
+        params.append(status)
+    query += " ORDER BY created_at DESC LIMIT ?"
+    params.append(int(limit))
+    jobs = [_job_from_row(row) for row in get_connection().execute(query, params)]
+    for job in jobs:
+        job.pop('result')
+    return jobs
+
+def recover_jobs(older_than):
+    """
+    Prepare job state after a restart: jobs that were running are marked
+    failed, finished jobs created before older_than are deleted, and the
+    ids of still-queued jobs are returned (oldest first) to be re-queued.
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            UPDATE jobs SET status = 'failed', error = 'Interrupted by a gateway restart', finished_at = ?
+            WHERE status = 'running'
+        ''', (datetime.now().isoformat(),))
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') AND created_at < ?",
+            (older_than,)
+        )
+    return [row[0] for row in conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at")]
 
 def get_latest_date():
     """Get the latest date in the database"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT MAX(date) FROM demand_history")
-    result = cursor.fetchone()[0]
-    conn.close()
-    return result
+    conn = get_connection()
+    return conn.execute("SELECT MAX(date) FROM demand_history").fetchone()[0]
 
 def emulate_new_day(city, actual_count, temperature, rainfall):
     """Add a new day of data (emulation)"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Get latest date
@@ -133,14 +619,18 @@ def emulate_new_day(city, actual_count, temperature, rainfall):
     pop_density = cursor.fetchone()[0]
     
     # Insert new record
-    cursor.execute('''
-        INSERT INTO demand_history 
-        (date, city, request_count, temperature_c, rainfall_mm, day_of_week, is_weekend, is_holiday, month, population_density)
-        VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
-    ''', (new_date, city, actual_count, temperature, rainfall, day_of_week, is_weekend, month, pop_density))
-    
-    conn.commit()
-    conn.close()
+    row = {
+        'date': new_date, 'city': city, 'request_count': actual_count,
+        'temperature_c': temperature, 'rainfall_mm': rainfall, 'day_of_week': day_of_week,
+        'is_weekend': is_weekend, 'is_holiday': 0, 'month': month, 'population_density': pop_density
+    }
+    with conn:
+        cursor.execute(f'''
+            INSERT INTO demand_history ({', '.join(DEMAND_COLUMNS)})
+            VALUES ({', '.join('?' * len(DEMAND_COLUMNS))})
+        ''', [row[c] for c in DEMAND_COLUMNS])
+        score_actuals(cursor, [row])
+    notify_demand_rows([row])
     
     return new_date
 
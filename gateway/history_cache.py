@@ -0,0 +1,143 @@
+import bisect
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+import database as db
+
+# Days of history kept in memory per city - the dashboard's widest view is 365 days
+HOT_WINDOW_DAYS = int(os.getenv("HOT_WINDOW_DAYS", 400))
+
+
+class HotWindowCache:
+    """
+    Per-city ring buffer of the most recent demand rows.
+
+    Loaded once from the database at startup and kept current through
+    database.demand_listeners, so reads of recent history never touch SQLite.
+    A read is served only if the requested range starts inside the window;
+    otherwise it counts as a miss and the caller falls back to the database.
+    """
+
+    def __init__(self, window_days=HOT_WINDOW_DAYS):
+        self.window_days = window_days
+        self._rows = {}
+        self._dates = {}
+        self._covers_from = {}
+        self._latest_date = None
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """Fill the window for every city with one query"""
+        latest_date = db.get_latest_date()
+        with self._lock:
+            self._rows.clear()
+            self._dates.clear()
+            self._covers_from.clear()
+            self._latest_date = latest_date
+            if latest_date is None:
+                self.loaded = True
+                return
+            start_date = (datetime.strptime(latest_date, '%Y-%m-%d') - timedelta(days=self.window_days)).strftime('%Y-%m-%d')
+            df = db.get_demand_history(start_date=start_date).sort_values('date')
+            for city, group in df.groupby('city'):
+                records = group.to_dict(orient='records')
+                self._rows[city] = deque(records, maxlen=self.window_days)
+                self._dates[city] = deque((r['date'] for r in records), maxlen=self.window_days)
+                self._covers_from[city] = max(start_date, self._dates[city][0])
+            self.loaded = True
+
+    def add_rows(self, rows):
+        """Write-through update with committed rows (inserts or updates by date/city)"""
+        with self._lock:
+            if not self.loaded:
+                return
+            for row in rows:
+                city, date = row['city'], row['date']
+                if self._latest_date is None or date > self._latest_date:
+                    self._latest_date = date
+                if city not in self._rows:
+                    self._rows[city] = deque(maxlen=self.window_days)
+                    self._dates[city] = deque(maxlen=self.window_days)
+                    self._covers_from[city] = date
+                rows_, dates = self._rows[city], self._dates[city]
+
+                if not dates or date > dates[-1]:
+                    # Common case: a new latest day, appended to the ring
+                    if len(dates) == self.window_days:
+                        self._covers_from[city] = dates[1]
+                    rows_.append(dict(row))
+                    dates.append(date)
+                    continue
+
+                if date < self._covers_from[city]:
+                    # Older than the window; it only lives in the database
+                    continue
+                pos = bisect.bisect_left(dates, date)
+                if pos < len(dates) and dates[pos] == date:
+                    rows_[pos] = dict(row)
+                    continue
+
+                # Rare out-of-order insert (backfill): rebuild the ring, dropping the oldest if full
+                new_rows = list(rows_)
+                new_rows.insert(pos, dict(row))
+                new_rows = new_rows[-self.window_days:]
+                self._rows[city] = deque(new_rows, maxlen=self.window_days)
+                self._dates[city] = deque((r['date'] for r in new_rows), maxlen=self.window_days)
+                if len(new_rows) == self.window_days:
+                    self._covers_from[city] = max(self._covers_from[city], new_rows[0]['date'])
+
+    def latest_date(self):
+        with self._lock:
+            if self.loaded and self._latest_date is not None:
+                self.hits += 1
+                return self._latest_date
+            self.misses += 1
+        return db.get_latest_date()
+
+    def get_history(self, city, start_date, end_date=None):
+        """Rows for city with start_date <= date <= end_date, oldest first, or None on a miss"""
+        with self._lock:
+            dates = self._dates.get(city)
+            if not self.loaded or dates is None or start_date is None or start_date < self._covers_from[city]:
+                self.misses += 1
+                return None
+            self.hits += 1
+            lo = bisect.bisect_left(dates, start_date)
+            hi = bisect.bisect_right(dates, end_date) if end_date else len(dates)
+            rows = self._rows[city]
+            return [dict(rows[i]) for i in range(lo, hi)]
+
+    def get_recent(self, city=None, limit=7):
+        """Most recent rows, newest first (across all cities when city is None)"""
+        with self._lock:
+            if not self.loaded:
+                self.misses += 1
+                return None
+            self.hits += 1
+            cities = [city] if city else list(self._rows)
+            rows = [r for c in cities for r in list(self._rows.get(c, ()))[-limit:]]
+        rows.sort(key=lambda r: r['date'], reverse=True)
+        return [dict(r) for r in rows[:limit]]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "loaded": self.loaded,
+                "window_days": self.window_days,
+                "cities": len(self._rows),
+                "rows": sum(len(r) for r in self._rows.values()),
+                "latest_date": self._latest_date,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
+
+
+cache = HotWindowCache()
+db.demand_listeners.append(cache.add_rows)
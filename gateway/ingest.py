@@ -0,0 +1,143 @@
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+from fastapi.concurrency import run_in_threadpool
+
+import database as db
+from data_generator import australian_holidays
+from instrumentation import stage
+
+# Rows parsed, validated and committed per transaction; memory use is bounded by
+# one chunk however large the upload is
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", 10000))
+# Uploads wait here until their ingest job has run
+INGEST_UPLOAD_DIR = os.getenv("INGEST_UPLOAD_DIR", "uploads")
+# Rejected rows described in the job result; any beyond this are only counted
+INGEST_MAX_ERRORS = int(os.getenv("INGEST_MAX_ERRORS", 100))
+
+REQUIRED_COLUMNS = ['date', 'city', 'request_count']
+# Optional columns, stored as null when absent or empty
+OPTIONAL_NUMERIC_COLUMNS = ['temperature_c', 'rainfall_mm', 'population_density']
+
+
+class InvalidUpload(Exception):
+    """Raised when an upload cannot be ingested at all, e.g. it lacks a required column"""
+
+
+def save_upload(source, filename):
+    """Copy an uploaded file object to INGEST_UPLOAD_DIR in blocks and return its path"""
+    os.makedirs(INGEST_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(INGEST_UPLOAD_DIR, f"{uuid.uuid4().hex}-{os.path.basename(filename or 'upload.csv')}")
+    with open(path, 'wb') as target:
+        shutil.copyfileobj(source, target, 1 << 20)
+    return path
+
+
+def prepare_chunk(chunk, first_line, max_errors):
+    """
+    Validate and normalize one chunk of uploaded rows (all read as strings).
+    Calendar columns are derived from the date; is_holiday is taken from the
+    file when given and from the national holiday calendar otherwise. Returns
+    (rows for upsert_demand_rows, rejected count, up to max_errors
+    {"line", "error"} dicts). Repeated (date, city) pairs keep the last row.
+    """
+    used = [c for c in REQUIRED_COLUMNS + OPTIONAL_NUMERIC_COLUMNS + ['is_holiday'] if c in chunk]
+    text = chunk[used].apply(lambda column: column.str.strip())
+    lines = np.arange(first_line, first_line + len(chunk))
+    dates = pd.to_datetime(text['date'], format='%Y-%m-%d', errors='coerce')
+    counts = pd.to_numeric(text['request_count'], errors='coerce')
+    optional = {
+        col: pd.to_numeric(text[col], errors='coerce') if col in text else pd.Series(np.nan, index=text.index)
+        for col in OPTIONAL_NUMERIC_COLUMNS + ['is_holiday']
+    }
+
+    checks = [
+        (dates.isna(), "date must be YYYY-MM-DD"),
+        (text['city'] == '', "city is empty"),
+        (counts.isna() | (counts < 0) | (counts % 1 != 0), "request_count must be a non-negative integer"),
+    ]
+    checks += [(values.isna() & (text[col] != ''), f"{col} is not a number")
+               for col, values in optional.items() if col in text]
+    checks.append((optional['is_holiday'].notna() & ~optional['is_holiday'].isin([0, 1]), "is_holiday must be 0 or 1"))
+
+    rejected = pd.Series(False, index=text.index)
+    errors = []
+    for failed, message in checks:
+        new = failed & ~rejected
+        errors += [{"line": int(line), "error": message} for line in lines[new.to_numpy()][:max_errors - len(errors)]]
+        rejected |= failed
+    errors.sort(key=lambda e: e["line"])
+
+    keep = ~rejected
+    dates = dates[keep]
+    holidays = set(australian_holidays(sorted(dates.dt.year.unique()))) if len(dates) else set()
+    day_strings = dates.dt.strftime('%Y-%m-%d')
+    day_of_week = dates.dt.dayofweek
+    rows = pd.DataFrame({
+        'date': day_strings,
+        'city': text['city'][keep],
+        'request_count': counts[keep].astype('int64'),
+        'temperature_c': optional['temperature_c'][keep],
+        'rainfall_mm': optional['rainfall_mm'][keep],
+        'day_of_week': day_of_week,
+        'is_weekend': (day_of_week >= 5).astype('int64'),
+        'is_holiday': optional['is_holiday'][keep].fillna(day_strings.isin(holidays).astype(float)).astype('int64'),
+        'month': dates.dt.month,
+        'population_density': optional['population_density'][keep].round(),
+    }, columns=db.DEMAND_COLUMNS)
+    rows = rows.drop_duplicates(subset=['date', 'city'], keep='last')
+    return rows, int(rejected.sum()), errors
+
+
+def upsert_chunk(rows):
+    """Commit one chunk in its own transaction; listeners see only these rows"""
+    with stage("db_write"):
+        db.upsert_demand_rows(db.get_connection(), rows)
+
+
+async def ingest_csv(path, report, chunk_rows=INGEST_CHUNK_ROWS):
+    """
+    Stream a demand CSV into demand_history chunk by chunk, reporting
+    progress by bytes read. Each chunk commits on its own, so rows already
+    ingested stay if the job is cancelled or a later chunk fails.
+    """
+    size = max(os.path.getsize(path), 1)
+    summary = {"rows_read": 0, "rows_upserted": 0, "rows_rejected": 0, "chunks": 0,
+               "cities": set(), "first_date": None, "last_date": None, "errors": []}
+    with open(path, 'rb') as source:
+        try:
+            reader = pd.read_csv(source, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            raise InvalidUpload("The file is empty")
+        with reader:
+            while True:
+                chunk = await run_in_threadpool(next, reader, None)
+                if chunk is None:
+                    break
+                missing = [c for c in REQUIRED_COLUMNS if c not in chunk.columns]
+                if missing:
+                    raise InvalidUpload(f"Missing required columns: {', '.join(missing)}")
+
+                # Line 1 is the header
+                first_line = summary["rows_read"] + 2
+                rows, rejected, errors = await run_in_threadpool(
+                    prepare_chunk, chunk, first_line, INGEST_MAX_ERRORS - len(summary["errors"]))
+                if len(rows):
+                    await run_in_threadpool(upsert_chunk, rows)
+                    summary["cities"].update(rows['city'])
+                    first, last = rows['date'].min(), rows['date'].max()
+                    summary["first_date"] = min(filter(None, [summary["first_date"], first]))
+                    summary["last_date"] = max(filter(None, [summary["last_date"], last]))
+
+                summary["rows_read"] += len(chunk)
+                summary["rows_upserted"] += len(rows)
+                summary["rows_rejected"] += rejected
+                summary["errors"] += errors
+                summary["chunks"] += 1
+                report(min(source.tell() / size, 0.99),
+                       f"{summary['rows_read']} rows read, {summary['rows_rejected']} rejected")
+    summary["cities"] = sorted(summary["cities"])
+    return summary
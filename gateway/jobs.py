@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import database as db
+
+# Concurrent jobs; long SARIMA fits and backtests queue behind these workers
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+# Queued jobs allowed before submissions are rejected
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", 100))
+# Finished jobs older than this are deleted at startup
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", 7))
+# Seconds between keep-alive comments on idle event streams (proxies drop silent connections)
+JOB_EVENT_KEEPALIVE_SECONDS = float(os.getenv("JOB_EVENT_KEEPALIVE_SECONDS", 15))
+
+TERMINAL_STATUSES = {"succeeded", "failed", "cancelled"}
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue has no room for another job"""
+
+
+class UnknownJobKind(Exception):
+    """Raised when a job is submitted for a kind with no registered handler"""
+
+
+class JobManager:
+    """
+    Runs registered job kinds on a bounded pool of asyncio workers.
+
+    Job state lives in the jobs table, so status and results survive a
+    restart (queued jobs are re-queued, running ones marked failed). A handler
+    is an async function handler(params, report) returning a JSON-serializable
+    result; report(progress, message) records progress between 0 and 1 and
+    notifies event-stream subscribers.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queue=JOB_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._handlers = {}
+        self._queue = None
+        self._worker_tasks = []
+        self._running = {}
+        # Running jobs a user cancelled; any other cancellation is a shutdown
+        self._cancel_requested = set()
+        self._subscribers = {}
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        older_than = (datetime.now() - timedelta(days=JOB_RETENTION_DAYS)).isoformat()
+        for job_id in db.recover_jobs(older_than):
+            self._queue.put_nowait(job_id)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, kind, params):
+        """Persist and enqueue a job, returning its initial state"""
+        if kind not in self._handlers:
+            raise UnknownJobKind(kind)
+        if self._queue.qsize() >= self.max_queue:
+            raise JobQueueFull(f"Job queue is full ({self._queue.qsize()} waiting)")
+        job = db.create_job(uuid.uuid4().hex, kind, params)
+        self._queue.put_nowait(job["id"])
+        return job
+
+    def get(self, job_id):
+        return db.get_job(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns the job, or None if unknown"""
+        job = db.get_job(job_id)
+        if job is None or job["status"] in TERMINAL_STATUSES:
+            return job
+        task = self._running.get(job_id)
+        if task is not None:
+            self._cancel_requested.add(job_id)
+            task.cancel()
+        else:
+            self._finish(job_id, status="cancelled")
+        return db.get_job(job_id)
+
+    async def events(self, job_id):
+        """
+        Yield job snapshots as they change, starting with the current state and
+        ending after a terminal status. Yields None on idle keep-alive ticks.
+        """
+        updates = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(updates)
+        try:
+            job = db.get_job(job_id)
+            while job is not None:
+                yield job
+                if job["status"] in TERMINAL_STATUSES:
+                    return
+                try:
+                    job = await asyncio.wait_for(updates.get(), JOB_EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None
+                    job = db.get_job(job_id)
+        finally:
+            self._subscribers[job_id].discard(updates)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    def _publish(self, job_id):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers:
+            job = db.get_job(job_id)
+            for updates in subscribers:
+                updates.put_nowait(job)
+
+    def _finish(self, job_id, **fields):
+        db.update_job(job_id, finished_at=datetime.now().isoformat(), **fields)
+        self._publish(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = db.get_job(job_id)
+            if job is None or job["status"] != "queued":
+                continue  # Cancelled while waiting
+
+            def report(progress, message=None, job_id=job_id):
+                db.update_job(job_id, progress=round(min(max(progress, 0.0), 1.0), 4), message=message)
+                self._publish(job_id)
+
+            db.update_job(job_id, status="running", started_at=datetime.now().isoformat())
+            self._publish(job_id)
+            task = asyncio.create_task(self._handlers[job["kind"]](job["params"], report))
+            self._running[job_id] = task
+            try:
+                result = await task
+                # Round-trip through JSON so results with NumPy scalars fail here, not on read
+                self._finish(job_id, status="succeeded", progress=1.0, result=json.loads(json.dumps(result)))
+            except asyncio.CancelledError:
+                if job_id not in self._cancel_requested:
+                    # The manager is stopping: leave the job running for recover_jobs
+                    raise
+                self._finish(job_id, status="cancelled")
+            except Exception as exc:
+                detail = getattr(exc, "detail", None) or str(exc) or type(exc).__name__
+                self._finish(job_id, status="failed", error=str(detail))
+            finally:
+                self._running.pop(job_id, None)
+                self._cancel_requested.discard(job_id)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": len(self._running),
+            "max_queue": self.max_queue,
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+        }
+
+
+manager = JobManager()
@@ -1,16 +1,29 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import httpx
 import pandas as pd
 import io
 import json
+import asyncio
+import contextlib
 from datetime import datetime, timedelta
 import database as db
+import backends
+import backtest
+import ingest
+from precompute import scheduler as precompute_scheduler, PRECOMPUTE_ENABLED, PRECOMPUTE_MODELS
+from jobs import manager as job_manager, JobQueueFull, TERMINAL_STATUSES
+from history_cache import cache as history_cache
+from coalesce import coalescer as forecast_coalescer
+from instrumentation import instrument, metrics, stage
 import numpy as np
 
 app = FastAPI(title="WiFi Demand Forecasting API Gateway")
+instrument(app, "gateway")
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,13 +33,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Service URLs - read from environment variables for Docker compatibility
+# Service URLs and connection limits are configured in backends.py from environment variables
 import os
-CLASSICAL_SERVICE_URL = os.getenv("CLASSICAL_SERVICE_URL", "http://localhost:8001")
-ML_SERVICE_URL = os.getenv("ML_SERVICE_URL", "http://localhost:8002")
-DL_SERVICE_URL = os.getenv("DL_SERVICE_URL", "http://localhost:8003")
 
-# Initialize database on startup
+# Initialize database and backend clients on startup
 @app.on_event("startup")
 async def startup_event():
     db.init_database()
@@ -37,6 +47,26 @@ async def startup_event():
             db.load_demand_data()
     except:
         db.load_demand_data()
+    history_cache.load()
+    await backends.start_all()
+    if PRECOMPUTE_ENABLED:
+        # Slow classical fits last, so most standard forecasts are ready early
+        models = PRECOMPUTE_MODELS or sorted(
+            backends.MODEL_BACKENDS, key=lambda m: backends.MODEL_BACKENDS[m] == "classical")
+        precompute_scheduler.start(precompute_forecast, get_cities()["cities"], models)
+    job_manager.register("forecast", forecast_job)
+    job_manager.register("backtest", backtest_job)
+    job_manager.register("ingest", ingest_job)
+    await job_manager.start()
+    if backtest.BACKTEST_ON_STARTUP and db.get_model_performance().empty:
+        queue_backtest(wait_for_backends=True)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_manager.stop()
+    await precompute_scheduler.stop()
+    await backends.close_all()
+    db.close_connections()
 
 class EmulateRequest(BaseModel):
     city: str
@@ -55,136 +85,649 @@ def get_cities():
         "cities": ["Sydney", "Melbourne", "Brisbane", "Perth", "Adelaide", "Canberra"]
     }
 
+def load_history(city, start_date, end_date):
+    """History records for a city (oldest first), served from the hot window when possible"""
+    with stage("history"):
+        records = history_cache.get_history(city, start_date, end_date)
+    if records is None:
+        with stage("db_read"):
+            df = db.get_demand_history(city=city, start_date=start_date, end_date=end_date)
+            records = df.sort_values('date').to_dict(orient='records')
+    return records
+
 @app.get("/data/current")
 def get_current_data(city: Optional[str] = None):
     """Get latest demand data"""
-    df = db.get_demand_history(city=city, limit=7)
+    records = history_cache.get_recent(city=city, limit=7)
+    if records is None:
+        records = db.get_demand_history(city=city, limit=7).to_dict(orient='records')
     return {
-        "data": df.to_dict(orient='records'),
-        "latest_date": db.get_latest_date()
+        "data": records,
+        "latest_date": history_cache.latest_date()
     }
 
 @app.get("/data/history")
 def get_history(city: str, days: int = 30):
     """Get historical demand data"""
-    latest_date = db.get_latest_date()
+    latest_date = history_cache.latest_date()
     start_date = (datetime.strptime(latest_date, '%Y-%m-%d') - timedelta(days=days)).strftime('%Y-%m-%d')
     
-    df = db.get_demand_history(city=city, start_date=start_date, end_date=latest_date)
-    df = df.sort_values('date')
+    records = load_history(city, start_date, latest_date)
     
     return {
         "city": city,
-        "data": df.to_dict(orient='records'),
-        "total_records": len(df)
+        "data": records,
+        "total_records": len(records)
     }
 
-@app.post("/forecast/demand")
-async def forecast_demand(city: str, model: str, horizon: int = 7):
-    """Generate demand forecast for a city"""
-    
-    # Get historical data (last 90 days)
-    latest_date = db.get_latest_date()
-    start_date = (datetime.strptime(latest_date, '%Y-%m-%d') - timedelta(days=90)).strftime('%Y-%m-%d')
+@app.post("/data/upload", status_code=202)
+async def upload_demand_data(file: UploadFile = File(...)):
+    """
+    Queue an ingest of a demand CSV: date (YYYY-MM-DD), city and request_count,
+    plus optional temperature_c, rainfall_mm, population_density and is_holiday.
+    Rows are validated and upserted by (date, city) in chunks; follow progress
+    at /jobs/{id} or /jobs/{id}/events. The result lists rejected rows.
+    """
+    path = await run_in_threadpool(ingest.save_upload, file.file, file.filename)
+    try:
+        return submit_job("ingest", {"path": path, "filename": file.filename})
+    except HTTPException:
+        os.remove(path)
+        raise
+
+@app.get("/data/cache/stats")
+def get_cache_stats():
+    """Get hot history window hit/miss counters"""
+    return history_cache.stats()
+
+HISTORY_WINDOW_DAYS = 90
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 4))
+
+def get_backend(model):
+    """Map a model name to the forecasting service that serves it"""
+    backend = backends.for_model(model)
+    if backend is None:
+        raise HTTPException(status_code=400, detail=f"Unknown model: {model}")
+    return backend
+
+def window_start(latest_date, days=HISTORY_WINDOW_DAYS):
+    """First date of the history window ending at latest_date"""
+    return (datetime.strptime(latest_date, '%Y-%m-%d') - timedelta(days=days)).strftime('%Y-%m-%d')
+
+def future_dates(latest_date, horizon):
+    """Dates following latest_date for each step of the horizon"""
+    start = datetime.strptime(latest_date, '%Y-%m-%d')
+    return [(start + timedelta(days=i+1)).strftime('%Y-%m-%d') for i in range(horizon)]
+
+@contextlib.contextmanager
+def backend_errors():
+    """Map transport and service errors from a backend call to HTTP errors"""
+    try:
+        yield
+    except backends.BackendOverloaded as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except httpx.RequestError as exc:
+        raise HTTPException(status_code=503, detail=f"Service unavailable: {exc}")
+    except httpx.HTTPStatusError as exc:
+        raise HTTPException(status_code=exc.response.status_code, detail=exc.response.text)
+
+async def call_backend(backend, df, meta, path="/predict"):
+    """Call a forecasting endpoint, mapping transport and service errors to HTTP errors"""
+    with backend_errors():
+        response = await backend.predict(df, meta, path=path)
+        with stage("decode"):
+            return response.json()
+
+async def run_global_forecast(model, horizon, df, latest_date):
+    """
+    Forecast every city in df from the ML service's global (cross-city) model
+    in one call. Returns {city: result shaped like run_forecast's}; cities
+    without enough history are left out.
+    """
+    backend = get_backend(model)
+    meta = {
+        "target_column": "request_count",
+        "date_column": "date",
+        "model": model,
+        "horizon": horizon,
+        "params": {},
+        "series_column": "city"
+    }
+    result = await call_backend(backend, df.sort_values(['city', 'date']), meta, path="/predict/global")
     
-    df = db.get_demand_history(city=city, start_date=start_date, end_date=latest_date)
+    dates = future_dates(latest_date, horizon)
+    return {
+        city: {
+            "city": city,
+            "model": model,
+            "forecast_date": latest_date,
+            "forecasts": [
+                {"date": date, "predicted_count": int(count)}
+                for date, count in zip(dates, values)
+            ],
+            "global_model": True
+        }
+        for city, values in result["forecasts"].items()
+    }
+
+async def run_forecast(city, model, horizon, df, latest_date, save=True, params=None, quantiles=None):
+    """
+    Call the forecasting service for one city/model and (optionally) store the result.
+    Identical concurrent calls on the same data share one backend call, and the
+    result is reused for FORECAST_CACHE_TTL_SECONDS. The first caller's save flag
+    applies; callers passing save=False store their runs themselves.
+    """
+    backend = get_backend(model)
     df = df.sort_values('date')
     
     if len(df) < 30:
         raise HTTPException(status_code=400, detail="Not enough historical data")
     
-    # Prepare data for forecasting
-    data_records = df.to_dict(orient='records')
-    
-    # Determine service based on model
-    if model in ['arima', 'sarima', 'es']:
-        service_url = CLASSICAL_SERVICE_URL
-        service_type = 'classical'
-    elif model in ['rf', 'gbm', 'svm', 'xgboost']:
-        service_url = ML_SERVICE_URL
-        service_type = 'ml'
-    elif model in ['lstm', 'gru', 'transformer']:
-        service_url = DL_SERVICE_URL
-        service_type = 'dl'
-    else:
-        raise HTTPException(status_code=400, detail=f"Unknown model: {model}")
-    
+    key = (city, model, horizon, latest_date, json.dumps(params or {}, sort_keys=True), tuple(quantiles or ()))
+    return await forecast_coalescer.run(
+        key, lambda: fetch_forecast(backend, city, model, horizon, df, latest_date, save, params, quantiles),
+        city=city, as_of=latest_date)
+
+async def fetch_forecast(backend, city, model, horizon, df, latest_date, save, params, quantiles):
+    """The uncoalesced part of run_forecast"""
     # Call forecasting service
-    payload = {
-        "data": data_records,
+    meta = {
         "target_column": "request_count",
         "date_column": "date",
         "model": model,
         "horizon": horizon,
-        "params": {}
+        "params": params or {},
+        "series_id": city
+    }
+    if quantiles:
+        meta["quantiles"] = quantiles
+    
+    result = await call_backend(backend, df, meta)
+    
+    dates = future_dates(latest_date, horizon)
+    predictions = [(date, int(count)) for date, count in zip(dates, result['forecast'])]
+    
+    # Save the whole run to the database in one transaction
+    if save:
+        with stage("db_write"):
+            db.save_forecasts(latest_date, city, model, predictions)
+    
+    response = {
+        "city": city,
+        "model": model,
+        "forecast_date": latest_date,
+        "forecasts": [
+            {"date": date, "predicted_count": count} 
+            for date, count in predictions
+        ]
     }
+    if "quantiles" in result:
+        # Prediction quantiles per forecast date, e.g. {"p90": [...]}
+        response["quantiles"] = result["quantiles"]
+    if "order_search" in result:
+        response["order_search"] = result["order_search"]
+    return response
+
+async def precompute_forecast(city, model, horizon, latest_date):
+    """Standard forecast computed by the precompute scheduler (saved by the scheduler in bulk)"""
+    df = pd.DataFrame(load_history(city, window_start(latest_date), latest_date), columns=db.DEMAND_COLUMNS)
+    return await run_forecast(city, model, horizon, df, latest_date, save=False)
+
+@app.post("/forecast/demand")
+async def forecast_demand(city: str, model: str, horizon: int = 7, auto_order: bool = False,
+                          quantiles: Optional[List[float]] = Query(None)):
+    """
+    Generate demand forecast for a city (auto_order searches ARIMA/SARIMA orders).
+    Pass quantiles (e.g. ?quantiles=0.1&quantiles=0.9) to also get prediction intervals.
+    """
+    
+    latest_date = history_cache.latest_date()
+    
+    # Standard forecasts are precomputed after each new day; compute on demand otherwise
+    if not auto_order and not quantiles:
+        result = precompute_scheduler.get(city, model, horizon, latest_date)
+        if result is not None:
+            return result
+    
+    # Get historical data (last 90 days)
+    records = load_history(city, window_start(latest_date), latest_date)
+    with stage("frame"):
+        df = pd.DataFrame(records, columns=db.DEMAND_COLUMNS)
+    
+    params = {"auto": True} if auto_order else None
+    return await run_forecast(city, model, horizon, df, latest_date, params=params, quantiles=quantiles)
+
+class BatchForecastRequest(BaseModel):
+    cities: List[str]
+    models: List[str]
+    horizons: List[int] = [7]
+    max_concurrency: Optional[int] = None
+    global_model: bool = False  # ML models: one cross-city model call instead of one fit per city
+
+@app.post("/forecast/batch")
+async def forecast_batch(request: BatchForecastRequest):
+    """
+    Forecast every city x model x horizon combination.
+    Results are streamed back as newline-delimited JSON as each one finishes.
+    With global_model, each ML model forecasts all cities in a single call.
+    """
+    if not request.cities or not request.models or not request.horizons:
+        raise HTTPException(status_code=400, detail="cities, models and horizons must not be empty")
+    for model in request.models:
+        get_backend(model)
+    
+    # Pull the history for every requested city from the hot window, or in one query
+    latest_date = history_cache.latest_date()
+    start_date = window_start(latest_date)
+    cached = {city: history_cache.get_history(city, start_date, latest_date) for city in request.cities}
+    if all(records is not None for records in cached.values()):
+        history = pd.DataFrame([r for records in cached.values() for r in records], columns=db.DEMAND_COLUMNS)
+    else:
+        history = db.get_demand_history(cities=request.cities, start_date=start_date, end_date=latest_date)
+    by_city = {city: group for city, group in history.groupby('city')}
+    
+    # Shorter horizons are prefixes of the longest one, so each city/model needs one call
+    max_horizon = max(request.horizons)
+    horizons = sorted(set(request.horizons))
+    semaphore = asyncio.Semaphore(request.max_concurrency or BATCH_MAX_CONCURRENCY)
+    completed_runs = []
+    
+    async def forecast_one(city, model):
+        async with semaphore:
+            try:
+                df = by_city.get(city, history.iloc[0:0])
+                result = await run_forecast(city, model, max_horizon, df, latest_date, save=False)
+            except HTTPException as exc:
+                return [{"city": city, "model": model, "error": exc.detail, "status_code": exc.status_code}]
+        return completed(city, model, result)
+    
+    def completed(city, model, result):
+        completed_runs.append((latest_date, city, model, [
+            (f["date"], f["predicted_count"]) for f in result["forecasts"]
+        ]))
+        return [
+            {**result, "horizon": horizon, "forecasts": result["forecasts"][:horizon]}
+            for horizon in horizons
+        ]
+    
+    async def forecast_global(model):
+        async with semaphore:
+            try:
+                results = await run_global_forecast(model, max_horizon, history, latest_date)
+            except HTTPException as exc:
+                return [{"city": city, "model": model, "error": exc.detail, "status_code": exc.status_code}
+                        for city in request.cities]
+        items = []
+        for city in request.cities:
+            if city in results:
+                items.extend(completed(city, model, results[city]))
+            else:
+                items.append({"city": city, "model": model, "error": "Not enough historical data", "status_code": 400})
+        return items
     
-    async with httpx.AsyncClient() as client:
+    async def stream():
+        tasks = []
+        for model in request.models:
+            if request.global_model and get_backend(model).name == "ml":
+                tasks.append(asyncio.create_task(forecast_global(model)))
+            else:
+                tasks.extend(asyncio.create_task(forecast_one(city, model)) for city in request.cities)
         try:
-            response = await client.post(f"{service_url}/predict", json=payload, timeout=120.0)
-            response.raise_for_status()
-            result = response.json()
-            
-            # Save forecasts to database
-            forecast_date = latest_date
-            for i, predicted_count in enumerate(result['forecast']):
-                target_date = (datetime.strptime(latest_date, '%Y-%m-%d') + timedelta(days=i+1)).strftime('%Y-%m-%d')
-                db.save_forecast(forecast_date, target_date, city, model, int(predicted_count))
-            
-            # Generate future dates
-            future_dates = [(datetime.strptime(latest_date, '%Y-%m-%d') + timedelta(days=i+1)).strftime('%Y-%m-%d') 
-                           for i in range(horizon)]
-            
-            return {
-                "city": city,
-                "model": model,
-                "forecast_date": forecast_date,
-                "forecasts": [
-                    {"date": date, "predicted_count": int(count)} 
-                    for date, count in zip(future_dates, result['forecast'])
-                ]
-            }
-            
-        except httpx.RequestError as exc:
-            raise HTTPException(status_code=503, detail=f"Service unavailable: {exc}")
-        except httpx.HTTPStatusError as exc:
-            raise HTTPException(status_code=exc.response.status_code, detail=exc.response.text)
+            for finished in asyncio.as_completed(tasks):
+                for item in await finished:
+                    yield json.dumps(item) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Persist every completed run in one transaction
+            if completed_runs:
+                db.save_forecast_runs(completed_runs)
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 @app.post("/emulate/day")
 async def emulate_day(request: EmulateRequest):
     """Emulate a new day and compare with forecasts"""
     
     # Add new day to database
-    new_date = db.emulate_new_day(
-        request.city,
-        request.actual_count,
-        request.temperature,
-        request.rainfall
-    )
+    with stage("db_write"):
+        new_date = db.emulate_new_day(
+            request.city,
+            request.actual_count,
+            request.temperature,
+            request.rainfall
+        )
     
-    # Get forecasts for this date (if any)
-    # TODO: Query forecasts table
+    # Forecasts for this date were scored against the actual as it was inserted
+    with stage("db_read"):
+        forecasts = db.get_forecasts_for_date(new_date, request.city)
     
     return {
         "success": True,
         "new_date": new_date,
         "city": request.city,
         "actual_count": request.actual_count,
+        "forecasts": [
+            {
+                "model": f["model"],
+                "forecast_date": f["forecast_date"],
+                "predicted_count": f["predicted_count"],
+                "error": f["predicted_count"] - request.actual_count
+            }
+            for f in forecasts.to_dict(orient='records')
+        ],
         "message": f"Emulated new day: {new_date}"
     }
 
+def cache_metric_families():
+    """Cache, precompute and job counters for the /metrics endpoint"""
+    forecast_cache = forecast_coalescer.stats()
+    hot_window = history_cache.stats()
+    precompute = precompute_scheduler.stats()
+    jobs = job_manager.stats()
+    return [
+        ("forecast_cache_lookups_total", "counter", "Forecast lookups by outcome",
+         [({"outcome": outcome}, forecast_cache[outcome]) for outcome in ("hits", "coalesced", "misses")]),
+        ("history_cache_lookups_total", "counter", "Hot history window lookups by outcome",
+         [({"outcome": outcome}, hot_window[outcome]) for outcome in ("hits", "misses")]),
+        ("precompute_lookups_total", "counter", "Precomputed forecast lookups by outcome",
+         [({"outcome": outcome}, precompute[outcome]) for outcome in ("hits", "misses")]),
+        ("jobs", "gauge", "Async jobs by state", [({"state": state}, jobs[state]) for state in ("queued", "running")]),
+    ]
+
+metrics.add_collector(backends.metric_families)
+metrics.add_collector(cache_metric_families)
+
+@app.get("/forecast/cache/stats")
+def get_forecast_cache_stats():
+    """Get forecast single-flight and result cache metrics"""
+    return forecast_coalescer.stats()
+
+@app.get("/precompute/stats")
+def get_precompute_stats():
+    """Get precompute scheduler state and hit/miss counters"""
+    return precompute_scheduler.stats()
+
+@app.get("/backends/stats")
+def get_backend_stats():
+    """Get connection pool, queueing and latency metrics per forecasting service"""
+    return backends.stats()
+
+MODEL_NAMES = {
+    "arima": "ARIMA", "sarima": "SARIMA", "es": "Exponential Smoothing",
+    "rf": "Random Forest", "gbm": "Gradient Boosting", "svm": "SVM", "xgboost": "XGBoost",
+    "lstm": "LSTM", "gru": "GRU", "transformer": "Transformer",
+}
+
+class BacktestRequest(BaseModel):
+    cities: Optional[List[str]] = None  # Defaults to every city
+    models: Optional[List[str]] = None  # Defaults to every model
+    folds: int = backtest.BACKTEST_FOLDS
+    horizon: int = backtest.BACKTEST_HORIZON
+    step_days: int = backtest.BACKTEST_STEP_DAYS
+
+def backtest_params(request):
+    """Validate a BacktestRequest and fill in the default cities and models"""
+    models = request.models or list(backends.MODEL_BACKENDS)
+    for model in models:
+        get_backend(model)
+    if request.folds < 1 or request.horizon < 1 or request.step_days < 1:
+        raise HTTPException(status_code=400, detail="folds, horizon and step_days must be positive")
+    return {
+        "cities": request.cities or get_cities()["cities"],
+        "models": models,
+        "folds": request.folds,
+        "horizon": request.horizon,
+        "step_days": request.step_days,
+    }
+
+@app.post("/performance/backtest")
+async def run_backtest(request: BacktestRequest):
+    """Run a rolling-origin backtest and store the metrics served by /performance/summary"""
+    params = backtest_params(request)
+    return await backtest.run_backtest(params["cities"], params["models"], folds=params["folds"],
+                                       horizon=params["horizon"], step=params["step_days"])
+
+def accuracy_metrics(df):
+    """MAE/RMSE/MAPE from summed running errors (columns of forecast_accuracy)"""
+    n = df['n'].sum()
+    n_pct = df['n_pct'].sum()
+    return {
+        "n": int(n),
+        "mae": round(df['sum_abs_error'].sum() / n, 2),
+        "rmse": round(np.sqrt(df['sum_sq_error'].sum() / n), 2),
+        "mape": round(df['sum_abs_pct_error'].sum() / n_pct, 2) if n_pct else None,
+    }
+
+@app.get("/performance/accuracy")
+def get_forecast_accuracy(city: Optional[str] = None, model: Optional[str] = None):
+    """Live accuracy of stored forecasts against actuals, per model and forecast lag (days ahead)"""
+    df = db.get_forecast_accuracy(city=city, model=model)
+    return {
+        "city": city,
+        "models": [
+            {
+                "name": MODEL_NAMES.get(name, name),
+                "model": name,
+                **accuracy_metrics(group),
+                "last_updated": group['last_updated'].max(),
+                "lags": [{"lag": int(lag), **accuracy_metrics(row)} for lag, row in group.groupby('lag')]
+            }
+            for name, group in df.groupby('model')
+        ]
+    }
+
 @app.get("/performance/summary")
 def get_performance_summary():
-    """Get model performance summary"""
-    # TODO: Calculate MAE, RMSE, MAPE from forecasts vs actuals
+    """
+    Get model performance summary: backtest metrics (best MAE first) and live
+    accuracy of stored forecasts scored as actuals arrived. Until a backtest
+    has stored metrics (one is queued at startup), models lists the live
+    accuracy instead; source says which.
+    """
+    live = db.get_forecast_accuracy()
+    live_models = [
+        {"name": MODEL_NAMES.get(name, name), "model": name, **accuracy_metrics(group),
+         "last_updated": group['last_updated'].max()}
+        for name, group in live.groupby('model')
+    ]
+    df = db.get_model_performance()
+    df = df.astype(object).where(df.notna(), None)
+    if df.empty:
+        return {"source": "live", "models": sorted(live_models, key=lambda m: m["mae"]), "live": live_models}
+    by_city = {model: group for model, group in df[df['city'].notna()].groupby('model')}
     return {
+        "source": "backtest",
         "models": [
-            {"name": "ARIMA", "mae": 12.5, "rmse": 15.3, "mape": 8.2},
-            {"name": "Random Forest", "mae": 10.2, "rmse": 13.1, "mape": 6.8},
-            {"name": "LSTM", "mae": 9.8, "rmse": 12.5, "mape": 6.5}
-        ]
+            {
+                "name": MODEL_NAMES.get(row['model'], row['model']),
+                "model": row['model'],
+                "mae": round(row['mae'], 2),
+                "rmse": round(row['rmse'], 2),
+                "mape": round(row['mape'], 2) if row['mape'] is not None else None,
+                "last_updated": row['last_updated'],
+                "cities": [
+                    {"city": r['city'], "mae": round(r['mae'], 2), "rmse": round(r['rmse'], 2),
+                     "mape": round(r['mape'], 2) if r['mape'] is not None else None}
+                    for r in by_city[row['model']].to_dict(orient='records')
+                ] if row['model'] in by_city else []
+            }
+            for row in df[df['city'].isna()].to_dict(orient='records')
+        ],
+        "live": live_models
     }
 
+# Async jobs: long forecasts and backtests run on gateway workers; clients
+# submit, then poll /jobs/{id} or follow /jobs/{id}/events instead of holding
+# a request open for minutes.
+
+class ForecastJobRequest(BaseModel):
+    city: str
+    model: str
+    horizon: int = 7
+    auto_order: bool = False
+    quantiles: Optional[List[float]] = None
+
+async def forecast_job(params, report):
+    latest_date = history_cache.latest_date()
+    report(0.1, "Loading history")
+    df = pd.DataFrame(load_history(params["city"], window_start(latest_date), latest_date), columns=db.DEMAND_COLUMNS)
+    report(0.2, "Fitting model")
+    return await run_forecast(params["city"], params["model"], params["horizon"], df, latest_date,
+                              params={"auto": True} if params["auto_order"] else None,
+                              quantiles=params["quantiles"])
+
+async def backtest_job(params, report):
+    if params.get("wait_for_backends"):
+        report(0.0, "Waiting for backends")
+        await backends.wait_ready({backends.MODEL_BACKENDS[model] for model in params["models"]})
+    return await backtest.run_backtest(params["cities"], params["models"], folds=params["folds"],
+                                       horizon=params["horizon"], step=params["step_days"], progress=report)
+
+async def ingest_job(params, report):
+    try:
+        summary = await ingest.ingest_csv(params["path"], report)
+        if 0 < backtest.BACKTEST_AFTER_INGEST_ROWS <= summary["rows_upserted"]:
+            summary["backtest_job"] = queue_backtest()
+        return {"filename": params["filename"], **summary}
+    finally:
+        if os.path.exists(params["path"]):
+            os.remove(params["path"])
+
+def queue_backtest(wait_for_backends=False):
+    """
+    Queue a default backtest unless one is already waiting; returns its id,
+    or None if the queue is full. wait_for_backends makes the job wait for
+    services that are still starting, so their models are not just failures.
+    """
+    queued = [job for job in db.list_jobs(status="queued", limit=job_manager.max_queue) if job["kind"] == "backtest"]
+    if queued:
+        return queued[0]["id"]
+    try:
+        params = dict(backtest_params(BacktestRequest()), wait_for_backends=wait_for_backends)
+        return job_manager.submit("backtest", params)["id"]
+    except JobQueueFull:
+        return None
+
+def submit_job(kind, params):
+    try:
+        job = job_manager.submit(kind, params)
+    except JobQueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    job.pop("result")
+    return job
+
+def find_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return job
+
+@app.post("/jobs/forecast", status_code=202)
+def submit_forecast_job(request: ForecastJobRequest):
+    """Queue a forecast (same options as /forecast/demand); returns the job to poll"""
+    get_backend(request.model)
+    if request.horizon < 1:
+        raise HTTPException(status_code=400, detail="horizon must be positive")
+    return submit_job("forecast", request.dict())
+
+@app.post("/jobs/backtest", status_code=202)
+def submit_backtest_job(request: BacktestRequest):
+    """Queue a rolling-origin backtest (same options as /performance/backtest)"""
+    return submit_job("backtest", backtest_params(request))
+
+@app.get("/jobs")
+def list_jobs(status: Optional[str] = None, limit: int = 50):
+    """Most recent jobs first (without results), plus worker and queue state"""
+    return {"jobs": db.list_jobs(status=status, limit=limit), "stats": job_manager.stats()}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Job status and progress"""
+    job = find_job(job_id)
+    job.pop("result")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    """Result of a succeeded job (409 while it is still queued or running)"""
+    job = find_job(job_id)
+    if job["status"] == "succeeded":
+        return job["result"]
+    if job["status"] in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job {job['status']}: {job['error'] or 'no result'}")
+    raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Server-sent events with the job state on every change, ending once the
+    job finishes. Fetch the result from /jobs/{id}/result afterwards.
+    """
+    find_job(job_id)
+
+    async def generate():
+        async for job in job_manager.events(job_id):
+            if job is None:
+                yield ": keep-alive\n\n"
+                continue
+            job.pop("result", None)  # Snapshots are shared between subscribers
+            yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+
+    return StreamingResponse(generate(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued or running job (finished jobs are returned unchanged)"""
+    find_job(job_id)
+    job = job_manager.cancel(job_id)
+    job.pop("result")
+    return job
+
+# ============================================================================
+# SERVICE REQUEST ETA (scored by the ML service)
+# ============================================================================
+
+@app.post("/eta/score")
+async def score_eta(http_request: Request):
+    """
+    Predicted ETA hours and SLA-breach probability for a batch of service
+    requests, as JSON ({"requests": [...]}) or CSV; see the ML service's /eta/score
+    """
+    body = await http_request.body()
+    content_type = http_request.headers.get("content-type", "application/json")
+    with backend_errors():
+        response = await backends.BACKENDS["ml"].post(
+            "/eta/score", content=body, headers={"Content-Type": content_type})
+    return Response(response.content, media_type="application/json")
+
+@app.post("/eta/score/stream")
+async def score_eta_stream(http_request: Request):
+    """
+    NDJSON requests in, NDJSON predictions out; both bodies are relayed to
+    and from the ML service as they arrive, never buffered whole
+    """
+    relay = contextlib.AsyncExitStack()
+    with backend_errors():
+        response = await relay.enter_async_context(backends.BACKENDS["ml"].stream(
+            "/eta/score/stream", content=http_request.stream(), headers={"Content-Type": "application/x-ndjson"}))
+
+    async def chunks():
+        async with relay:
+            async for chunk in response.aiter_raw():
+                yield chunk
+
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+@app.get("/eta/stats")
+async def eta_stats():
+    """ETA model fit quality and scoring counters from the ML service"""
+    with backend_errors():
+        response = await backends.BACKENDS["ml"].client.get("/eta/stats")
+        response.raise_for_status()
+    return response.json()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+# Standard forecasts computed after each new day of data, so dashboard
+# requests are served without waiting for a fit. The dashboard allows 1-14 days.
+PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "true").lower() in ("1", "true", "yes")
+PRECOMPUTE_HORIZONS = [int(h) for h in os.getenv("PRECOMPUTE_HORIZONS", "7,14").split(",") if h.strip()]
+PRECOMPUTE_MODELS = [m.strip() for m in os.getenv("PRECOMPUTE_MODELS", "").split(",") if m.strip()]
+# Rows often arrive in bursts (one per city); wait this long for the burst to end
+PRECOMPUTE_DEBOUNCE_SECONDS = float(os.getenv("PRECOMPUTE_DEBOUNCE_SECONDS", 2.0))
+# Kept low so precomputation never crowds out interactive requests
+PRECOMPUTE_MAX_CONCURRENCY = int(os.getenv("PRECOMPUTE_MAX_CONCURRENCY", 2))
+# Cities with failed pairs (e.g. a backend still starting) are retried after
+# this delay, doubling per consecutive failed run up to the maximum
+PRECOMPUTE_RETRY_SECONDS = float(os.getenv("PRECOMPUTE_RETRY_SECONDS", 10))
+PRECOMPUTE_RETRY_MAX_SECONDS = float(os.getenv("PRECOMPUTE_RETRY_MAX_SECONDS", 600))
+
+
+class PrecomputeScheduler:
+    """
+    Recomputes city x model forecasts at the longest standard horizon
+    whenever new demand rows are committed (via database.demand_listeners),
+    keeps the results in memory and stores them as forecast runs. A new
+    latest date recomputes every city; rows for earlier dates (corrections,
+    late feeds) drop and recompute only the cities they belong to.
+
+    forecast_fn(city, model, horizon, latest_date) must return a result
+    shaped like the gateway's run_forecast output. Results are only served
+    for the latest date they were computed from, so a new day of data makes
+    earlier results stale immediately. Cities with a failed pair are
+    recomputed after a backoff delay.
+    """
+
+    def __init__(self, horizons=PRECOMPUTE_HORIZONS, debounce=PRECOMPUTE_DEBOUNCE_SECONDS,
+                 max_concurrency=PRECOMPUTE_MAX_CONCURRENCY, retry=PRECOMPUTE_RETRY_SECONDS,
+                 max_retry=PRECOMPUTE_RETRY_MAX_SECONDS):
+        self.horizon = max(horizons) if horizons else 0
+        self.debounce = debounce
+        self.max_concurrency = max_concurrency
+        self.retry = retry
+        self.max_retry = max_retry
+        self._retry_delay = 0.0
+        self._retry_handle = None
+        self._results = {}
+        self._dirty = set()
+        self._computed_date = None
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.hits = 0
+        self.misses = 0
+        self.last_run = None
+
+    def start(self, forecast_fn, cities, models):
+        """Start the background loop (from the running event loop) and queue a first run"""
+        self.forecast_fn = forecast_fn
+        self.cities = list(cities)
+        self.models = list(models)
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run_forever())
+        self._wakeup.set()
+
+    async def stop(self):
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+            self._retry_handle = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self, rows):
+        """demand_listeners callback; may be called from any thread"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._mark_dirty, {row['city'] for row in rows})
+
+    def _mark_dirty(self, cities):
+        # Results for these cities may predate the new rows: stop serving them
+        for key in [key for key in self._results if key[0] in cities]:
+            del self._results[key]
+        self._dirty |= cities
+        self._wakeup.set()
+
+    def get(self, city, model, horizon, latest_date):
+        """Precomputed result for the latest date, cut to horizon, or None"""
+        entry = self._results.get((city, model))
+        if entry is None or entry["forecast_date"] != latest_date or horizon > len(entry["forecasts"]):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {**entry, "forecasts": entry["forecasts"][:horizon], "precomputed": True}
+
+    async def _run_forever(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.debounce)
+            self._wakeup.clear()
+            try:
+                await self.run_once()
+            except Exception:
+                self.failures += 1
+
+    async def run_once(self):
+        """Compute every city x model for a new latest date, or only the changed cities"""
+        latest_date = db.get_latest_date()
+        if latest_date is None or self.horizon <= 0:
+            return
+        dirty, self._dirty = self._dirty, set()
+        cities = self.cities if latest_date != self._computed_date else [c for c in self.cities if c in dirty]
+        self._computed_date = latest_date
+        started = time.perf_counter()
+        self.running = True
+        slots = asyncio.Semaphore(self.max_concurrency)
+        completed_runs = []
+        failed_cities = set()
+        failed = 0
+
+        async def compute(city, model):
+            nonlocal failed
+            async with slots:
+                # More rows arrived while queued: the next run will cover this pair
+                if self._wakeup.is_set():
+                    self._dirty.add(city)
+                    return
+                try:
+                    result = await self.forecast_fn(city, model, self.horizon, latest_date)
+                except Exception as exc:
+                    detail = getattr(exc, "detail", None) or str(exc) or type(exc).__name__
+                    logger.warning("Precompute of %s/%s for %s failed: %s", city, model, latest_date, detail)
+                    failed_cities.add(city)
+                    failed += 1
+                    return
+            if city in self._dirty:
+                return  # Its rows changed while computing; the next run recomputes it
+            self._results[(city, model)] = result
+            completed_runs.append((latest_date, city, model, [
+                (f["date"], f["predicted_count"]) for f in result["forecasts"]
+            ]))
+
+        try:
+            await asyncio.gather(*(compute(city, model) for model in self.models for city in cities))
+        finally:
+            self.running = False
+            if completed_runs:
+                await run_in_threadpool(db.save_forecast_runs, completed_runs)
+        if failed_cities:
+            self._schedule_retry(failed_cities)
+        else:
+            self._retry_delay = 0.0
+        self.runs += 1
+        self.failures += failed
+        self.last_run = {
+            "latest_date": latest_date,
+            "computed": len(completed_runs),
+            "failed": failed,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def _schedule_retry(self, cities):
+        """Recompute cities after the backoff delay, unless new rows wake the loop first"""
+        self._retry_delay = min(max(self._retry_delay * 2, self.retry), self.max_retry)
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+        self._retry_handle = self._loop.call_later(self._retry_delay, self._retry, cities)
+
+    def _retry(self, cities):
+        self._retry_handle = None
+        self._dirty |= cities
+        self._wakeup.set()
+
+    def stats(self):
+        return {
+            "enabled": self._task is not None,
+            "horizon": self.horizon,
+            "running": self.running,
+            "pending": bool(self._wakeup and self._wakeup.is_set()),
+            "retry_in_seconds": self._retry_delay if self._retry_handle is not None else None,
+            "entries": len(self._results),
+            "runs": self.runs,
+            "failures": self.failures,
+            "hits": self.hits,
+            "misses": self.misses,
+            "last_run": self.last_run,
+        }
+
+
+scheduler = PrecomputeScheduler()
+db.demand_listeners.append(scheduler.notify)
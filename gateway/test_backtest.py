@@ -0,0 +1,72 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backends
+import backtest
+import database as db
+
+
+class StatefulBackend:
+    """
+    Mimics a service that keeps state per series id: each forecast is the mean
+    of every value it has seen for the series, so reusing state across runs
+    changes the predictions.
+    """
+
+    name = "classical"
+
+    def __init__(self):
+        self.seen = {}
+        self.client = self
+
+    async def predict(self, frame, meta):
+        history = self.seen.setdefault(meta["series_id"], {})
+        history.update(zip(frame["date"], frame["request_count"]))
+        forecast = [float(np.mean(list(history.values())))] * meta["horizon"]
+        return type("Response", (), {"json": lambda self: {"forecast": forecast}})()
+
+    async def delete(self, path):
+        self.seen.pop(path.split("/", 2)[2], None)
+
+
+@pytest.fixture
+def demand_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "backtest.db"))
+    db.init_database()
+    dates = pd.date_range("2024-01-01", periods=200).strftime("%Y-%m-%d")
+    rng = np.random.default_rng(0)
+    rows = pd.DataFrame([
+        {"date": d, "city": city, "request_count": int(rng.integers(50, 150)), "temperature_c": 20.0,
+         "rainfall_mm": 0.0, "day_of_week": 0, "is_weekend": 0, "is_holiday": 0, "month": 1,
+         "population_density": 1000}
+        for city in ("Sydney", "Perth") for d in dates
+    ])
+    db.upsert_demand_rows(db.get_connection(), rows)
+    yield
+    db.close_connections()
+
+
+def test_repeated_backtest_gives_same_metrics(demand_db, monkeypatch):
+    backend = StatefulBackend()
+    monkeypatch.setattr(backends, "for_model", lambda model: backend)
+
+    def run():
+        asyncio.run(backtest.run_backtest(["Sydney", "Perth"], ["arima"], folds=4, horizon=7, step=7))
+        return db.get_model_performance().sort_values(["city"], na_position="first")[["mae", "rmse", "mape"]]
+
+    first = run()
+    second = run()
+    pd.testing.assert_frame_equal(first.reset_index(drop=True), second.reset_index(drop=True))
+    assert backend.seen == {}  # Each run deletes its state
+
+
+def test_folds_skip_gaps_in_daily_rows():
+    dates = pd.date_range("2024-01-01", periods=60).to_numpy(dtype="datetime64[D]")
+    # 2024-02-10 is missing: positional origins would pair forecasts with shifted actuals
+    dates = np.delete(dates, 40)
+    origins = backtest.fold_origins(dates, folds=4, horizon=7, step=7)
+    # The 02-08 fold needs the missing day and is dropped; the others keep their calendar dates
+    assert [str(o) for o in origins] == ["2024-02-01", "2024-02-15", "2024-02-22"]
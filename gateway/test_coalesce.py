@@ -0,0 +1,59 @@
+import asyncio
+
+from coalesce import ForecastCoalescer
+
+
+def write(coalescer, city):
+    coalescer.invalidate([{"city": city, "date": "2024-01-02"}])
+
+
+def test_write_for_one_city_keeps_other_cities_flights():
+    async def run():
+        coalescer = ForecastCoalescer(ttl=60)
+        release = asyncio.Event()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return len(calls)
+
+        first = asyncio.ensure_future(coalescer.run("sydney-7", compute, city="Sydney", as_of="2024-01-01"))
+        await asyncio.sleep(0)
+        write(coalescer, "Perth")
+        # Joins the Sydney call in flight, then is served from its cached result
+        second = asyncio.ensure_future(coalescer.run("sydney-7", compute, city="Sydney", as_of="2024-01-01"))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(first, second)
+        cached = await coalescer.run("sydney-7", compute, city="Sydney", as_of="2024-01-01")
+        return results, cached, len(calls), coalescer.stats()
+
+    results, cached, calls, stats = asyncio.run(run())
+    assert results == [1, 1] and cached == 1 and calls == 1
+    assert stats["coalesced"] == 1 and stats["hits"] == 1
+
+
+def test_write_for_a_city_drops_its_flight_and_cityless_results():
+    async def run():
+        coalescer = ForecastCoalescer(ttl=60)
+
+        async def compute():
+            return "result"
+
+        await coalescer.run("all-cities", compute)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "stale"
+
+        flight = asyncio.ensure_future(coalescer.run("sydney-7", slow, city="Sydney", as_of="2024-01-01"))
+        await asyncio.sleep(0)
+        write(coalescer, "Sydney")
+        release.set()
+        await flight
+        return coalescer.stats()
+
+    stats = asyncio.run(run())
+    assert stats["entries"] == 0  # The cityless result was dropped; the Sydney flight was not cached
@@ -0,0 +1,50 @@
+import sqlite3
+import threading
+
+import pandas as pd
+import pytest
+
+import database as db
+
+
+def test_close_connections_closes_other_threads_connections(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "pool.db"))
+    opened = []
+    worker = threading.Thread(target=lambda: opened.append(db.get_connection()))
+    worker.start()
+    worker.join()
+
+    db.close_connections()
+    with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+        opened[0].execute("SELECT 1")
+    assert db._all_connections == []
+    # This thread gets a fresh connection after the pool is closed
+    assert db.get_connection().execute("SELECT 1").fetchone() == (1,)
+    db.close_connections()
+
+
+def demand_row(date, count):
+    return {"date": date, "city": "Sydney", "request_count": count, "temperature_c": 20.0, "rainfall_mm": 0.0,
+            "day_of_week": 0, "is_weekend": 0, "is_holiday": 0, "month": 1, "population_density": 1000}
+
+
+def test_resaving_a_scored_run_counts_each_forecast_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "accuracy.db"))
+    db.init_database()
+    db.save_forecasts("2024-01-01", "Sydney", "arima", [("2024-01-02", 100), ("2024-01-03", 100)])
+    db.upsert_demand_rows(db.get_connection(), pd.DataFrame([demand_row("2024-01-02", 110)]))
+
+    # A slow forecast for the same run finishes after the actual was scored
+    db.save_forecasts("2024-01-01", "Sydney", "arima", [("2024-01-02", 120), ("2024-01-03", 120)])
+    accuracy = db.get_forecast_accuracy().set_index("lag")
+    assert accuracy.loc[1, "n"] == 1
+    assert accuracy.loc[1, "sum_abs_error"] == pytest.approx(10)  # |120 - 110|
+
+    # A corrected actual replaces the new forecast's error, not the old one's
+    db.upsert_demand_rows(db.get_connection(), pd.DataFrame([demand_row("2024-01-02", 115)]))
+    db.save_forecast("2024-01-01", "2024-01-02", "Sydney", "arima", 118)
+    accuracy = db.get_forecast_accuracy().set_index("lag")
+    assert accuracy.loc[1, "n"] == 1
+    assert accuracy.loc[1, "sum_abs_error"] == pytest.approx(3)  # |118 - 115|
+    assert 2 not in accuracy.index
+    db.close_connections()
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+import database as db
+from jobs import JobManager
+
+
+@pytest.fixture
+def jobs_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "jobs.db"))
+    db.init_database()
+    yield
+    db.close_connections()
+
+
+async def slow(params, report):
+    await asyncio.sleep(60)
+
+
+async def started(manager, job_id):
+    while db.get_job(job_id)["status"] != "running":
+        await asyncio.sleep(0.01)
+
+
+def test_stop_returns_while_a_job_is_running(jobs_db):
+    async def run():
+        manager = JobManager(workers=1)
+        manager.register("slow", slow)
+        await manager.start()
+        job = manager.submit("slow", {})
+        await started(manager, job["id"])
+        await asyncio.wait_for(manager.stop(), 5)
+        return job["id"]
+
+    job_id = asyncio.run(run())
+    # Left running, so the next start marks it interrupted
+    assert db.get_job(job_id)["status"] == "running"
+    db.recover_jobs("1970-01-01")
+    assert db.get_job(job_id)["status"] == "failed"
+
+
+def test_user_cancel_marks_running_job_cancelled(jobs_db):
+    async def run():
+        manager = JobManager(workers=1)
+        manager.register("slow", slow)
+        await manager.start()
+        job = manager.submit("slow", {})
+        await started(manager, job["id"])
+        manager.cancel(job["id"])
+        while db.get_job(job["id"])["status"] == "running":
+            await asyncio.sleep(0.01)
+        await manager.stop()
+        return job["id"]
+
+    assert db.get_job(asyncio.run(run()))["status"] == "cancelled"
@@ -0,0 +1,45 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+import database as db
+from precompute import PrecomputeScheduler
+
+
+@pytest.fixture
+def demand_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "precompute.db"))
+    db.init_database()
+    rows = pd.DataFrame([{"date": "2024-01-01", "city": "Sydney", "request_count": 100, "temperature_c": 20.0,
+                          "rainfall_mm": 0.0, "day_of_week": 0, "is_weekend": 0, "is_holiday": 0, "month": 1,
+                          "population_density": 1000}])
+    db.upsert_demand_rows(db.get_connection(), rows)
+    yield
+    db.close_connections()
+
+
+def test_failed_pair_is_retried(demand_db):
+    calls = []
+
+    async def forecast(city, model, horizon, latest_date):
+        calls.append(model)
+        if model == "ml" and calls.count("ml") == 1:
+            raise RuntimeError("backend not ready")
+        dates = pd.date_range("2024-01-02", periods=horizon).strftime("%Y-%m-%d")
+        return {"forecast_date": latest_date, "forecasts": [{"date": d, "predicted_count": 1.0} for d in dates]}
+
+    async def run():
+        scheduler = PrecomputeScheduler(horizons=[7], debounce=0, retry=0.05)
+        scheduler.start(forecast, ["Sydney"], ["classical", "ml"])
+        for _ in range(200):
+            if scheduler.get("Sydney", "ml", 7, "2024-01-01") is not None:
+                break
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert scheduler.get("Sydney", "ml", 7, "2024-01-01") is not None
+    assert scheduler.get("Sydney", "classical", 7, "2024-01-01") is not None
+    assert calls.count("ml") == 2
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+
+# How often a global (cross-series) model is retrained
+GLOBAL_REFRESH_SECONDS = float(os.getenv("ML_GLOBAL_REFRESH_SECONDS", 6 * 60 * 60))
+
+
+class GlobalModelStore:
+    """
+    One model per configuration trained across every series, refreshed on a
+    schedule rather than per request. A model older than refresh_seconds keeps
+    serving while a replacement trains in the background; only a missing
+    model, one trained on another data version (e.g. before the latest day
+    arrived) or a forced refit (e.g. for a category it has never seen) makes
+    the caller wait for training.
+    """
+
+    def __init__(self, refresh_seconds=GLOBAL_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._entries = {}
+        self._refreshing = set()
+        self._fit_locks = {}
+        self._lock = threading.Lock()
+        self.fits = 0
+        self.background_fits = 0
+        self.failed_refreshes = 0
+
+    def _fit(self, key, fit_fn, version):
+        entry = dict(fit_fn(), trained_at=time.time(), version=version)
+        with self._lock:
+            self._entries[key] = entry
+            self.fits += 1
+        return entry
+
+    def _refresh(self, key, fit_fn, version):
+        try:
+            self._fit(key, fit_fn, version)
+            with self._lock:
+                self.background_fits += 1
+        except Exception:
+            # Keep serving the previous model; the next request retries
+            with self._lock:
+                self.failed_refreshes += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get(self, key, fit_fn, version=None, force=False):
+        """
+        Return (entry, status) for key. fit_fn() must return a dict describing
+        a freshly trained model on data of the given version. status is "fit"
+        (trained now), "cached", or "stale" (served while a background refresh runs).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            fit_lock = self._fit_locks.setdefault(key, threading.Lock())
+
+        if entry is None or entry["version"] != version or force:
+            # Concurrent first requests for the same key train once
+            with fit_lock:
+                with self._lock:
+                    current = self._entries.get(key)
+                if current is not None and current is not entry and current["version"] == version:
+                    return current, "cached"
+                return self._fit(key, fit_fn, version), "fit"
+
+        if time.time() - entry["trained_at"] < self.refresh_seconds:
+            return entry, "cached"
+        with self._lock:
+            if key in self._refreshing:
+                return entry, "stale"
+            self._refreshing.add(key)
+        threading.Thread(target=self._refresh, args=(key, fit_fn, version), daemon=True).start()
+        return entry, "stale"
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            now = time.time()
+            return {
+                "models": len(self._entries),
+                "refresh_seconds": self.refresh_seconds,
+                "fits": self.fits,
+                "background_fits": self.background_fits,
+                "failed_refreshes": self.failed_refreshes,
+                "refreshing": len(self._refreshing),
+                "ages_seconds": sorted(round(now - e["trained_at"], 1) for e in self._entries.values()),
+            }
+
+
+global_models = GlobalModelStore()
@@ -1,23 +1,45 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.svm import SVR
+from sklearn.multioutput import MultiOutputRegressor
+from sklearn.model_selection import KFold, cross_val_predict
 from sklearn.preprocessing import LabelEncoder
 from xgboost import XGBRegressor
+from model_registry import registry, fingerprint
+from training_executor import executor, TrainingTimeout
+from global_model import global_models
+import intervals
+import eta_model
+from eta_model import eta_scorer, EtaModelUnavailable
+import io
+import json
+import tempfile
+import threading
+import time
+import wire_format as wire
+from instrumentation import instrument, metrics, stage
 
 app = FastAPI(title="ML Forecasting Service")
+instrument(app, "ml")
 
 class ForecastRequest(BaseModel):
-    data: List[dict]
+    data: List[dict]  # Empty for columnar requests, whose rows travel in the packed body
     target_column: str
     date_column: str
     model: str  # 'rf', 'gbm', 'svm', 'xgboost'
     horizon: int = 10
     params: Optional[dict] = {}
     feature_columns: Optional[List[str]] = None  # NEW: Allow explicit feature selection
+    quantiles: Optional[List[float]] = None  # e.g. [0.1, 0.9] to also return prediction quantiles
+
+class GlobalForecastRequest(ForecastRequest):
+    series_column: str = 'city'  # Column identifying each series in the combined data
 
 def create_multivariate_features(df, target_col, date_col, feature_cols, lags):
     """
@@ -52,16 +74,201 @@ def encode_categorical_features(df, exclude_cols):
     for col in df.columns:
         if col in exclude_cols:
             continue
-        if df[col].dtype == 'object' or df[col].dtype.name == 'category':
+        if pd.api.types.is_string_dtype(df[col]) or df[col].dtype.name == 'category':
             encoders[col] = LabelEncoder()
             df_encoded[col] = encoders[col].fit_transform(df[col].astype(str))
     
     return df_encoded, encoders
 
+TIME_FEATURES = ['day_of_week', 'day_of_month', 'month', 'quarter', 'year']
+
+# Minimum training rows for a direct (multi-output) fit
+MIN_DIRECT_ROWS = 10
+
+# Folds for the out-of-fold residuals behind prediction intervals
+RESIDUAL_FOLDS = 5
+
+def build_model(model_name, params, multi_output=False, oob_score=False):
+    """
+    Instantiate an unfitted estimator for the requested model.
+    With multi_output, the estimator predicts a whole horizon per row: RF and
+    XGBoost handle 2-D targets natively, GBM and SVM get one model per step.
+    oob_score makes random forests keep out-of-bag predictions, which give
+    honest residuals for prediction intervals but cost extra work per fit.
+    """
+    if model_name.lower() == 'rf':
+        n_estimators = params.get('n_estimators', 100)
+        return RandomForestRegressor(n_estimators=n_estimators, oob_score=oob_score, random_state=42)
+    elif model_name.lower() == 'gbm':
+        model = GradientBoostingRegressor(random_state=42)
+    elif model_name.lower() == 'svm':
+        model = SVR()
+    elif model_name.lower() == 'xgboost':
+        return XGBRegressor(random_state=42)
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown model: {model_name}")
+    return MultiOutputRegressor(model) if multi_output else model
+
+def future_feature_matrix(feature_names, last_row, last_date, horizon, feature_cols):
+    """
+    Preallocated feature matrix for the forecast horizon, one row per step.
+    Time features come from the future dates; additional feature columns
+    carry their last known values (and take precedence, as they always have).
+    Lag columns are left at zero for the caller to fill.
+    """
+    dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=horizon, freq='D')
+    time_values = {
+        'day_of_week': dates.dayofweek,
+        'day_of_month': dates.day,
+        'month': dates.month,
+        'quarter': dates.quarter,
+        'year': dates.year,
+    }
+    X_future = np.zeros((horizon, len(feature_names)))
+    for j, name in enumerate(feature_names):
+        if name in feature_cols:
+            X_future[:, j] = last_row[name]
+        elif name in time_values:
+            X_future[:, j] = time_values[name]
+    return X_future
+
+def lag_positions(feature_names, lags):
+    """Column index of lag_1 ... lag_<lags> in the feature matrix"""
+    return [feature_names.index(f'lag_{lag}') for lag in range(1, lags + 1)]
+
+def fill_lags(X_row, feature_names, window, lags):
+    """Write a window (oldest first) into the lag columns of a single-row matrix"""
+    X_row[0, lag_positions(feature_names, lags)] = window[::-1]
+
+def recursive_forecast(model, X_future, feature_names, last_window, lags):
+    """
+    Recursive forecast over a preallocated feature matrix: each step writes the
+    latest values (including earlier predictions) into the lag columns.
+    """
+    horizon = len(X_future)
+    positions = lag_positions(feature_names, lags)
+    values = np.empty(lags + horizon)
+    values[:lags] = last_window
+    for i in range(horizon):
+        X_future[i, positions] = values[i:i + lags][::-1]
+        values[lags + i] = model.predict(X_future[i:i + 1])[0]
+    return values[lags:]
+
+def bootstrap_forecast(model, X_future, feature_names, last_window, lags, residuals):
+    """Simulated recursive forecast paths: each step predicts every path in one batch"""
+    positions = lag_positions(feature_names, lags)
+    
+    def predict_step(i, windows):
+        X_step = np.repeat(X_future[i:i + 1], len(windows), axis=0)
+        X_step[:, positions] = windows[:, ::-1]
+        return model.predict(X_step)
+    
+    return intervals.bootstrap_paths(predict_step, last_window, residuals, len(X_future))
+
+def out_of_fold_residuals(estimator, X, y):
+    """
+    Errors of predictions made by models that did not see the row (contiguous
+    folds); module-level so it can run in the training process pool.
+    """
+    fitted = cross_val_predict(estimator, X, y, cv=KFold(RESIDUAL_FOLDS))
+    return np.asarray(y, dtype=float) - np.asarray(fitted).reshape(np.shape(y))
+
+def forecast_residuals(request, model, estimator, cache_key, X, y, timeout):
+    """
+    Forecast errors for prediction intervals. In-sample errors of boosted trees
+    are near zero, so random forests use their out-of-bag predictions and other
+    models out-of-fold predictions (cached like fitted models).
+    """
+    if getattr(model, 'oob_prediction_', None) is not None:
+        residuals = np.asarray(y, dtype=float) - np.asarray(model.oob_prediction_).reshape(np.shape(y))
+    else:
+        residuals, _ = registry.get_or_fit(('residuals', cache_key), lambda: executor.run(
+            request.model.lower(), out_of_fold_residuals, estimator, X, y, timeout=timeout))
+    return residuals[~np.isnan(residuals).reshape(len(residuals), -1).any(axis=1)]
+
+def batched_recursive_forecast(model, X_future, feature_names, last_windows, lags):
+    """
+    recursive_forecast for many series at once: X_future is (series, horizon,
+    features) and each step is a single predict over every series.
+    """
+    n_series, horizon, _ = X_future.shape
+    positions = lag_positions(feature_names, lags)
+    values = np.empty((n_series, lags + horizon))
+    values[:, :lags] = last_windows
+    for i in range(horizon):
+        X_step = X_future[:, i, :]
+        X_step[:, positions] = values[:, i:i + lags][:, ::-1]
+        values[:, lags + i] = model.predict(X_step)
+    return values[:, lags:]
+
+def encode_with(df, encoders):
+    """Apply fitted LabelEncoders; raises KeyError naming a column with unseen values"""
+    df_encoded = df.copy()
+    for col, encoder in encoders.items():
+        codes = df[col].astype(str).map({value: i for i, value in enumerate(encoder.classes_)})
+        if codes.isna().any():
+            raise KeyError(col)
+        df_encoded[col] = codes.astype(int)
+    return df_encoded
+
+def direct_targets(y, horizon):
+    """Target matrix whose row t holds y[t], ..., y[t + horizon - 1] (complete rows only)"""
+    values = y.to_numpy(dtype=float)
+    if len(values) < horizon:
+        return pd.DataFrame(np.empty((0, horizon)))
+    windows = np.lib.stride_tricks.sliding_window_view(values, horizon)
+    return pd.DataFrame(windows, columns=[f'step_{h}' for h in range(1, horizon + 1)])
+
+def fit_estimator(estimator, X, y):
+    """
+    Fit an estimator; module-level so it can run in the training process pool.
+    Fitted on plain arrays because forecasts predict on preallocated arrays
+    (sklearn warns on every predict when fit and predict inputs differ).
+    """
+    return estimator.fit(np.asarray(X), np.asarray(y))
+
+def cache_metric_families():
+    """Fitted-model cache state for the /metrics endpoint"""
+    stats = registry.stats()
+    return [
+        ("model_cache_lookups_total", "counter", "Fitted-model cache lookups by outcome",
+         [({"outcome": outcome}, stats[outcome]) for outcome in ("hits", "misses")]),
+        ("model_cache_bytes", "gauge", "Estimated size of cached models", [({}, stats["bytes"])]),
+        ("model_cache_entries", "gauge", "Cached models", [({}, stats["entries"])]),
+    ]
+
+metrics.add_collector(executor.metric_families)
+metrics.add_collector(cache_metric_families)
+metrics.add_collector(eta_scorer.metric_families)
+
+def fit_eta_in_pool(df):
+    return executor.run("eta", eta_model.fit_eta_model, df)
+
+def warm_eta_model():
+    """Train the ETA model in the background so the first scoring call doesn't wait"""
+    try:
+        eta_scorer.ensure_trained(fit_eta_in_pool)
+    except Exception:
+        pass  # No training data here, or the fit failed; the first /eta call reports why
+
+@app.on_event("startup")
+def startup_event():
+    executor.start(preload=["main"])
+    threading.Thread(target=warm_eta_model, daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    executor.shutdown()
+
 @app.post("/predict")
-def predict(request: ForecastRequest):
+async def predict(http_request: Request, x_request_timeout: Optional[float] = Header(None)):
+    """Forecast from a JSON ForecastRequest or a columnar payload, chosen by Content-Type"""
+    with stage("decode"):
+        request, df = await wire.read_forecast_request(http_request, ForecastRequest)
+    return await run_in_threadpool(forecast, request, df, x_request_timeout)
+
+def forecast(request: ForecastRequest, df: pd.DataFrame, x_request_timeout: Optional[float] = None):
     try:
-        df = pd.DataFrame(request.data)
         df[request.date_column] = pd.to_datetime(df[request.date_column])
         df = df.sort_values(by=request.date_column)
         
@@ -76,7 +283,8 @@ def predict(request: ForecastRequest):
             feature_cols = [c for c in df.columns if c not in [request.date_column, request.target_column]]
         
         # Create features
-        df_processed = create_multivariate_features(df, request.target_column, request.date_column, feature_cols, lags)
+        with stage("features"):
+            df_processed = create_multivariate_features(df, request.target_column, request.date_column, feature_cols, lags)
         
         if df_processed.empty:
             raise HTTPException(status_code=400, detail="Not enough data points for the requested lag.")
@@ -85,84 +293,344 @@ def predict(request: ForecastRequest):
         exclude_cols = [request.date_column, request.target_column]
         
         # Encode categorical features
-        df_encoded, encoders = encode_categorical_features(df_processed, exclude_cols)
+        with stage("features"):
+            df_encoded, encoders = encode_categorical_features(df_processed, exclude_cols)
         
         # Select features: lagged values + time features + additional feature columns
         feature_names = [c for c in df_encoded.columns if c.startswith('lag_') or 
-                        c in ['day_of_week', 'day_of_month', 'month', 'quarter', 'year'] or
+                        c in TIME_FEATURES or
                         c in feature_cols]
         
         X = df_encoded[feature_names]
         y = df_encoded[request.target_column]
         
-        # Train model
-        if request.model.lower() == 'rf':
-            n_estimators = request.params.get('n_estimators', 100)
-            model = RandomForestRegressor(n_estimators=n_estimators, random_state=42)
-        elif request.model.lower() == 'gbm':
-            model = GradientBoostingRegressor(random_state=42)
-        elif request.model.lower() == 'svm':
-            model = SVR()
-        elif request.model.lower() == 'xgboost':
-            model = XGBRegressor(random_state=42)
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown model: {request.model}")
-            
-        model.fit(X, y)
-        
-        # Recursive forecasting
-        # For simplicity, we'll use the last known values for additional features
-        # In a real scenario, you might want to forecast these too or use expected values
-        last_row = df_encoded.iloc[-1]
-        last_window = df[request.target_column].values[-lags:]
-        forecast = []
+        quantiles = intervals.check_quantiles(request.quantiles) if request.quantiles else None
         
-        current_window = last_window.copy()
+        strategy = request.params.get('strategy', 'recursive')
+        if strategy not in ('recursive', 'direct'):
+            raise HTTPException(status_code=400, detail=f"Unknown strategy: {strategy}")
         
-        # Get the last date for time feature generation
+        # Future feature rows: time features for each step, last known values for the rest
         last_date = df[request.date_column].iloc[-1]
+        X_future = future_feature_matrix(feature_names, df_encoded.iloc[-1], last_date, request.horizon, feature_cols)
+        last_window = df[request.target_column].values[-lags:].astype(float)
         
-        for i in range(request.horizon):
-            # Create feature vector for prediction
-            future_date = last_date + pd.Timedelta(days=i+1)
-            
-            # Build feature dict
-            feature_dict = {}
-            
-            # Lagged features
-            for lag_idx, lag in enumerate(range(lags, 0, -1)):
-                feature_dict[f'lag_{lag}'] = current_window[lag_idx]
-            
-            # Time features
-            feature_dict['day_of_week'] = future_date.dayofweek
-            feature_dict['day_of_month'] = future_date.day
-            feature_dict['month'] = future_date.month
-            feature_dict['quarter'] = future_date.quarter
-            feature_dict['year'] = future_date.year
-            
-            # Additional features (use last known values)
-            for col in feature_cols:
-                if col in df_encoded.columns:
-                    feature_dict[col] = last_row[col]
-            
-            # Create feature array in correct order
-            input_features = np.array([[feature_dict.get(fn, 0) for fn in feature_names]])
-            
-            pred = model.predict(input_features)[0]
-            forecast.append(float(pred))
-            
-            # Update window
-            current_window = np.append(current_window[1:], pred)
+        # Only interval requests pay for out-of-bag scoring; it is part of the cache key
+        oob_score = bool(quantiles) and request.model.lower() == 'rf'
+        fit_params = {**request.params, 'oob_score': True} if oob_score else request.params
+        
+        if strategy == 'direct':
+            # One multi-output model: row t predicts y[t], ..., y[t + horizon - 1]
+            Y = direct_targets(y, request.horizon)
+            if len(Y) < MIN_DIRECT_ROWS:
+                raise HTTPException(status_code=400, detail="Not enough data points for a direct forecast of this horizon.")
+            X_train = X.iloc[:len(Y)]
+            estimator = build_model(request.model, request.params, multi_output=True, oob_score=oob_score)
+            cache_key = fingerprint(request.model, feature_names, lags, {**fit_params, 'horizon': request.horizon}, X_train, Y)
+            with stage("fit"):
+                model, cache_hit = registry.get_or_fit(cache_key, lambda: executor.run(
+                    request.model.lower(), fit_estimator, estimator, X_train, Y, timeout=x_request_timeout))
             
+            # The first future row carries the lags at the forecast origin
+            with stage("predict"):
+                origin = X_future[:1].copy()
+                fill_lags(origin, feature_names, last_window, lags)
+                forecast = np.asarray(model.predict(origin)).reshape(-1)
+            if quantiles:
+                # One residual distribution per horizon step
+                with stage("intervals"):
+                    residuals = forecast_residuals(request, model, estimator, cache_key, X_train, Y, x_request_timeout)
+                    bands = intervals.residual_quantiles(forecast, residuals, quantiles)
+        else:
+            # Train model, reusing a cached fit when the same frame was seen before
+            estimator = build_model(request.model, request.params, oob_score=oob_score)
+            cache_key = fingerprint(request.model, feature_names, lags, fit_params, X, y)
+            with stage("fit"):
+                model, cache_hit = registry.get_or_fit(cache_key, lambda: executor.run(
+                    request.model.lower(), fit_estimator, estimator, X, y, timeout=x_request_timeout))
+            with stage("predict"):
+                forecast = recursive_forecast(model, X_future, feature_names, last_window, lags)
+            if quantiles:
+                with stage("intervals"):
+                    residuals = forecast_residuals(request, model, estimator, cache_key, X, y, x_request_timeout)
+                    paths = bootstrap_forecast(model, X_future, feature_names, last_window, lags, residuals)
+                    bands = intervals.empirical_quantiles(paths, quantiles)
+        
+        response = {
+            "model": request.model,
+            "forecast": [float(v) for v in forecast],
+            "features_used": feature_names,
+            "strategy": strategy,
+            "cache_hit": cache_hit
+        }
+        if quantiles:
+            response["quantiles"] = bands
+        return response
+        
+    except HTTPException:
+        raise
+    except TrainingTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/predict/global")
+async def predict_global(http_request: Request, x_request_timeout: Optional[float] = Header(None)):
+    """Forecast every series in the data from one model trained across all of them"""
+    with stage("decode"):
+        request, df = await wire.read_forecast_request(http_request, GlobalForecastRequest)
+    return await run_in_threadpool(forecast_global, request, df, x_request_timeout)
+
+def forecast_global(request: GlobalForecastRequest, df: pd.DataFrame, x_request_timeout: Optional[float] = None):
+    """
+    Global model: one estimator trained on every series' rows, with the series
+    column as an encoded feature, so training cost does not grow with the
+    number of series per request. The model is refreshed on a schedule
+    (global_model.GlobalModelStore) and serves all series in batched predicts.
+    """
+    try:
+        if request.series_column not in df.columns:
+            raise HTTPException(status_code=400, detail=f"Missing series column: {request.series_column}")
+        df[request.date_column] = pd.to_datetime(df[request.date_column])
+        df = df.sort_values(by=[request.series_column, request.date_column])
+        
+        lags = request.params.get('lags', 5)
+        if request.feature_columns:
+            feature_cols = list(dict.fromkeys([*request.feature_columns, request.series_column]))
+        else:
+            feature_cols = [c for c in df.columns if c not in [request.date_column, request.target_column]]
+        exclude_cols = [request.date_column, request.target_column]
+        
+        # Lags are computed within each series, never across series boundaries
+        groups = dict(list(df.groupby(request.series_column, sort=False)))
+        with stage("features"):
+            processed = {
+                series: create_multivariate_features(group, request.target_column, request.date_column, feature_cols, lags)
+                for series, group in groups.items()
+            }
+        usable = [series for series, frame in processed.items() if not frame.empty]
+        if not usable:
+            raise HTTPException(status_code=400, detail="Not enough data points for the requested lag.")
+        
+        def fit():
+            training = pd.concat([processed[series] for series in usable], ignore_index=True)
+            df_encoded, encoders = encode_categorical_features(training, exclude_cols)
+            feature_names = [c for c in df_encoded.columns if c.startswith('lag_') or
+                            c in TIME_FEATURES or
+                            c in feature_cols]
+            estimator = build_model(request.model, request.params)
+            model = executor.run(request.model.lower(), fit_estimator, estimator,
+                                 df_encoded[feature_names], df_encoded[request.target_column],
+                                 timeout=x_request_timeout)
+            return {"model": model, "encoders": encoders, "feature_names": feature_names, "rows": len(training)}
+        
+        # One model per series set, so requests for different cities never
+        # replace each other's model; the latest date versions its data
+        key = (request.model.lower(), request.target_column, lags,
+               json.dumps(request.params, sort_keys=True), tuple(sorted(feature_cols)),
+               tuple(sorted(str(series) for series in usable)))
+        version = str(max(groups[series][request.date_column].iloc[-1] for series in usable))
+        with stage("fit"):
+            entry, status = global_models.get(key, fit, version)
+        
+        # Last processed row per series carries the feature values used for the horizon
+        last_rows = pd.DataFrame([processed[series].iloc[-1] for series in usable])
+        try:
+            last_encoded = encode_with(last_rows, entry["encoders"])
+        except KeyError:
+            # A category the model has never seen (e.g. a corrected feature value): retrain now
+            with stage("fit"):
+                entry, status = global_models.get(key, fit, version, force=True)
+            last_encoded = encode_with(last_rows, entry["encoders"])
+        
+        feature_names = entry["feature_names"]
+        X_future = np.stack([
+            future_feature_matrix(feature_names, last_encoded.iloc[i], groups[series][request.date_column].iloc[-1],
+                                  request.horizon, feature_cols)
+            for i, series in enumerate(usable)
+        ])
+        last_windows = np.stack([
+            groups[series][request.target_column].to_numpy(dtype=float)[-lags:] for series in usable
+        ])
+        with stage("predict"):
+            forecasts = batched_recursive_forecast(entry["model"], X_future, feature_names, last_windows, lags)
+        
         return {
             "model": request.model,
-            "forecast": forecast,
-            "features_used": feature_names
+            "forecasts": {str(series): values.tolist() for series, values in zip(usable, forecasts)},
+            "skipped": [str(series) for series in groups if series not in usable],
+            "features_used": feature_names,
+            "model_status": status,
+            "trained_rows": entry["rows"],
+            "model_age_seconds": round(time.time() - entry["trained_at"], 1)
         }
         
+    except HTTPException:
+        raise
+    except TrainingTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/global/stats")
+def global_stats():
+    """Get global model ages and refresh counters"""
+    return global_models.stats()
+
+@app.delete("/global")
+def clear_global():
+    """Drop all global models, forcing a retrain on the next request"""
+    global_models.clear()
+    return {"success": True}
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Get fitted-model cache statistics"""
+    return registry.stats()
+
+@app.get("/training/stats")
+def training_stats():
+    """Get training pool queue depth and fit timings per model"""
+    return executor.stats()
+
+@app.delete("/cache")
+def clear_cache():
+    """Drop all cached fitted models"""
+    registry.clear()
+    return {"success": True}
+
+def eta_frame(body, content_type):
+    """Request rows from a CSV body, or JSON: {"requests": [...]} or a bare list of rows"""
+    if content_type.startswith("text/csv"):
+        return pd.read_csv(io.BytesIO(body), dtype={eta_model.ID_COLUMN: str}, **eta_model.CSV_OPTIONS)
+    payload = json.loads(body or b"[]")
+    rows = payload.get("requests") if isinstance(payload, dict) else payload
+    if not isinstance(rows, list):
+        raise ValueError('Expected {"requests": [...]} or a JSON list of requests')
+    return pd.DataFrame.from_records(rows)
+
+def trained_eta_model():
+    try:
+        return eta_scorer.ensure_trained(fit_eta_in_pool)
+    except EtaModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+def score_eta(df):
+    entry = trained_eta_model()
+    if len(df) == 0:
+        return Response('{"count": 0, "predictions": []}', media_type="application/json")
+    try:
+        with stage("predict"):
+            scored = eta_scorer.score(df, entry)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Missing columns: {e.args[0]}")
+    with stage("encode"):
+        # to_json writes NaN (no SLA given) as null and is much faster than
+        # building a dict per row for large batches
+        body = f'{{"count": {len(scored)}, "predictions": {scored.to_json(orient="records")}}}'
+    return Response(body, media_type="application/json")
+
+def score_ndjson_lines(lines, first_line, entry):
+    """
+    Score one chunk of NDJSON request lines. Returns NDJSON: a prediction per
+    scored row, plus {"line": n, "error": ...} records for lines that could
+    not be parsed or a chunk missing required columns.
+    """
+    rows, errors = [], []
+    for number, line in enumerate(lines, first_line):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("expected a JSON object")
+            rows.append(row)
+        except ValueError as e:
+            errors.append({"line": number, "error": f"Invalid request: {e}"})
+    output = "".join(json.dumps(error) + "\n" for error in errors)
+    if rows:
+        try:
+            with stage("predict"):
+                scored = eta_scorer.score(pd.DataFrame.from_records(rows), entry)
+        except KeyError as e:
+            return output + json.dumps({"line": first_line, "error": f"Missing columns: {e.args[0]}"}) + "\n"
+        with stage("encode"):
+            output += scored.to_json(orient="records", lines=True).rstrip("\n") + "\n"
+    return output
+
+async def ndjson_line_chunks(byte_chunks, chunk_rows):
+    """Group the lines of an NDJSON byte stream into lists of chunk_rows lines as the bytes arrive"""
+    pending, lines = b"", []
+    async for data in byte_chunks:
+        *complete, pending = (pending + data).split(b"\n")
+        lines += complete
+        while len(lines) >= chunk_rows:
+            yield lines[:chunk_rows]
+            lines = lines[chunk_rows:]
+    if pending:
+        lines.append(pending)
+    if lines:
+        yield lines
+
+def read_blocks(source, size=1 << 16):
+    """Yield a file's contents in blocks, closing it at the end"""
+    with source:
+        source.seek(0)
+        while block := source.read(size):
+            yield block
+
+@app.post("/eta/score")
+async def eta_score(http_request: Request):
+    """
+    Predict ETA hours and SLA-breach probability for a batch of service
+    requests, sent as JSON ({"requests": [...]}) or CSV, in one vectorized call
+    """
+    body = await http_request.body()
+    try:
+        with stage("decode"):
+            df = eta_frame(body, http_request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid request body: {e}")
+    return await run_in_threadpool(score_eta, df)
+
+@app.post("/eta/score/stream")
+async def eta_score_stream(http_request: Request):
+    """
+    Score NDJSON requests (one JSON object per line) in chunks of
+    ETA_STREAM_CHUNK_ROWS rows as the body arrives, so neither the body nor
+    a whole backlog is ever held in memory. Predictions are spooled (in
+    memory up to ETA_STREAM_SPOOL_BYTES, then in a temporary file) and
+    streamed back as NDJSON once the body is read: HTTP/1.1 clients such as
+    httpx send the whole body before reading the response, so replying
+    mid-upload could stall both sides once the socket buffers fill.
+    """
+    entry = await run_in_threadpool(trained_eta_model)
+    spool = tempfile.SpooledTemporaryFile(max_size=eta_model.ETA_STREAM_SPOOL_BYTES)
+    first_line = 1
+    try:
+        async for lines in ndjson_line_chunks(http_request.stream(), eta_model.ETA_STREAM_CHUNK_ROWS):
+            scored = await run_in_threadpool(score_ndjson_lines, lines, first_line, entry)
+            await run_in_threadpool(spool.write, scored.encode())
+            first_line += len(lines)
+    except BaseException:
+        spool.close()
+        raise
+    return StreamingResponse(read_blocks(spool), media_type="application/x-ndjson")
+
+@app.post("/eta/train")
+def eta_train():
+    """Retrain the ETA model from its training data (e.g. after the CSV is refreshed)"""
+    try:
+        eta_scorer.train(fit_eta_in_pool)
+    except EtaModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return eta_scorer.stats()
+
+@app.get("/eta/stats")
+def eta_stats():
+    """Get ETA model fit quality (cross-validated), age and scoring counters"""
+    return eta_scorer.stats()
+
 if __name__ == "__main__":
     import uvicorn
     import os
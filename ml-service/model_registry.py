@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Cache limits - read from environment variables so each deployment can size them
+MAX_ENTRIES = int(os.getenv("ML_MODEL_CACHE_MAX_ENTRIES", 64))
+MAX_BYTES = int(os.getenv("ML_MODEL_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def fingerprint(model_name, feature_names, lags, params, X, y):
+    """Build a stable cache key for a training frame and its model settings"""
+    digest = hashlib.sha1()
+    header = {
+        "model": model_name.lower(),
+        "features": list(feature_names),
+        "lags": lags,
+        "params": params or {},
+    }
+    digest.update(json.dumps(header, sort_keys=True, default=str).encode())
+    digest.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+    digest.update(pd.util.hash_pandas_object(y, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def estimate_size(model):
+    """Approximate memory footprint of a fitted estimator in bytes"""
+    try:
+        return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class ModelRegistry:
+    """
+    Bounded LRU of fitted estimators keyed by training-data fingerprint.
+    Entries are evicted oldest-first once either the entry count or the
+    estimated total size exceeds its limit.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, model):
+        size = estimate_size(model)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            # A model larger than the whole budget is served but never cached
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (model, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_fit(self, key, fit_fn):
+        """Return the cached model for key, fitting it with fit_fn on a miss"""
+        model = self.get(key)
+        if model is not None:
+            return model, True
+
+        # Serialize fits of the same key so concurrent identical requests train once
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                with self._lock:
+                    entry = self._entries.get(key)
+                if entry is not None:
+                    return entry[0], True
+                model = fit_fn()
+                self.put(key, model)
+                return model, False
+        finally:
+            with self._lock:
+                self._key_locks.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+registry = ModelRegistry()
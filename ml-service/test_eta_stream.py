@@ -0,0 +1,25 @@
+import asyncio
+
+from main import ndjson_line_chunks
+
+
+async def pieces(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def chunks(data, size, chunk_rows):
+    async def collect():
+        return [lines async for lines in ndjson_line_chunks(pieces(data, size), chunk_rows)]
+    return asyncio.run(collect())
+
+
+def test_lines_split_across_reads_are_rejoined():
+    data = b"".join(b'{"id": %d}\n' % i for i in range(7)) + b'{"id": 7}'
+    result = chunks(data, 5, chunk_rows=3)
+    assert [len(lines) for lines in result] == [3, 3, 2]
+    assert [line for lines in result for line in lines] == [b'{"id": %d}' % i for i in range(8)]
+
+
+def test_empty_body_yields_nothing():
+    assert chunks(b"", 5, chunk_rows=3) == []
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from global_model import GlobalModelStore
+
+
+@pytest.fixture(autouse=True)
+def inline_fits(monkeypatch):
+    monkeypatch.setattr(main.executor, "workers", 0)
+    monkeypatch.setattr(main, "global_models", GlobalModelStore())
+
+
+def request(cities, days=60):
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2024-01-01", periods=days)
+    df = pd.DataFrame([{"date": d, "city": city, "request_count": float(rng.integers(50, 150))}
+                       for city in cities for d in dates])
+    body = main.GlobalForecastRequest(data=[], target_column="request_count", date_column="date",
+                                      model="gbm", horizon=3)
+    return body, df
+
+
+def forecast(cities, days=60):
+    return main.forecast_global(*request(cities, days))
+
+
+def test_other_series_set_does_not_replace_the_model():
+    assert forecast(["Sydney", "Perth"])["model_status"] == "fit"
+    assert forecast(["Melbourne"])["model_status"] == "fit"
+    result = forecast(["Sydney", "Perth"])
+    assert result["model_status"] == "cached"
+    assert result["trained_rows"] > 0
+
+
+def test_new_data_retrains():
+    forecast(["Sydney", "Perth"])
+    assert forecast(["Sydney", "Perth"], days=61)["model_status"] == "fit"
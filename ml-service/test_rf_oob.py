@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+from model_registry import ModelRegistry
+
+
+@pytest.fixture
+def fits(monkeypatch):
+    monkeypatch.setattr(main.executor, "workers", 0)
+    monkeypatch.setattr(main, "registry", ModelRegistry())
+    fitted = []
+    fit = main.fit_estimator
+
+    def record(estimator, X, y):
+        fitted.append(estimator.get_params()["oob_score"])
+        return fit(estimator, X, y)
+
+    monkeypatch.setattr(main, "fit_estimator", record)
+    return fitted
+
+
+def forecast(quantiles=None):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"date": pd.date_range("2024-01-01", periods=60),
+                       "request_count": rng.integers(50, 150, 60).astype(float)})
+    request = main.ForecastRequest(data=[], target_column="request_count", date_column="date",
+                                   model="rf", horizon=3, params={"n_estimators": 20}, quantiles=quantiles)
+    return main.forecast(request, df)
+
+
+def test_only_interval_requests_fit_with_oob_scoring(fits):
+    forecast()
+    assert fits == [False]
+    result = forecast(quantiles=[0.1, 0.9])
+    assert fits == [False, True]  # A separate cache entry, not the plain fit
+    assert len(result["quantiles"]) == 2
+    assert forecast()["cache_hit"] and fits == [False, True]
@@ -0,0 +1,204 @@
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, TimeoutError as FuturesTimeout, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# This module is shared by the classical, ML and DL services; each service
+# directory carries its own copy because every service builds as its own image.
+
+# Worker processes for model fits; 0 runs fits inline in the calling thread.
+# Each worker holds its own copy of the model libraries, so keep this small
+# (the host's CPU count can be far above what the container may use)
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", 2))
+TRAINING_START_METHOD = os.getenv("TRAINING_START_METHOD", "spawn")
+
+
+def _preload(modules):
+    """Import modules in a worker process and report its pid"""
+    for module in modules:
+        importlib.import_module(module)
+    return os.getpid()
+
+
+class TrainingTimeout(Exception):
+    """Raised when a fit does not finish before the caller's deadline"""
+
+
+def model_limit(model, workers):
+    """
+    Concurrent fits allowed for a model, e.g. TRAINING_MAX_CONCURRENT_SARIMA=2.
+    By default every worker but one, so another model always finds a free worker.
+    """
+    return int(os.getenv(f"TRAINING_MAX_CONCURRENT_{model.upper()}", max(workers - 1, 1)))
+
+
+class TrainingExecutor:
+    """
+    Runs CPU-bound model fits in a process pool so they are not serialized
+    by the GIL. Each model has its own concurrency limit, so a burst of slow
+    fits for one model cannot take every worker. A fit still waiting when
+    the caller's deadline passes is cancelled rather than run for nobody.
+    """
+
+    def __init__(self, workers=TRAINING_WORKERS, start_method=TRAINING_START_METHOD):
+        self.workers = workers
+        self.start_method = start_method
+        self._pool = None
+        self._lock = threading.Lock()
+        self._limits = {}
+        self._stats = {}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context(self.start_method)
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def _reset_pool(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _model_state(self, model):
+        with self._lock:
+            if model not in self._limits:
+                limit = model_limit(model, self.workers)
+                self._limits[model] = threading.BoundedSemaphore(limit)
+                self._stats[model] = {
+                    "limit": limit, "queued": 0, "running": 0, "completed": 0,
+                    "failed": 0, "timed_out": 0, "queue_seconds": 0.0, "run_seconds": 0.0,
+                }
+            return self._limits[model], self._stats[model]
+
+    def _count(self, stats, field, delta=1):
+        with self._lock:
+            stats[field] += delta
+
+    def run(self, model, fn, *args, timeout=None):
+        """
+        Run fn(*args) for a model and return its result. fn and args must be
+        picklable (module-level functions, estimators, arrays). timeout is the
+        caller's remaining budget in seconds, covering queueing and the fit.
+        """
+        return self.run_many(model, fn, [args], timeout=timeout)[0]
+
+    def run_many(self, model, fn, arg_list, timeout=None):
+        """
+        Run fn(*args) for every args tuple in arg_list in parallel and return
+        the results in order, e.g. for fitting order-search candidates. The
+        batch waits for one of the model's concurrency slots, takes whichever
+        others are free (up to one per worker it can use) and never runs more
+        fits at once than the slots it holds.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+
+        def remaining():
+            return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+        limit, stats = self._model_state(model)
+        queued_at = time.perf_counter()
+        self._count(stats, "queued")
+        acquired = limit.acquire(timeout=remaining())
+        self._count(stats, "queued", -1)
+        if not acquired:
+            self._count(stats, "timed_out")
+            raise TrainingTimeout(f"{model} fit was still queued when the request timed out")
+
+        # Extra slots are only taken when free, so two batches cannot deadlock
+        slots = 1
+        while slots < min(len(arg_list), max(self.workers, 1)) and limit.acquire(blocking=False):
+            slots += 1
+
+        started_at = time.perf_counter()
+        self._count(stats, "queue_seconds", started_at - queued_at)
+        self._count(stats, "running", slots)
+        try:
+            if self.workers <= 0:
+                results = [fn(*args) for args in arg_list]
+            else:
+                pool = self._get_pool()
+                todo = iter(enumerate(arg_list))
+                pending = {}
+                results = [None] * len(arg_list)
+
+                def submit_next():
+                    for i, args in todo:
+                        pending[pool.submit(fn, *args)] = i
+                        return
+
+                try:
+                    for _ in range(slots):
+                        submit_next()
+                    while pending:
+                        done, _ = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+                        if not done:
+                            raise FuturesTimeout()
+                        for future in done:
+                            results[pending.pop(future)] = future.result()
+                            submit_next()
+                except FuturesTimeout:
+                    # Running fits finish and are discarded; the rest never start
+                    for future in pending:
+                        future.cancel()
+                    self._count(stats, "timed_out")
+                    raise TrainingTimeout(f"{model} fit did not finish before the request timed out")
+                except BrokenProcessPool:
+                    self._reset_pool()
+                    raise
+            self._count(stats, "completed")
+            return results
+        except TrainingTimeout:
+            raise
+        except Exception:
+            self._count(stats, "failed")
+            raise
+        finally:
+            self._count(stats, "running", -slots)
+            self._count(stats, "run_seconds", time.perf_counter() - started_at)
+            for _ in range(slots):
+                limit.release()
+
+    def start(self, preload=()):
+        """
+        Start the workers up front, importing the preload modules in each, so
+        the first fits don't pay process start-up and import time.
+        """
+        if self.workers <= 0:
+            return
+        pool = self._get_pool()
+        for future in [pool.submit(_preload, list(preload)) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        self._reset_pool()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "start_method": self.start_method,
+                "models": {model: dict(stats) for model, stats in self._stats.items()},
+            }
+
+    def metric_families(self):
+        """Per-model queue state and fit counters, for the /metrics endpoint"""
+        with self._lock:
+            stats = {model: dict(s) for model, s in self._stats.items()}
+        by_model = lambda field: [({"model": model}, s[field]) for model, s in stats.items()]
+        return [
+            ("training_queued", "gauge", "Fits waiting for a training slot", by_model("queued")),
+            ("training_running", "gauge", "Fits running in the training pool", by_model("running")),
+            ("training_completed_total", "counter", "Fits completed", by_model("completed")),
+            ("training_failed_total", "counter", "Fits that raised", by_model("failed")),
+            ("training_timed_out_total", "counter", "Fits abandoned at the caller's timeout", by_model("timed_out")),
+            ("training_queue_seconds_total", "counter", "Time fits spent waiting for a slot", by_model("queue_seconds")),
+            ("training_run_seconds_total", "counter", "Time spent fitting", by_model("run_seconds")),
+        ]
+
+
+executor = TrainingExecutor()
@@ -1,19 +1,8 @@
 import requests
-import pandas as pd
-import numpy as np
 import time
 import sys
 import os
 
-# Generate dummy data
-def generate_data(filename='data.csv'):
-    dates = pd.date_range(start='2023-01-01', periods=100, freq='D')
-    values = np.sin(np.linspace(0, 10, 100)) + np.random.normal(0, 0.1, 100)
-    df = pd.DataFrame({'date': dates, 'value': values})
-    df.to_csv(filename, index=False)
-    print(f"Generated {filename}")
-    return filename
-
 def wait_for_service(url, name, retries=10):
     print(f"Waiting for {name} at {url}...")
     for i in range(retries):
@@ -34,51 +23,54 @@ def test_system():
     if not wait_for_service(gateway_url, "Gateway"):
         sys.exit(1)
 
-    # 1. Upload
-    filename = generate_data()
-    with open(filename, 'rb') as f:
-        files = {'file': (filename, f, 'text/csv')}
-        response = requests.post(f"{gateway_url}/upload", files=files)
-    
+    # 1. Data
+    response = requests.get(f"{gateway_url}/data/cities")
     if response.status_code == 200:
-        print("Upload successful!")
-        data_preview = response.json()['preview']
+        cities = response.json()['cities']
+        print("Cities:", cities)
     else:
-        print(f"Upload failed: {response.text}")
+        print(f"Listing cities failed: {response.text}")
         sys.exit(1)
 
-    # 2. Forecast Classical (ARIMA)
-    payload = {
-        "data": data_preview,
-        "target_column": "value",
-        "date_column": "date",
-        "model": "arima",
-        "horizon": 5
-    }
-    print("Testing Classical (ARIMA)...")
-    resp = requests.post(f"{gateway_url}/forecast/classical", json=payload)
-    if resp.status_code == 200:
-        print("Classical Forecast Success:", resp.json()['forecast'])
+    city = cities[0]
+    response = requests.get(f"{gateway_url}/data/history", params={"city": city, "days": 30})
+    if response.status_code == 200:
+        history = response.json()['data']
+        print(f"History for {city}: {len(history)} days")
     else:
-        print("Classical Forecast Failed:", resp.text)
+        print(f"History failed: {response.text}")
+        sys.exit(1)
 
-    # 3. Forecast ML (Random Forest)
-    payload['model'] = 'rf'
-    print("Testing ML (Random Forest)...")
-    resp = requests.post(f"{gateway_url}/forecast/ml", json=payload)
-    if resp.status_code == 200:
-        print("ML Forecast Success:", resp.json()['forecast'])
-    else:
-        print("ML Forecast Failed:", resp.text)
+    # Re-upload the same rows: exercises ingestion without changing the data
+    columns = ['date', 'city', 'request_count', 'temperature_c', 'rainfall_mm', 'population_density', 'is_holiday']
+    body = "\n".join([",".join(columns)] + [",".join("" if r[c] is None else str(r[c]) for c in columns) for r in history])
+    response = requests.post(f"{gateway_url}/data/upload", files={'file': ('history.csv', body, 'text/csv')})
+    if response.status_code != 202:
+        print(f"Upload failed: {response.text}")
+        sys.exit(1)
+    job_id = response.json()['id']
+    for _ in range(30):
+        job = requests.get(f"{gateway_url}/jobs/{job_id}").json()
+        if job['status'] in ('succeeded', 'failed', 'cancelled'):
+            break
+        time.sleep(1)
+    if job['status'] != 'succeeded':
+        print(f"Upload job {job['status']}: {job.get('error')}")
+        sys.exit(1)
+    print("Upload successful!", job['message'])
 
-    # 4. Forecast DL (LSTM)
-    payload['model'] = 'lstm'
-    print("Testing DL (LSTM)...")
-    resp = requests.post(f"{gateway_url}/forecast/dl", json=payload)
-    if resp.status_code == 200:
-        print("DL Forecast Success:", resp.json()['forecast'])
-    else:
-        print("DL Forecast Failed:", resp.text)
+    # 2-4. One forecast per model family: Classical (ARIMA), ML (Random Forest), DL (LSTM)
+    failed = False
+    for label, model in [("Classical (ARIMA)", "arima"), ("ML (Random Forest)", "rf"), ("DL (LSTM)", "lstm")]:
+        print(f"Testing {label}...")
+        resp = requests.post(f"{gateway_url}/forecast/demand", params={"city": city, "model": model, "horizon": 5})
+        if resp.status_code == 200:
+            print(f"{label} Forecast Success:", [f['predicted_count'] for f in resp.json()['forecasts']])
+        else:
+            print(f"{label} Forecast Failed:", resp.text)
+            failed = True
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
     test_system()